@@ -5,62 +5,71 @@ AI客户端模块 - 负责调用AI接口解析报纸内容
 """
 
 import os
+import re
+import difflib
 import time
-from config import TONGYI_API_KEY, AI_ANALYSIS_PROMPT, AI_TEMPERATURE, AI_MAX_TOKENS, AI_TOP_P
-from file_processor import image_to_base64, pdf_to_image_base64
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from config import (AI_ANALYSIS_PROMPT, AI_MODEL, AI_TEMPERATURE, AI_MAX_TOKENS, AI_TOP_P,
+                    AI_CACHE_ENABLED, AI_CACHE_DIR, AI_CACHE_MAX_MB, AI_CACHE_TTL_HOURS, AI_MAX_CONCURRENCY,
+                    AI_TILE_GRID, AI_TILE_OVERLAP, AI_STREAM, PDF_TEXT_LAYER, AI_TEXT_MODEL, AI_TEXT_MAX_CHARS,
+                    AI_DEDUP_ENABLED, AI_DEDUP_MAX_DISTANCE, AI_DEDUP_FINE_MAX_DISTANCE)
+from file_processor import (load_image_for_ai, load_image_tiles, load_pdf_text, load_page_thumbnail,
+                            IncrementalSummaryParser)
+from disk_cache import DiskCache, make_cache_key
+from page_hash import PageHashIndex, page_hash
+from ai_payload import base64_length
+from ai_providers import get_router
+from ai_metrics import metrics, usage_fields
+from transport import get_http_client
 from logger import logger
 
 
-def analyze_with_free_ai(file_path, newspaper_name, date_str):
-    """调用通义千问免费AI提取图片/PDF精华内容"""
-    logger.info(f"开始AI解析 {newspaper_name} 内容")
-    print(f"🤖 开始AI解析 {newspaper_name} 内容...")
-    
-    if not os.path.exists(file_path):
-        logger.error(f"文件不存在：{file_path}")
-        print(f"❌ 错误：文件 {file_path} 不存在")
-        return None
+# AI解析结果缓存：相同图片、提示词和模型参数直接返回上次的结果
+response_cache = DiskCache(AI_CACHE_DIR, AI_CACHE_MAX_MB * 1024 * 1024, suffix='.txt',
+                           ttl=AI_CACHE_TTL_HOURS * 3600 if AI_CACHE_TTL_HOURS > 0 else None)
 
-    # 检查API Key是否配置
-    if not TONGYI_API_KEY or TONGYI_API_KEY == "your-dashscope-api-key":
-        logger.error("未配置通义千问API Key")
-        print("❌ 错误：未配置通义千问API Key，请在.env文件中设置TONGYI_API_KEY")
-        return None
+# 近似重复版面索引：重新渲染/压缩过的同一版面复用已有的解析结果
+page_index = PageHashIndex(os.path.join(AI_CACHE_DIR, "page_hashes.jsonl"), max_distance=AI_DEDUP_MAX_DISTANCE,
+                           fine_max_distance=AI_DEDUP_FINE_MAX_DISTANCE)
 
-    # 1. 处理文件，转为base64
-    logger.debug(f"处理文件：{file_path}")
-    if file_path.endswith(".pdf"):
-        base64_data = pdf_to_image_base64(file_path)
-    else:
-        base64_data = image_to_base64(file_path)
-    
-    if not base64_data:
-        logger.error("文件转base64失败")
-        print("❌ 文件转base64失败，无法进行AI解析")
-        return None
 
-    # 2. 构建AI请求
-    try:
-        # 安装OpenAI SDK
-        try:
-            from openai import OpenAI
-        except ImportError:
-            logger.error("未安装OpenAI SDK，请运行: pip install openai")
-            print("❌ 未安装OpenAI SDK，请运行: pip install openai")
-            return None
+def response_cache_key(image_bytes, prompt, provider='qwen', model=AI_MODEL, temperature=AI_TEMPERATURE,
+                       top_p=AI_TOP_P, max_tokens=AI_MAX_TOKENS):
+    """AI结果缓存键：(图片数据哈希, 提示词, 服务, 模型, temperature, top_p, max_tokens)"""
+    image_hash = hashlib.sha256(image_bytes).hexdigest()
+    return make_cache_key(image_hash, prompt, provider, model, temperature, top_p, max_tokens)
+
+
+def dedup_scope(prompt, provider='qwen', model=AI_MODEL, newspaper=None):
+    """
+    近似重复版面的比较范围：同一报纸、相同提示词（分块的提示词包含分块位置）、服务和模型参数
 
-        # 创建OpenAI客户端
-        client = OpenAI(
-            api_key=TONGYI_API_KEY,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-        )
+    不限定日期，连续几天重复刊登的版面也能复用；版式相同、内容不同的版面由细哈希排除。
+    """
+    return make_cache_key(response_cache_key(b'', prompt, provider=provider, model=model), newspaper)
 
-        # 构建提示词（根据报纸类型使用不同的提示词）
-        default_prompt = "请分析这张图片，提取其中的文字信息和主要内容。请用简洁的语言总结图片中的信息。"
-        
-        # 针对纽约时报的特殊提示词（英文翻译成中文）
-        if newspaper_name == "纽约时报":
-            prompt = """请分析这张纽约时报报纸图片，完成以下任务：
+
+def find_near_duplicate(hashes, scope):
+    """
+    在 scope（dedup_scope 的结果）范围内查找与版面哈希（page_hash 的结果）近似重复的已解析版面
+
+    返回 (缓存的解析结果, 汉明距离)，没有近似重复时返回 (None, None)。
+    """
+    match = page_index.find(scope, hashes)
+    if match is None:
+        return None, None
+    key, distance = match
+    return response_cache.get(key), distance
+
+
+def build_prompt(newspaper_name):
+    """构建提示词（根据报纸类型使用不同的提示词）"""
+    default_prompt = "请分析这张图片，提取其中的文字信息和主要内容。请用简洁的语言总结图片中的信息。"
+
+    # 针对纽约时报的特殊提示词（英文翻译成中文）
+    if newspaper_name == "纽约时报":
+        return """请分析这张纽约时报报纸图片，完成以下任务：
 
 1. 提取图片中的所有英文文字信息，包括新闻标题、副标题、摘要等
 2. 将所有英文内容翻译成中文，保持原文的语气和风格
@@ -70,97 +79,365 @@ def analyze_with_free_ai(file_path, newspaper_name, date_str):
    - 中文摘要（50字左右）
 
 请使用正式、中立的中文语言，确保翻译准确、流畅。"""
-        else:
-            # 其他报纸使用配置的提示词或默认提示词
-            prompt_template = AI_ANALYSIS_PROMPT if AI_ANALYSIS_PROMPT else default_prompt
-            prompt = prompt_template
-
-        # 构建消息
-        messages = [
-            {"role": "system", "content": "You are a helpful assistant."},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_data}"}}
-                ]
-            }
-        ]
-
-        # 3. 调用AI接口
-        logger.info("正在调用通义千问AI解析...")
-        print("🚀 正在调用通义千问AI解析...（请稍候）")
-        
-        # 检查base64数据长度，确保不超过API限制
-        if base64_data and len(base64_data) > 10 * 1024 * 1024:  # 10MB限制
-            logger.warning("图片数据过大，可能会被API拒绝")
-            print("⚠️  图片数据过大，正在尝试压缩...")
-        
-        # 验证base64数据
-        if not base64_data or base64_data.strip() == "":
-            logger.error("Base64数据为空，无法进行AI解析")
-            print("❌ Base64数据为空，无法进行AI解析")
-            return None
-        
-        # 验证请求参数
-        if not prompt or prompt.strip() == "":
-            logger.error("提示词为空，无法进行AI解析")
-            print("❌ 提示词为空，无法进行AI解析")
-            return None
-        
-        # 添加请求重试机制
-        max_retries = 3
-        retry_delay = 2  # 初始重试延迟（秒）
-        
-        for retry in range(max_retries):
-            try:
-                completion = client.chat.completions.create(
-                    model="qwen-vl-plus",  # 通义千问多模态模型
-                    messages=messages,
-                    temperature=AI_TEMPERATURE,
-                    max_tokens=AI_MAX_TOKENS,
-                    top_p=AI_TOP_P
-                )
-                break  # 成功，跳出重试循环
-            except Exception as e:
-                # 网络错误或API错误，进行重试
-                if retry < max_retries - 1:
-                    logger.warning(f"AI调用失败：{str(e)}，正在重试... ({retry + 1}/{max_retries})")
-                    print(f"⚠️  AI调用失败：{str(e)}，正在重试... ({retry + 1}/{max_retries})")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # 指数退避
-                    continue
-                else:
-                    logger.error(f"AI调用失败：{str(e)}")
-                    print(f"❌ AI调用失败：{str(e)}")
-                    return None
-        
-        # 处理AI返回结果
-        try:
-            if completion and completion.choices and len(completion.choices) > 0:
-                ai_content = completion.choices[0].message.content.strip()
-                
-                if ai_content:
-                    logger.info("AI解析完成")
+
+    # 其他报纸使用配置的提示词或默认提示词
+    return AI_ANALYSIS_PROMPT if AI_ANALYSIS_PROMPT else default_prompt
+
+
+def request_analysis(prompt, image_bytes, use_cache=AI_CACHE_ENABLED, echo=True, on_text=None, stream=None,
+                     tags=None, thumbnail=None, dedup_prompt=None):
+    """
+    发送一次解析请求，返回AI生成的内容，失败时返回None
+
+    image_bytes 为JPEG字节时使用多模态模型（AI_MODEL）解析图片；
+    为None时只发送提示词，使用纯文本模型（AI_TEXT_MODEL，用于PDF文字层）。
+
+    echo 为True时在控制台打印解析结果（分块解析时只打印合并后的结果）。
+    on_text(片段) 按顺序收到完整的生成内容：流式请求时边生成边调用，命中缓存或非流式请求时整段调用一次。
+    stream 为True（默认取 AI_STREAM）且需要打印或回调时使用流式请求，内容逐字输出。
+    tags 为写入调用统计的附加字段，如 {'newspaper': 报纸名称, 'date': 日期, 'kind': 'image'}；
+    其中的报纸名称同时限定近似重复版面的比较范围。
+    thumbnail 为纯文本请求对应版面的缩略图，用于查找近似重复的版面（图片请求直接使用图片本身）；
+    dedup_prompt 为近似重复比较范围使用的提示词（默认为 prompt，纯文本请求的提示词包含整版文字，需传入原始提示词）。
+    """
+    # 验证图片数据
+    if image_bytes is not None and not image_bytes:
+        logger.error("图片数据为空，无法进行AI解析")
+        print("❌ 图片数据为空，无法进行AI解析")
+        return None
+
+    # 验证请求参数
+    if not prompt or prompt.strip() == "":
+        logger.error("提示词为空，无法进行AI解析")
+        print("❌ 提示词为空，无法进行AI解析")
+        return None
+
+    # 检查base64数据长度，确保不超过API限制
+    if image_bytes and base64_length(len(image_bytes)) > 10 * 1024 * 1024:  # 10MB限制
+        logger.warning("图片数据过大，可能会被API拒绝")
+        print("⚠️  图片数据过大，正在尝试压缩...")
+
+    # 查询缓存：缓存按服务和模型区分，按优先级查找可用服务各自的结果（模拟服务的结果不缓存）
+    with_image = image_bytes is not None
+    router = get_router()
+    cacheable = [provider for provider in router.eligible(with_image) if provider.cacheable]
+    page_hashes = None
+
+    def _cache_key(provider):
+        return response_cache_key(image_bytes or b'', prompt, provider=provider.name,
+                                  model=provider.model_for(with_image))
+
+    def _scope(provider):
+        return dedup_scope(dedup_prompt or prompt, provider=provider.name, model=provider.model_for(with_image),
+                           newspaper=(tags or {}).get('newspaper'))
+
+    page_image = image_bytes if with_image else thumbnail
+
+    def _record(status, provider=None, **fields):
+        # 记录实际给出结果的服务和模型（故障切换、对冲时不一定是首选服务）
+        if provider is not None:
+            fields.update(provider=provider.name, model=provider.model_for(with_image))
+        metrics.record(**(tags or {}), status=status, image_bytes=len(image_bytes or b''),
+                       prompt_chars=len(prompt), **fields)
+
+    if use_cache:
+        cached = hit = None
+        reason = "相同图片和提示词已解析过"
+        status = 'cache'
+        for hit in cacheable:
+            cached = response_cache.get(_cache_key(hit))
+            if cached is not None:
+                break
+        if cached is None and page_image and AI_DEDUP_ENABLED:
+            page_hashes = page_hash(page_image)
+            for hit in cacheable if page_hashes is not None else ():
+                cached, distance = find_near_duplicate(page_hashes, _scope(hit))
+                if cached is not None:
+                    reason = f"与已解析的版面近似重复，哈希距离 {distance}"
+                    status = 'dedup'
+                    response_cache.put(_cache_key(hit), cached)
+                    break
+        if cached is not None:
+            _record(status, provider=hit)
+            ai_content = cached.decode('utf-8')
+            logger.info(f"使用缓存的AI解析结果（{reason}）")
+            if echo:
+                print(f"✅ 使用缓存的AI解析结果（{reason}）")
+                print("-" * 70)
+                print(ai_content)
+                print("-" * 70)
+            if on_text:
+                on_text(ai_content)
+            return ai_content
+
+    # 只有一个可用服务时才流式输出（多个服务需要对冲时取先完成的完整结果）
+    stream = ((AI_STREAM if stream is None else stream) and (echo or on_text is not None)
+              and router.streams(image_bytes is not None))
+
+    def _on_stream_text(text):
+        if echo:
+            print(text, end='', flush=True)
+        if on_text:
+            on_text(text)
+
+    # 各服务按自己的限额排队调用（限流时遵守Retry-After并自动重试），多个服务时对冲请求和故障切换
+    started = time.monotonic()
+    try:
+        if stream and echo:
+            print("-" * 70)
+        completion, provider = router.complete(prompt, image_bytes, on_text=_on_stream_text if stream else None)
+        logger.debug(f"AI解析由 {provider.display_name} 完成")
+    except Exception as e:
+        _record('error', latency=round(time.monotonic() - started, 3), error=str(e)[:200])
+        if stream and echo:
+            print()
+        logger.error(f"AI调用失败：{str(e)}")
+        print(f"❌ AI调用失败：{str(e)}")
+        return None
+
+    _record('ok', provider=provider, latency=round(time.monotonic() - started, 3), **usage_fields(completion))
+
+    # 处理AI返回结果
+    try:
+        if completion and completion.get('choices'):
+            ai_content = (completion['choices'][0]['message'].get('content') or '').strip()
+
+            if ai_content:
+                if provider.cacheable:
+                    cache_key = _cache_key(provider)
+                    response_cache.put(cache_key, ai_content.encode('utf-8'))
+                    if page_hashes is not None:
+                        page_index.add(_scope(provider), page_hashes, cache_key)
+                logger.info("AI解析完成")
+                if stream:
+                    if echo:
+                        print()
+                        print("-" * 70)
+                        print("✅ AI解析完成！")
+                    return ai_content
+                if echo:
                     print("✅ AI解析完成！")
                     print("-" * 70)
                     print(ai_content)
                     print("-" * 70)
-                    return ai_content
-                else:
-                    logger.warning("AI返回空内容")
-                    print("❌ AI返回空内容，可能是解析失败")
-                    return None
+                if on_text:
+                    on_text(ai_content)
+                return ai_content
             else:
-                logger.error("AI返回格式异常")
-                print("❌ AI返回格式异常")
+                logger.warning("AI返回空内容")
+                print("❌ AI返回空内容，可能是解析失败")
                 return None
-        except Exception as e:
-            logger.error(f"解析AI返回内容时出错：{str(e)}")
-            print(f"❌ 解析AI返回内容失败：{str(e)}")
+        else:
+            logger.error("AI返回格式异常")
+            print("❌ AI返回格式异常")
+            return None
+    except Exception as e:
+        logger.error(f"解析AI返回内容时出错：{str(e)}")
+        print(f"❌ 解析AI返回内容失败：{str(e)}")
+        return None
+
+
+def build_text_prompt(prompt, text, max_chars=AI_TEXT_MAX_CHARS):
+    """将图片解析的提示词改写为基于PDF文字层的提示词"""
+    if len(text) > max_chars:
+        text = text[:max_chars]
+    return (f"下面是一版报纸PDF中按阅读顺序提取出的文字，请把它当作报纸版面来处理。\n\n"
+            f"{prompt}\n\n====== 版面文字 ======\n{text}")
+
+
+def parse_tile_grid(grid):
+    """解析分块规格，如 "2x3" → (2, 3)（2行3列）；为空或格式错误时返回 (1, 1)"""
+    try:
+        rows, cols = (int(part) for part in str(grid).lower().replace('×', 'x').split('x'))
+    except ValueError:
+        return 1, 1
+    return max(1, rows), max(1, cols)
+
+
+def _block_key(block):
+    """新闻块的比较键：取第一行（标题），去掉编号、符号和空白"""
+    first_line = block.strip().split('\n', 1)[0]
+    return re.sub(r'[\W_\d]+', '', first_line).lower()
+
+
+def merge_tile_results(results, similarity=0.85):
+    """
+    合并各分块的解析结果并去重
+
+    每块的结果按空行分成若干新闻块；相邻分块的重叠区域会让同一条新闻出现在两块中，
+    标题相似度达到 similarity 的新闻块视为重复，只保留内容更长的那个。
+    """
+    merged = []
+    for result in results:
+        if not result:
+            continue
+        for block in re.split(r'\n\s*\n', result.strip()):
+            block = block.strip()
+            if not block:
+                continue
+            key = _block_key(block)
+            for index, (kept_key, kept_block) in enumerate(merged):
+                if key and kept_key and difflib.SequenceMatcher(None, key, kept_key).ratio() >= similarity:
+                    if len(block) > len(kept_block):
+                        merged[index] = (key, block)
+                    break
+            else:
+                merged.append((key, block))
+    return '\n\n'.join(block for _, block in merged)
+
+
+def analyze_tiled(file_path, prompt, rows, cols, overlap=AI_TILE_OVERLAP, use_cache=AI_CACHE_ENABLED, tags=None):
+    """
+    分块解析整版报纸：切成 rows×cols 个有重叠的区域并发发送给AI，合并去重后返回，失败时返回None
+
+    每块单独缩放，小字号正文也能看清；各块并发调用，总耗时与单次调用相近。
+    """
+    tiles = load_image_tiles(file_path, rows, cols, overlap=overlap)
+    if not tiles:
+        logger.error("整版切块失败")
+        print("❌ 整版切块失败，无法进行AI解析")
+        return None
+
+    tile_count = len(tiles)
+    logger.info(f"正在分 {tile_count} 块并发调用通义千问AI解析...")
+    print(f"🚀 正在分 {tile_count} 块并发调用通义千问AI解析...（请稍候）")
+
+    def _analyze_tile(index):
+        row, col = divmod(index, cols)
+        tile_prompt = (f"{prompt}\n\n注意：这是整版报纸按 {rows}行×{cols}列 切分后的第{row + 1}行第{col + 1}列区域，"
+                       f"只提取本区域内能看清的内容；被边缘截断、看不完整的内容不要猜测补全。")
+        return request_analysis(tile_prompt, tiles[index], use_cache=use_cache, echo=False,
+                                tags={**(tags or {}), 'kind': 'tile', 'tile': index})
+
+    with ThreadPoolExecutor(max_workers=min(tile_count, max(1, AI_MAX_CONCURRENCY)),
+                            thread_name_prefix="ai-tile") as executor:
+        results = list(executor.map(_analyze_tile, range(tile_count)))
+
+    failed = sum(1 for result in results if not result)
+    if failed == tile_count:
+        logger.error("所有分块解析均失败")
+        print("❌ 所有分块解析均失败")
+        return None
+    if failed:
+        logger.warning(f"{failed}/{tile_count} 个分块解析失败，结果可能不完整")
+        print(f"⚠️  {failed}/{tile_count} 个分块解析失败，结果可能不完整")
+
+    ai_content = merge_tile_results(results)
+    logger.info("AI分块解析完成")
+    print("✅ AI分块解析完成！")
+    print("-" * 70)
+    print(ai_content)
+    print("-" * 70)
+    return ai_content
+
+
+def analyze_with_free_ai(file_path, newspaper_name, date_str, use_cache=AI_CACHE_ENABLED, tile_grid=AI_TILE_GRID,
+                         on_record=None):
+    """
+    调用通义千问免费AI提取图片/PDF精华内容
+
+    use_cache 为True时，相同图片和请求参数直接返回缓存的解析结果，不再调用AI接口。
+    有文字层的PDF（PDF_TEXT_LAYER 开启时）直接提取文字交给纯文本模型，扫描件和图片仍走图片解析。
+    tile_grid 为分块规格（如 "2x2"），多于一块时按分块模式并发解析，适合小字号的大幅面报纸。
+    on_record(记录) 在每条新闻解析完成时调用，记录格式同 parse_ai_content；
+    流式输出时无需等待全部生成完毕，可以边生成边写入数据库。
+    """
+    logger.info(f"开始AI解析 {newspaper_name} 内容")
+    print(f"🤖 开始AI解析 {newspaper_name} 内容...")
+
+    if not os.path.exists(file_path):
+        logger.error(f"文件不存在：{file_path}")
+        print(f"❌ 错误：文件 {file_path} 不存在")
+        return None
+
+    # 检查是否有已配置API Key的AI服务
+    if not get_router().eligible(with_image=False):
+        logger.error("未配置可用的AI服务")
+        print("❌ 错误：未配置可用的AI服务，请在.env文件中设置AI_PROVIDERS和对应的API Key（如TONGYI_API_KEY）")
+        return None
+
+    try:
+        # 检查共享的httpx客户端（复用连接池）
+        try:
+            get_http_client()
+        except ImportError:
+            logger.error("未安装httpx，请运行: pip install httpx")
+            print("❌ 未安装httpx，请运行: pip install httpx")
+            return None
+
+        prompt = build_prompt(newspaper_name)
+        # 调用统计按报纸/日期汇总
+        tags = {'newspaper': newspaper_name, 'date': date_str}
+
+        # 增量解析新闻记录
+        parser = IncrementalSummaryParser(newspaper_name, date_str) if on_record else None
+
+        def _emit(records):
+            for record in records:
+                try:
+                    on_record(record)
+                except Exception as e:
+                    logger.error(f"处理新闻记录失败：{record[2]} - {e}")
+
+        def _on_text(text):
+            _emit(parser.feed(text))
+
+        # 有文字层的PDF直接提取文字，用更快、更便宜的纯文本模型解析
+        if PDF_TEXT_LAYER and file_path.endswith(".pdf"):
+            text = load_pdf_text(file_path)
+            if text:
+                logger.info(f"使用PDF文字层解析（{len(text)} 字）")
+                print(f"🚀 正在调用通义千问AI解析PDF文字层...（模型：{AI_TEXT_MODEL}）")
+                # 文字层略有差异（如重新生成的PDF）的同一版面按缩略图复用已有结果
+                thumbnail = load_page_thumbnail(file_path) if use_cache and AI_DEDUP_ENABLED else None
+                ai_content = request_analysis(build_text_prompt(prompt, text), None, use_cache=use_cache,
+                                              on_text=_on_text if parser else None, tags={**tags, 'kind': 'text'},
+                                              thumbnail=thumbnail, dedup_prompt=prompt)
+                if ai_content and parser:
+                    _emit(parser.close())
+                return ai_content
+
+        rows, cols = parse_tile_grid(tile_grid)
+        if rows * cols > 1:
+            ai_content = analyze_tiled(file_path, prompt, rows, cols, use_cache=use_cache, tags=tags)
+            if ai_content and parser:
+                _emit(parser.feed(ai_content) + parser.close())
+            return ai_content
+
+        # 1. 处理文件，编码为JPEG
+        logger.debug(f"处理文件：{file_path}")
+        image_bytes = load_image_for_ai(file_path)
+
+        if not image_bytes:
+            logger.error("文件编码失败")
+            print("❌ 文件编码失败，无法进行AI解析")
             return None
 
+        # 2. 调用AI接口
+        logger.info("正在调用通义千问AI解析...")
+        print("🚀 正在调用通义千问AI解析...（请稍候）")
+        ai_content = request_analysis(prompt, image_bytes, use_cache=use_cache, on_text=_on_text if parser else None,
+                                      tags={**tags, 'kind': 'image'})
+        if ai_content and parser:
+            _emit(parser.close())
+        return ai_content
+
     except Exception as e:
         logger.error(f"AI调用失败：{str(e)}")
         print(f"❌ AI调用失败：{str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+
+def analyze_many(items, max_workers=AI_MAX_CONCURRENCY, use_cache=AI_CACHE_ENABLED):
+    """
+    并发解析多份报纸
+
+    items 为 [(文件路径, 报纸名称, 日期字符串), ...]，返回与之顺序一致的解析结果列表（失败的为None）。
+    实际并发数和请求速率由全局调度器按接口限额控制。
+    """
+    def _analyze(item):
+        file_path, newspaper_name, date_str = item
+        return analyze_with_free_ai(file_path, newspaper_name, date_str, use_cache=use_cache)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ai") as executor:
+        return list(executor.map(_analyze, items))
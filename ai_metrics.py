@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI调用统计模块 - 记录每次AI调用的用量和耗时，按报纸/日期汇总
+
+每次解析请求（包括命中缓存的）追加一行JSON到 AI_METRICS_FILE：
+    时间、报纸、日期、类型（image/tile/text）、服务、模型、状态（ok/cache/dedup/error）、
+    图片字节数、提示词字数、prompt/completion/total Token数、耗时、结束原因（length表示被 max_tokens 截断）
+
+查看汇总报告：
+    python ai_metrics.py                       全部记录按报纸/日期汇总
+    python ai_metrics.py --newspaper 人民日报 --since 20260201
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import collections
+from config import AI_METRICS_ENABLED, AI_METRICS_FILE
+from logger import logger
+
+# 汇总时累加的数值字段
+SUM_FIELDS = ('image_bytes', 'prompt_chars', 'prompt_tokens', 'completion_tokens', 'total_tokens')
+
+
+def usage_fields(completion):
+    """从AI返回结果中取出用量和结束原因（缺失的字段为None）"""
+    usage = (completion or {}).get('usage') or {}
+    choices = (completion or {}).get('choices') or [{}]
+    fields = {name: usage.get(name) if isinstance(usage.get(name), int) else None
+              for name in ('prompt_tokens', 'completion_tokens', 'total_tokens')}
+    fields['finish_reason'] = choices[0].get('finish_reason')
+    return fields
+
+
+class MetricsStore:
+    """按行追加的JSON调用记录（线程安全）"""
+
+    def __init__(self, path=AI_METRICS_FILE, enabled=AI_METRICS_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def record(self, **fields):
+        """追加一条调用记录（写入失败只记日志，不影响解析）"""
+        if not self.enabled:
+            return
+        entry = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), **fields}
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+        except OSError as e:
+            logger.warning(f"写入AI调用统计失败：{e}")
+
+    def read(self, newspaper=None, since=None):
+        """读取调用记录，可按报纸和起始日期（YYYYMMDD）过滤"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if newspaper and entry.get('newspaper') != newspaper:
+                    continue
+                if since and (entry.get('date') or '') < since:
+                    continue
+                yield entry
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def summarize(entries):
+    """按 (报纸, 日期) 汇总调用记录，返回按报纸、日期排序的汇总行"""
+    groups = collections.OrderedDict()
+    for entry in entries:
+        key = (entry.get('newspaper') or '-', entry.get('date') or '-')
+        group = groups.setdefault(key, {'newspaper': key[0], 'date': key[1], 'calls': 0, 'cached': 0,
+                                        'errors': 0, 'truncated': 0, 'latencies': [],
+                                        'models': set(), **{name: 0 for name in SUM_FIELDS}})
+        status = entry.get('status')
+        if status in ('cache', 'dedup'):
+            group['cached'] += 1
+            continue
+        group['calls'] += 1
+        if status == 'error':
+            group['errors'] += 1
+        if entry.get('finish_reason') == 'length':
+            group['truncated'] += 1
+        if entry.get('latency') is not None:
+            group['latencies'].append(entry['latency'])
+        if entry.get('model'):
+            group['models'].add(entry['model'])
+        for name in SUM_FIELDS:
+            group[name] += entry.get(name) or 0
+
+    rows = []
+    for key in sorted(groups):
+        group = groups[key]
+        latencies = group.pop('latencies')
+        group['avg_latency'] = sum(latencies) / len(latencies) if latencies else None
+        group['p95_latency'] = _percentile(latencies, 95)
+        group['models'] = sorted(group['models'])
+        rows.append(group)
+    return rows
+
+
+def format_report(rows):
+    """把汇总行格式化为文本表格"""
+    if not rows:
+        return "暂无AI调用记录"
+    header = (f"{'报纸':<8}{'日期':<10}{'调用':>6}{'缓存':>6}{'失败':>6}{'截断':>6}"
+              f"{'图片KB':>10}{'输入Token':>11}{'输出Token':>11}{'平均秒':>8}{'P95秒':>8}  模型")
+    lines = [header, "-" * 100]
+    totals = collections.Counter()
+    for row in rows:
+        avg = f"{row['avg_latency']:.1f}" if row['avg_latency'] is not None else '-'
+        p95 = f"{row['p95_latency']:.1f}" if row['p95_latency'] is not None else '-'
+        lines.append(f"{row['newspaper']:<8}{row['date']:<10}{row['calls']:>6}{row['cached']:>6}{row['errors']:>6}"
+                     f"{row['truncated']:>6}{row['image_bytes'] / 1024:>10.0f}{row['prompt_tokens']:>11}"
+                     f"{row['completion_tokens']:>11}{avg:>8}{p95:>8}  {','.join(row['models'])}")
+        totals.update({name: row[name] for name in ('calls', 'cached', 'errors', 'truncated') + SUM_FIELDS})
+    lines.append("-" * 100)
+    lines.append(f"合计：调用 {totals['calls']} 次（缓存命中 {totals['cached']} 次，失败 {totals['errors']} 次，"
+                 f"截断 {totals['truncated']} 次），图片 {totals['image_bytes'] / 1024 / 1024:.1f} MB，"
+                 f"Token {totals['prompt_tokens']} + {totals['completion_tokens']} = {totals['total_tokens']}")
+    return '\n'.join(lines)
+
+
+# 创建全局统计实例
+metrics = MetricsStore()
+
+
+def main(argv=None):
+    """打印AI调用汇总报告"""
+    parser = argparse.ArgumentParser(description="按报纸/日期汇总AI调用的用量和耗时")
+    parser.add_argument("--newspaper", help="只统计指定报纸")
+    parser.add_argument("--since", help="只统计该日期（YYYYMMDD）及之后的记录")
+    parser.add_argument("--file", default=AI_METRICS_FILE, help="统计记录文件")
+    args = parser.parse_args(argv)
+
+    store = MetricsStore(args.file)
+    print(format_report(summarize(store.read(newspaper=args.newspaper, since=args.since))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI请求体构建模块 - 少拷贝地构建带图片的对话请求（也支持纯文本请求）
+
+通过SDK发送图片时，图片数据要经过 getvalue → b64encode → decode → 拼接data URI → JSON序列化
+多次完整拷贝，整期报纸批量解析时内存抖动明显。本模块改为：
+- JPEG字节分块编码为base64，直接写入每个线程复用的缓冲区
+- 请求JSON在图片位置拆成前后两段，请求体按 [前段, 图片base64, 后段] 分段发送，
+  并预先给出 Content-Length，图片数据在内存中只保留一份
+"""
+
+import json
+import binascii
+import threading
+from config import TONGYI_API_KEY, TONGYI_BASE_URL, AI_REQUEST_TIMEOUT
+from transport import get_http_client
+
+# 每次编码的输入块大小（3的倍数，编码结果不含填充字符，可以直接拼接）
+ENCODE_CHUNK_SIZE = 3 * 16 * 1024
+# JSON中图片数据的占位符
+IMAGE_PLACEHOLDER = "\x00IMAGE_BASE64\x00"
+
+_local = threading.local()
+
+
+def base64_length(size):
+    """size 字节的数据编码为base64后的长度"""
+    return (size + 2) // 3 * 4
+
+
+def encode_base64_into(data, buffer):
+    """
+    将 data 分块编码为base64写入 buffer（长度至少为 base64_length(len(data))），返回写入的长度
+
+    每次只产生一个小块的临时对象，不会生成与整张图片等长的中间字符串。
+    """
+    if len(buffer) < base64_length(len(data)):
+        raise ValueError("缓冲区长度不足")
+    view = memoryview(data)
+    offset = 0
+    for start in range(0, len(view), ENCODE_CHUNK_SIZE):
+        encoded = binascii.b2a_base64(view[start:start + ENCODE_CHUNK_SIZE], newline=False)
+        buffer[offset:offset + len(encoded)] = encoded
+        offset += len(encoded)
+    return offset
+
+
+def _thread_buffer(min_size):
+    """当前线程复用的编码缓冲区，不足 min_size 时换一个更大的（旧缓冲区可能仍被引用，不能原地扩容）"""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) < min_size:
+        buffer = _local.buffer = bytearray(min_size)
+    return buffer
+
+
+class ChatPayload:
+    """分段的对话请求体：[JSON前段, 图片base64, JSON后段]"""
+
+    def __init__(self, head, image_view, tail):
+        self.head = head
+        self.image_view = image_view
+        self.tail = tail
+
+    @property
+    def content_length(self):
+        return len(self.head) + len(self.image_view) + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        yield self.image_view
+        yield self.tail
+
+    def to_bytes(self):
+        """拼接成完整的请求体（仅用于调试和测试）"""
+        return b''.join(self)
+
+
+def build_chat_payload(model, prompt, image_bytes, temperature, max_tokens, top_p, stream=False,
+                       system_prompt="You are a helpful assistant."):
+    """
+    构建带一张JPEG图片的对话请求体
+
+    图片的base64写入当前线程的复用缓冲区，返回的请求体在本线程下一次构建前有效。
+    """
+    body = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{IMAGE_PLACEHOLDER}"}}
+                ]
+            }
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_p": top_p,
+    }
+    if stream:
+        body["stream"] = True
+        body["stream_options"] = {"include_usage": True}
+
+    placeholder = json.dumps(IMAGE_PLACEHOLDER)[1:-1]
+    head, tail = json.dumps(body, ensure_ascii=False).split(placeholder)
+
+    buffer = _thread_buffer(base64_length(len(image_bytes)))
+    length = encode_base64_into(image_bytes, buffer)
+    return ChatPayload(head.encode('utf-8'), memoryview(buffer)[:length], tail.encode('utf-8'))
+
+
+def build_text_payload(model, prompt, temperature, max_tokens, top_p, stream=False,
+                       system_prompt="You are a helpful assistant."):
+    """构建纯文本的对话请求体（与 build_chat_payload 返回的结构相同，可用同样的方式发送）"""
+    body = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_p": top_p,
+    }
+    if stream:
+        body["stream"] = True
+        body["stream_options"] = {"include_usage": True}
+    return ChatPayload(json.dumps(body, ensure_ascii=False).encode('utf-8'), memoryview(b''), b'')
+
+
+def _completions_url():
+    return f"{TONGYI_BASE_URL.rstrip('/')}/chat/completions"
+
+
+def _request_headers(payload):
+    return {
+        "Authorization": f"Bearer {TONGYI_API_KEY}",
+        "Content-Type": "application/json",
+        "Content-Length": str(payload.content_length),
+    }
+
+
+def post_chat_completion(payload, timeout=AI_REQUEST_TIMEOUT):
+    """
+    发送对话请求，返回解析后的JSON结果
+
+    HTTP错误时抛出 httpx.HTTPStatusError（带 response，调度器据此识别429和Retry-After）。
+    """
+    response = get_http_client().post(_completions_url(), content=iter(payload),
+                                      headers=_request_headers(payload), timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def iter_chat_stream(payload, timeout=AI_REQUEST_TIMEOUT):
+    """
+    发送流式对话请求（请求体需以 stream=True 构建），逐个返回服务器推送的JSON数据块
+
+    响应为SSE格式（每行 "data: {...}"，以 "data: [DONE]" 结束）。HTTP错误时抛出 httpx.HTTPStatusError。
+    """
+    with get_http_client().stream("POST", _completions_url(), content=iter(payload),
+                                  headers=_request_headers(payload), timeout=timeout) as response:
+        if response.status_code >= 400:
+            response.read()  # 读取错误响应体，便于查看错误信息
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            if data:
+                yield json.loads(data)
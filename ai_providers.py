@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI服务模块 - 多个AI服务的统一接口、对冲请求和故障切换
+
+支持的服务（在 .env 的 AI_PROVIDERS 中按优先级列出，如 "qwen,ernie"）：
+- qwen：通义千问（OpenAI兼容接口），支持图片和纯文本
+- ernie：百度文心一言，仅支持纯文本（用于PDF文字层）
+- mock：本地模拟服务，不联网，用于离线调试和测试
+
+多个服务可用时：
+- 主服务耗时超过其历史耗时的 AI_HEDGE_PERCENTILE 分位数仍未返回，向下一个服务发出对冲请求，取先返回的结果
+- 主服务出错时立即切换到下一个服务
+"""
+
+import abc
+import time
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import (TONGYI_API_KEY, ERNIE_API_URL, ERNIE_ACCESS_TOKEN, AI_MODEL, AI_TEXT_MODEL,
+                    AI_TEMPERATURE, AI_MAX_TOKENS, AI_TOP_P, AI_REQUEST_TIMEOUT, AI_PROVIDERS,
+                    AI_HEDGE_PERCENTILE, AI_HEDGE_DEFAULT_DELAY, AI_HEDGE_MIN_SAMPLES)
+from ai_payload import build_chat_payload, build_text_payload, post_chat_completion, iter_chat_stream
+from ai_scheduler import AIScheduler, scheduler as qwen_scheduler
+from file_processor import IMAGE_MAX_SIZE
+from transport import get_http_client
+from logger import logger
+
+
+class ProviderError(Exception):
+    """AI服务返回的业务错误（status_code 供调度器判断是否重试）"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def estimate_tokens(prompt, max_tokens=AI_MAX_TOKENS, image_size=0):
+    """预估一次调用消耗的Token数：提示词 + 图片（每28×28像素约1个Token） + 最大输出"""
+    return len(prompt) + (image_size // 28) ** 2 + max_tokens
+
+
+def completion_tokens_used(completion):
+    """从AI返回结果（JSON）中读取实际消耗的Token数"""
+    total_tokens = (completion.get('usage') or {}).get('total_tokens')
+    return total_tokens if isinstance(total_tokens, int) else None
+
+
+def make_completion(content, usage=None):
+    """构造与OpenAI兼容接口相同结构的返回结果"""
+    return {'choices': [{'message': {'content': content}}], 'usage': usage}
+
+
+class LatencyTracker:
+    """记录最近若干次调用的耗时，用于计算对冲等待时间"""
+
+    def __init__(self, window=100):
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p):
+        """耗时的 p 分位数（最近邻法），没有样本时返回None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, round(p / 100 * len(samples)) - 1))
+        return samples[index]
+
+
+class AIProvider(abc.ABC):
+    """AI服务基类"""
+
+    name = ''
+    display_name = ''
+    supports_images = False
+    supports_stream = False
+    cacheable = True  # 返回结果是否写入AI结果缓存
+
+    def __init__(self, scheduler=None):
+        self.scheduler = scheduler or AIScheduler()
+        self.latency = LatencyTracker()
+
+    def available(self):
+        """是否已配置（有API Key等）"""
+        return True
+
+    def model_for(self, with_image):
+        """实际使用的模型名称（用于缓存键和调用统计）"""
+        return self.name
+
+    @abc.abstractmethod
+    def request(self, prompt, image_bytes=None, on_text=None):
+        """发送一次请求，返回兼容结构的结果；on_text 不为None时使用流式请求（需 supports_stream）"""
+
+    def complete(self, prompt, image_bytes=None, on_text=None):
+        """在本服务的限额内调用（失败时按调度器策略重试），记录耗时"""
+        image_size = IMAGE_MAX_SIZE if image_bytes is not None else 0
+        started = time.monotonic()
+        completion = self.scheduler.call(
+            lambda: self.request(prompt, image_bytes, on_text),
+            estimated_tokens=estimate_tokens(prompt, image_size=image_size),
+            usage_of=completion_tokens_used,
+        )
+        self.latency.record(time.monotonic() - started)
+        return completion
+
+
+class QwenProvider(AIProvider):
+    """通义千问（OpenAI兼容接口）"""
+
+    name = 'qwen'
+    display_name = '通义千问'
+    supports_images = True
+    supports_stream = True
+
+    def __init__(self, scheduler=None):
+        super().__init__(scheduler or qwen_scheduler)
+
+    def available(self):
+        return bool(TONGYI_API_KEY) and TONGYI_API_KEY != "your-dashscope-api-key"
+
+    def model_for(self, with_image):
+        return AI_MODEL if with_image else AI_TEXT_MODEL
+
+    def request(self, prompt, image_bytes=None, on_text=None):
+        stream = on_text is not None
+        if image_bytes is not None:
+            # 图片base64直接写入复用缓冲区，不生成完整的中间字符串
+            payload = build_chat_payload(AI_MODEL, prompt, image_bytes, temperature=AI_TEMPERATURE,
+                                         max_tokens=AI_MAX_TOKENS, top_p=AI_TOP_P, stream=stream)
+        else:
+            payload = build_text_payload(AI_TEXT_MODEL, prompt, temperature=AI_TEMPERATURE,
+                                         max_tokens=AI_MAX_TOKENS, top_p=AI_TOP_P, stream=stream)
+        if not stream:
+            return post_chat_completion(payload)
+        return self._stream(payload, on_text)
+
+    @staticmethod
+    def _stream(payload, on_text):
+        """
+        发送流式请求，每收到一段内容调用 on_text(片段)，结束后返回与非流式接口相同结构的结果
+
+        已经输出过内容后中断的请求不再重试，避免重复输出。
+        """
+        parts = []
+        usage = None
+        try:
+            for chunk in iter_chat_stream(payload):
+                usage = chunk.get('usage') or usage
+                for choice in chunk.get('choices') or []:
+                    text = (choice.get('delta') or {}).get('content')
+                    if text:
+                        parts.append(text)
+                        on_text(text)
+        except Exception as e:
+            if parts:
+                e.retryable = False
+            raise
+        return make_completion(''.join(parts), usage)
+
+
+class ErnieProvider(AIProvider):
+    """百度文心一言（千帆对话接口，仅支持纯文本）"""
+
+    name = 'ernie'
+    display_name = '文心一言'
+
+    # 千帆接口的限流错误码（QPS/RPM/TPM超限）
+    RATE_LIMIT_CODES = {4, 17, 18, 336501, 336502}
+
+    def available(self):
+        return bool(ERNIE_ACCESS_TOKEN)
+
+    def model_for(self, with_image):
+        # 千帆接口按地址的最后一段区分模型（如 completions、completions_pro）
+        return ERNIE_API_URL.rstrip('/').rsplit('/', 1)[-1]
+
+    def request(self, prompt, image_bytes=None, on_text=None):
+        body = {
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": max(0.01, min(AI_TEMPERATURE, 1.0)),  # 文心一言要求 (0, 1]
+            "top_p": AI_TOP_P,
+            "max_output_tokens": max(2, min(AI_MAX_TOKENS, 2048)),
+        }
+        response = get_http_client().post(ERNIE_API_URL, params={'access_token': ERNIE_ACCESS_TOKEN},
+                                          json=body, timeout=AI_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        # 千帆接口出错时仍返回HTTP 200，错误码在响应体中
+        if data.get('error_code'):
+            status = 429 if data['error_code'] in self.RATE_LIMIT_CODES else 400
+            raise ProviderError(f"文心一言错误 {data['error_code']}：{data.get('error_msg', '')}", status_code=status)
+        return make_completion(data.get('result', ''), data.get('usage'))
+
+
+class MockProvider(AIProvider):
+    """本地模拟服务：不联网，按设定的延迟返回固定内容或抛出错误"""
+
+    name = 'mock'
+    display_name = '模拟服务'
+    supports_images = True
+    cacheable = False  # 模拟内容不能当作真实的解析结果缓存
+
+    DEFAULT_CONTENT = "【头条新闻1】模拟新闻标题\n📝 核心内容：这是本地模拟服务返回的内容，用于离线调试。"
+
+    def __init__(self, content=DEFAULT_CONTENT, delay=0.0, error=None, scheduler=None):
+        super().__init__(scheduler or AIScheduler(rpm=10 ** 6, tpm=10 ** 9, max_retries=0))
+        self.content = content
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def request(self, prompt, image_bytes=None, on_text=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return make_completion(self.content, {'total_tokens': len(prompt) + len(self.content)})
+
+
+PROVIDER_CLASSES = {cls.name: cls for cls in (QwenProvider, ErnieProvider, MockProvider)}
+
+
+class ProviderRouter:
+    """在多个AI服务之间对冲请求和故障切换"""
+
+    def __init__(self, providers, percentile=AI_HEDGE_PERCENTILE, default_delay=AI_HEDGE_DEFAULT_DELAY,
+                 min_samples=AI_HEDGE_MIN_SAMPLES):
+        self.providers = list(providers)
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self._executor = ThreadPoolExecutor(max_workers=max(4, len(self.providers) * 4),
+                                            thread_name_prefix="ai-provider")
+
+    def eligible(self, with_image):
+        """可以处理该请求的服务（已配置，且需要时支持图片），按优先级排列"""
+        return [provider for provider in self.providers
+                if provider.available() and (provider.supports_images or not with_image)]
+
+    def hedge_delay(self, provider):
+        """等待 provider 多久后发出对冲请求：历史耗时的分位数，样本不足时使用默认值"""
+        if len(provider.latency) < max(1, self.min_samples):
+            return self.default_delay
+        return provider.latency.percentile(self.percentile)
+
+    def streams(self, with_image):
+        """该请求能否流式输出：只有一个可用服务（不需要对冲）且它支持流式时才流式输出"""
+        candidates = self.eligible(with_image)
+        return len(candidates) == 1 and candidates[0].supports_stream
+
+    def complete(self, prompt, image_bytes=None, on_text=None):
+        """
+        调用AI服务，返回 (结果, 服务)；所有服务都失败时抛出最后一个异常
+
+        on_text 仅在 streams() 为True时使用；需要对冲时各服务都按非流式请求。
+        """
+        candidates = self.eligible(image_bytes is not None)
+        if not candidates:
+            raise ProviderError("没有可用的AI服务，请检查 .env 中的 AI_PROVIDERS 和对应的API Key")
+        if len(candidates) == 1:
+            provider = candidates[0]
+            stream_to = on_text if provider.supports_stream else None
+            return provider.complete(prompt, image_bytes, stream_to), provider
+
+        pending = {}
+        remaining = list(candidates)
+        last_error = None
+
+        def _launch():
+            provider = remaining.pop(0)
+            future = self._executor.submit(provider.complete, prompt, image_bytes)
+            pending[future] = provider
+            return provider
+
+        current = _launch()
+        while pending:
+            timeout = self.hedge_delay(current) if remaining else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 主服务超过分位耗时仍未返回，发出对冲请求（原请求继续进行，取先返回的结果）
+                logger.info(f"{current.display_name} 超过 {timeout:.1f} 秒未返回，向下一个服务发出对冲请求")
+                current = _launch()
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    return future.result(), provider
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"{provider.display_name} 调用失败：{e}")
+            if remaining and not pending:
+                # 故障切换到下一个服务
+                current = _launch()
+                logger.info(f"切换到 {current.display_name}")
+        raise last_error
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """获取按 AI_PROVIDERS 配置创建的全局服务路由（首次调用时创建）"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            providers = []
+            for name in AI_PROVIDERS.split(','):
+                name = name.strip().lower()
+                if not name:
+                    continue
+                if name not in PROVIDER_CLASSES:
+                    logger.warning(f"未知的AI服务：{name}（可选：{', '.join(PROVIDER_CLASSES)}）")
+                    continue
+                providers.append(PROVIDER_CLASSES[name]())
+            _router = ProviderRouter(providers)
+        return _router
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI请求调度模块 - 按接口限额并发调用AI
+
+通义千问（DashScope）按「每分钟请求数（RPM）」和「每分钟Token数（TPM）」限流。
+本模块用两个令牌桶分别控制这两项额度，在额度内尽量多地并发调用：
+- 每次调用前按预估Token数从令牌桶取令牌，调用完成后按实际用量多退少补
+- 遇到限流（HTTP 429）时遵守服务器返回的 Retry-After，所有请求一起暂停
+- 并发数按AIMD自适应：连续成功时逐步加一，被限流时减半
+"""
+
+import time
+import random
+import threading
+import email.utils
+from config import AI_RPM_LIMIT, AI_TPM_LIMIT, AI_MAX_CONCURRENCY, AI_MAX_RETRIES
+from logger import logger
+
+
+class TokenBucket:
+    """线程安全的令牌桶：容量为每分钟额度，按额度/60每秒匀速补充；额度为0表示不限制"""
+
+    def __init__(self, per_minute, capacity=None):
+        if per_minute <= 0:
+            # 不限制：令牌数为无穷大，只在 Retry-After 暂停期等待
+            per_minute, capacity = 0, float('inf')
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """取出 amount 个令牌，额度不足或处于暂停期时阻塞等待；返回等待的秒数"""
+        # 单次请求超过桶容量时按容量计，否则永远等不到
+        amount = min(amount, self.capacity)
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= amount:
+                    self.tokens -= amount
+                    return now - started
+                else:
+                    wait = (amount - self.tokens) / self.rate
+                self._cond.wait(wait)
+
+    def adjust(self, delta):
+        """按实际用量修正令牌数：delta>0 表示多用了，delta<0 表示退回多扣的部分"""
+        with self._cond:
+            self._refill(time.monotonic())
+            # 允许为负（透支），之后的请求会相应等待更久
+            self.tokens = min(self.capacity, self.tokens - delta)
+            self._cond.notify_all()
+
+    def pause(self, seconds):
+        """暂停发放令牌 seconds 秒（用于遵守 Retry-After）"""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    """AIMD自适应并发上限：连续成功 current 次后加一，被限流时减半"""
+
+    def __init__(self, max_limit, initial=None):
+        self.max_limit = max(1, max_limit)
+        self.limit = max(1, min(initial or self.max_limit, self.max_limit))
+        self.active = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_throttle(self):
+        with self._cond:
+            new_limit = max(1, self.limit // 2)
+            if new_limit != self.limit:
+                logger.info(f"AI接口限流，并发数 {self.limit} → {new_limit}")
+            self.limit = new_limit
+            self._successes = 0
+
+
+def get_status_code(error):
+    """从SDK/HTTP异常中取出HTTP状态码，取不到时返回None"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+    if status is None:
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def parse_retry_after(error):
+    """解析异常响应中的 Retry-After（秒数或HTTP日期），没有时返回None"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """
+    限流、服务端错误和网络错误可以重试；参数错误、鉴权失败等不重试
+
+    调用方可以给异常设置 retryable=False 明确禁止重试（如流式输出已经开始后中断）。
+    """
+    if getattr(error, 'retryable', True) is False:
+        return False
+    status = get_status_code(error)
+    if status is None:
+        return True
+    return status in (408, 409, 429) or status >= 500
+
+
+class AIScheduler:
+    """按RPM/TPM限额和自适应并发数调度AI调用"""
+
+    def __init__(self, rpm=AI_RPM_LIMIT, tpm=AI_TPM_LIMIT, max_concurrency=AI_MAX_CONCURRENCY,
+                 max_retries=AI_MAX_RETRIES, base_delay=2.0, max_delay=60.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _pause(self, seconds):
+        self.requests.pause(seconds)
+        self.tokens.pause(seconds)
+
+    def call(self, func, estimated_tokens=1, usage_of=None):
+        """
+        在限额内调用 func()，失败时按策略重试，返回 func 的结果
+
+        estimated_tokens 为调用前预估的Token数；usage_of(result) 返回实际用量（Token数），
+        用于修正令牌桶。重试次数用完或遇到不可重试的错误时抛出最后一次的异常。
+        """
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire(1)
+            self.tokens.acquire(estimated_tokens)
+            self.concurrency.acquire()
+            try:
+                result = func()
+            except Exception as e:
+                self.concurrency.release()
+                # 失败的调用没有消耗Token，退回预扣的额度（请求数额度不退）
+                self.tokens.adjust(-min(estimated_tokens, self.tokens.capacity))
+                status = get_status_code(e)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                retry_after = parse_retry_after(e)
+                if status == 429:
+                    self.concurrency.on_throttle()
+                if retry_after is not None:
+                    delay = min(retry_after, self.max_delay)
+                    # Retry-After 针对整个账号，所有请求一起暂停
+                    self._pause(delay)
+                else:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"AI调用失败（状态码 {status}）：{e}，{delay:.1f} 秒后重试 "
+                               f"({attempt + 1}/{self.max_retries})")
+                print(f"⚠️  AI调用失败：{e}，{delay:.1f} 秒后重试... ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                continue
+
+            self.concurrency.release()
+            self.concurrency.on_success()
+            if usage_of is not None:
+                try:
+                    used = usage_of(result)
+                except Exception:
+                    used = None
+                if used:
+                    self.tokens.adjust(used - min(estimated_tokens, self.tokens.capacity))
+            return result
+
+
+# 创建全局调度器实例（进程内所有AI调用共享同一份额度）
+scheduler = AIScheduler()
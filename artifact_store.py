@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件存储模块 - 按内容寻址的报纸文件存储
+
+每个下载的文件按SHA-256保存为一个blob（相同内容只存一份），
+另外为每个URL记录一个小的索引条目（ETag、Last-Modified、大小等），
+用于发起条件请求（If-None-Match / If-Modified-Since），内容未变化时服务器返回304，无需重复下载。
+
+目录结构：
+    {ARTIFACT_STORE_DIR}/blobs/ab/abcdef....pdf   内容文件
+    {ARTIFACT_STORE_DIR}/index/<URL哈希>.json      URL索引条目
+    {ARTIFACT_STORE_DIR}/tmp/                     下载中的临时文件（及其锁文件）
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import contextlib
+from config import ARTIFACT_STORE_DIR
+from utils import file_lock
+from logger import logger
+
+
+def sha256_file(path, block_size=1024 * 1024):
+    """计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """按内容寻址的文件存储"""
+
+    def __init__(self, root=ARTIFACT_STORE_DIR):
+        """初始化存储目录（目录在首次写入时创建）"""
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.index_dir = os.path.join(root, "index")
+        self.tmp_dir = os.path.join(root, "tmp")
+
+    @staticmethod
+    def _url_key(url):
+        """URL对应的索引文件名"""
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _index_path(self, url):
+        return os.path.join(self.index_dir, f"{self._url_key(url)}.json")
+
+    def blob_path(self, sha256, ext):
+        """内容文件路径（按哈希前两位分目录）"""
+        return os.path.join(self.blob_dir, sha256[:2], f"{sha256}.{ext}")
+
+    def temp_path(self, url, ext):
+        """下载该URL使用的临时文件路径（同一URL固定，便于断点续传）"""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return os.path.join(self.tmp_dir, f"{self._url_key(url)}.{ext}")
+
+    @contextlib.contextmanager
+    def reserve_temp(self, url, ext):
+        """
+        占用该URL的临时文件路径，在 with 块中下载
+
+        同一URL固定的临时文件加锁后才续传；其他进程（或协程）正在下载同一URL时，
+        改用一个独有的临时文件从头下载，两个下载不会向同一个 .part 文件追加数据。
+        """
+        temp_path = self.temp_path(url, ext)
+        with file_lock(f"{temp_path}.lock", blocking=False) as acquired:
+            if acquired:
+                yield temp_path
+                return
+            logger.debug(f"其他下载正在使用该URL的临时文件，改用独立的临时文件：{url}")
+            private_path = f"{temp_path}.{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            try:
+                yield private_path
+            finally:
+                # 独立的临时文件无法被之后的下载续传，不保留
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(f"{private_path}.part")
+
+    def lookup(self, url):
+        """查询URL的索引条目，条目不存在或内容文件丢失时返回None"""
+        try:
+            with open(self._index_path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.blob_path(entry['sha256'], entry['ext'])):
+            return None
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry):
+        """根据索引条目生成条件请求头"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def _write_entry(self, entry):
+        """原子写入索引条目（先写临时文件再重命名，多个进程同时写入也不会损坏）"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        index_path = self._index_path(entry['url'])
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+
+    def commit(self, url, file_path, ext, etag=None, last_modified=None, content_type=None):
+        """
+        将下载完成的文件存入存储并更新URL索引
+
+        文件被移动到 blobs/ 下以其SHA-256命名的位置；如果相同内容已存在，则直接删除该文件。
+        返回新的索引条目。
+        """
+        sha256 = sha256_file(file_path)
+        blob_path = self.blob_path(sha256, ext)
+        if os.path.exists(blob_path):
+            os.remove(file_path)
+            logger.debug(f"内容已存在于存储中：{sha256}")
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(file_path, blob_path)
+
+        now = time.time()
+        entry = {
+            'url': url,
+            'sha256': sha256,
+            'ext': ext,
+            'size': os.path.getsize(blob_path),
+            'etag': etag,
+            'last_modified': last_modified,
+            'content_type': content_type,
+            'fetched_at': now,
+            'validated_at': now,
+        }
+        self._write_entry(entry)
+        return entry
+
+    def revalidated(self, entry, etag=None, last_modified=None):
+        """服务器返回304后更新索引条目的校验信息，返回更新后的条目"""
+        entry = dict(entry)
+        entry['etag'] = etag or entry.get('etag')
+        entry['last_modified'] = last_modified or entry.get('last_modified')
+        entry['validated_at'] = time.time()
+        self._write_entry(entry)
+        return entry
+
+    def _blob_referenced(self, sha256):
+        """是否还有URL索引条目指向该内容"""
+        if not os.path.isdir(self.index_dir):
+            return False
+        for name in os.listdir(self.index_dir):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.index_dir, name), 'r', encoding='utf-8') as f:
+                    if json.load(f).get('sha256') == sha256:
+                        return True
+            except (OSError, ValueError):
+                continue
+        return False
+
+    def discard(self, url):
+        """
+        删除URL的索引条目（例如下载的内容已损坏）
+
+        相同内容可能被其他URL的索引条目共用，只有没有其他条目指向该内容时才删除内容文件。
+        返回是否删除了内容文件。
+        """
+        try:
+            with open(self._index_path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return False
+        os.remove(self._index_path(url))
+        if self._blob_referenced(entry['sha256']):
+            logger.debug(f"内容仍被其他URL使用，保留：{entry['sha256']}")
+            return False
+        try:
+            os.remove(self.blob_path(entry['sha256'], entry['ext']))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def materialize(self, entry, dest_path):
+        """
+        在 dest_path 生成指向内容文件的硬链接（不支持硬链接时复制）
+
+        保留 {报纸}_{日期}.{扩展名} 这样便于查看的文件名，而不额外占用磁盘空间。
+        """
+        blob_path = self.blob_path(entry['sha256'], entry['ext'])
+        if os.path.exists(dest_path) and os.path.samefile(blob_path, dest_path):
+            return dest_path
+
+        tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            shutil.copyfile(blob_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+        return dest_path
+
+
+# 创建全局存储实例
+artifact_store = ArtifactStore()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量处理模块 - 无交互地按「日期范围 × 报纸」批量下载报纸文件
+
+使用示例：
+    python batch.py --start 2026-01-01 --end 2026-03-31 --newspapers 人民日报 纽约时报
+"""
+
+import sys
+import argparse
+import datetime
+import asyncio
+from config import NEWSPAPER_CONFIG, BATCH_MAX_WORKERS, BATCH_PER_HOST_LIMIT
+from downloader import async_download_newspaper_file, HostLimiter
+from edition_crawler import async_download_edition
+from transport import create_http_session
+from utils import init_folders
+from logger import logger
+
+
+def iter_dates(start_date, end_date):
+    """按天遍历日期范围（包含首尾）"""
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+    current = start_date
+    while current <= end_date:
+        yield current
+        current += datetime.timedelta(days=1)
+
+
+def build_jobs(newspapers, start_date, end_date):
+    """生成批量任务列表：[(报纸名称, 日期对象, 日期字符串), ...]"""
+    jobs = []
+    for date_obj in iter_dates(start_date, end_date):
+        date_str = date_obj.strftime('%Y%m%d')
+        for newspaper_name in newspapers:
+            jobs.append((newspaper_name, date_obj, date_str))
+    return jobs
+
+
+async def run_batch_async(jobs, max_workers=BATCH_MAX_WORKERS, per_host_limit=BATCH_PER_HOST_LIMIT, full_edition=False):
+    """
+    在一个事件循环中并发执行批量下载任务
+
+    所有任务共享一个带连接池的aiohttp会话（连接复用、DNS缓存），同时进行的下载不超过 max_workers 个，
+    同一站点的并发请求数不超过 per_host_limit，避免对单个网站造成压力或触发反爬限制。
+    full_edition 为True时下载每期的全部版面，而不只是头版。
+
+    返回：[(报纸名称, 日期字符串, 文件路径或None), ...]，顺序与jobs一致；
+    整版模式下文件路径为该期成功下载的版面路径列表
+    """
+    limiter = HostLimiter(per_host_limit)
+    worker_slots = asyncio.Semaphore(max(1, max_workers))
+
+    logger.info(f"批量下载开始：共 {len(jobs)} 个任务，并发数 {max_workers}，单站点并发 {per_host_limit}")
+    print(f"🚀 批量下载开始：共 {len(jobs)} 个任务，并发数 {max_workers}，单站点并发 {per_host_limit}")
+
+    async with create_http_session() as session:
+        async def _download(job):
+            newspaper_name, date_obj, date_str = job
+            download = async_download_edition if full_edition else async_download_newspaper_file
+            async with worker_slots:
+                try:
+                    return await download(
+                        newspaper_name, date_obj, date_str, session=session, limiter=limiter
+                    )
+                except Exception as e:
+                    logger.error(f"批量任务异常：{newspaper_name} {date_str} - {e}", exc_info=True)
+                    return None
+
+        paths = await asyncio.gather(*(_download(job) for job in jobs))
+
+    return [(newspaper_name, date_str, path) for (newspaper_name, _, date_str), path in zip(jobs, paths)]
+
+
+def run_batch(jobs, max_workers=BATCH_MAX_WORKERS, per_host_limit=BATCH_PER_HOST_LIMIT, full_edition=False):
+    """执行批量下载任务 - 同步接口"""
+    return asyncio.run(run_batch_async(jobs, max_workers=max_workers, per_host_limit=per_host_limit,
+                                       full_edition=full_edition))
+
+
+def print_batch_summary(results):
+    """打印批量任务结果汇总"""
+    succeeded = [r for r in results if r[2]]
+    failed = [r for r in results if not r[2]]
+
+    print("=" * 70)
+    print(f"📊 批量下载完成：成功 {len(succeeded)} 个，失败 {len(failed)} 个")
+    for newspaper_name, date_str, _ in failed:
+        print(f"   ❌ {newspaper_name} {date_str}")
+    print("=" * 70)
+    logger.info(f"批量下载完成：成功 {len(succeeded)} 个，失败 {len(failed)} 个")
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="批量下载指定日期范围的报纸文件")
+    parser.add_argument("--start", required=True, help="开始日期 (YYYY-MM-DD)")
+    parser.add_argument("--end", help="结束日期 (YYYY-MM-DD)，默认与开始日期相同")
+    parser.add_argument("--newspapers", nargs="+", default=list(NEWSPAPER_CONFIG.keys()),
+                        help="报纸名称列表，默认全部")
+    parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS, help="最大并发数")
+    parser.add_argument("--per-host", type=int, default=BATCH_PER_HOST_LIMIT, help="同一站点的最大并发数")
+    parser.add_argument("--full-edition", action="store_true", help="下载每期的全部版面（默认只下载头版）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """批量模式入口"""
+    args = parse_args(argv)
+
+    try:
+        start_date = datetime.datetime.strptime(args.start, '%Y-%m-%d')
+        end_date = datetime.datetime.strptime(args.end, '%Y-%m-%d') if args.end else start_date
+    except ValueError:
+        print("❌ 日期格式错误，请输入如 2026-02-19 这样的格式")
+        return 1
+
+    unknown = [name for name in args.newspapers if name not in NEWSPAPER_CONFIG]
+    if unknown:
+        print(f"❌ 未找到报纸：{', '.join(unknown)}")
+        return 1
+
+    init_folders()
+    jobs = build_jobs(args.newspapers, start_date, end_date)
+    results = run_batch(jobs, max_workers=args.workers, per_host_limit=args.per_host,
+                        full_edition=args.full_edition)
+    print_batch_summary(results)
+    return 0 if all(r[2] for r in results) else 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        logger.warning("批量任务被用户中断")
+        print("\n\n⏹️ 批量任务已被用户中断")
+        sys.exit(130)
@@ -15,6 +15,7 @@ load_dotenv(".env.example", override=False)  # 加载示例配置作为兜底
 # -------------------- API配置 --------------------
 TONGYI_API_KEY = os.getenv("TONGYI_API_KEY", "")  # 通义千问API Key
 TONGYI_API_URL = os.getenv("TONGYI_API_URL", "https://dashscope.aliyuncs.com/api/v1/services/aigc/multimodal-generation/generation")
+TONGYI_BASE_URL = os.getenv("TONGYI_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")  # 通义千问OpenAI兼容接口地址
 
 # -------------------- 百度文心一言API配置 --------------------
 ERNIE_API_KEY = os.getenv("ERNIE_API_KEY", "")  # 百度文心一言API Key
@@ -42,12 +43,59 @@ NEWSPAPER_CONFIG = {
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 30))
 IMAGE_FOLDER = os.getenv("IMAGE_FOLDER", "newspaper_images")
 COPY_FOLDER = os.getenv("COPY_FOLDER", "newspaper_copies")
+ARTIFACT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", os.path.join(IMAGE_FOLDER, ".store"))  # 按内容寻址的文件存储目录
+EDITION_CACHE_DIR = os.getenv("EDITION_CACHE_DIR", os.path.join(IMAGE_FOLDER, ".editions"))  # 整版版面列表缓存目录
+POPPLER_PATH = os.getenv("POPPLER_PATH") or None  # poppler路径（Windows用户需指定，如 C:\poppler-24.02.0\Library\bin）
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 0))  # PDF并行渲染的进程数，0表示使用全部CPU核心
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(IMAGE_FOLDER, ".render_cache"))  # 渲染结果缓存目录
+RENDER_CACHE_MAX_MB = int(os.getenv("RENDER_CACHE_MAX_MB", 512))  # 渲染结果缓存的磁盘上限（MB）
 USER_AGENT = os.getenv("USER_AGENT", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
 
+# -------------------- 连接池配置 --------------------
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 32))  # 进程内共享连接池的最大连接数
+HTTP_KEEPALIVE_TIMEOUT = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 60))  # 空闲连接保持时间（秒）
+DNS_CACHE_TTL = int(os.getenv("DNS_CACHE_TTL", 300))  # DNS缓存时间（秒）
+
 # -------------------- AI模型参数配置 --------------------
 AI_TEMPERATURE = float(os.getenv("AI_TEMPERATURE", 0.1))
 AI_MAX_TOKENS = int(os.getenv("AI_MAX_TOKENS", 2000))
 AI_TOP_P = float(os.getenv("AI_TOP_P", 0.9))
+AI_MODEL = os.getenv("AI_MODEL", "qwen-vl-plus")  # 通义千问多模态模型
+AI_REQUEST_TIMEOUT = int(os.getenv("AI_REQUEST_TIMEOUT", 120))  # 单次AI调用的超时时间（秒）
+AI_STREAM = os.getenv("AI_STREAM", "true").lower() in ("1", "true", "yes")  # 是否流式输出AI解析结果
+
+# -------------------- PDF文字层配置 --------------------
+PDF_TEXT_LAYER = os.getenv("PDF_TEXT_LAYER", "true").lower() in ("1", "true", "yes")  # PDF有文字层时直接提取文字，不走图片解析
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", 200))  # 文字层至少包含的有效字符数
+AI_TEXT_MODEL = os.getenv("AI_TEXT_MODEL", "qwen-turbo")  # 解析文字层使用的纯文本模型
+AI_TEXT_MAX_CHARS = int(os.getenv("AI_TEXT_MAX_CHARS", 12000))  # 发送给纯文本模型的最大字数
+
+# -------------------- AI结果缓存配置 --------------------
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")  # 是否启用AI结果缓存
+AI_CACHE_DIR = os.getenv("AI_CACHE_DIR", os.path.join(COPY_FOLDER, ".ai_cache"))  # AI结果缓存目录
+AI_CACHE_MAX_MB = int(os.getenv("AI_CACHE_MAX_MB", 64))  # AI结果缓存的磁盘上限（MB）
+AI_CACHE_TTL_HOURS = float(os.getenv("AI_CACHE_TTL_HOURS", 24 * 30))  # AI结果缓存有效期（小时），0表示永不过期
+AI_DEDUP_ENABLED = os.getenv("AI_DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")  # 近似重复的版面复用已有解析结果
+AI_DEDUP_MAX_DISTANCE = int(os.getenv("AI_DEDUP_MAX_DISTANCE", 5))  # 视为同一版面的最大哈希距离（0~64，越小越严格）
+AI_DEDUP_FINE_MAX_DISTANCE = int(os.getenv("AI_DEDUP_FINE_MAX_DISTANCE", 10))  # 确认同一版面的最大细哈希距离（0~256）
+AI_METRICS_ENABLED = os.getenv("AI_METRICS_ENABLED", "true").lower() in ("1", "true", "yes")  # 是否记录每次AI调用的用量和耗时
+AI_METRICS_FILE = os.getenv("AI_METRICS_FILE", os.path.join(os.path.dirname(COPY_FOLDER), "logs", "ai_metrics.jsonl"))  # AI调用统计文件
+
+# -------------------- AI调用限额配置 --------------------
+AI_RPM_LIMIT = int(os.getenv("AI_RPM_LIMIT", 60))  # 每分钟最多请求数（0表示不限制）
+AI_TPM_LIMIT = int(os.getenv("AI_TPM_LIMIT", 100000))  # 每分钟最多Token数（0表示不限制）
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 4))  # AI调用的最大并发数（被限流时自动减半）
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", 5))  # AI调用失败的最大重试次数
+
+# -------------------- 多AI服务配置 --------------------
+AI_PROVIDERS = os.getenv("AI_PROVIDERS", "qwen")  # 按优先级排列的AI服务，逗号分隔（可选 qwen、ernie、mock）
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", 95))  # 主服务耗时超过该分位数仍未返回时发出对冲请求
+AI_HEDGE_DEFAULT_DELAY = float(os.getenv("AI_HEDGE_DEFAULT_DELAY", 20))  # 耗时样本不足时的对冲等待秒数
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", 10))  # 按分位数计算等待时间所需的最少样本数
+
+# -------------------- 分块解析配置 --------------------
+AI_TILE_GRID = os.getenv("AI_TILE_GRID", "1x1")  # 整版切分的行×列数，如 2x2；1x1表示不分块
+AI_TILE_OVERLAP = float(os.getenv("AI_TILE_OVERLAP", 0.1))  # 相邻分块的重叠比例
 
 # -------------------- 数据库配置 --------------------
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -55,3 +103,22 @@ DB_PORT = os.getenv("DB_PORT", "3306")
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_NAME = os.getenv("DB_NAME", "newspaper_db")
+DB_BACKEND = os.getenv("DB_BACKEND", "auto")  # 存储后端：postgres / sqlite / auto（PostgreSQL不可用时改用SQLite）
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(COPY_FOLDER, "newspaper.db"))  # SQLite数据库文件路径
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))  # 连接池保持的最少连接数
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 8))  # 连接池的最大连接数（并发写入的线程超过时等待）
+DB_BATCH_PAGE_SIZE = int(os.getenv("DB_BATCH_PAGE_SIZE", 1000))  # 批量写入时每条语句/每次COPY的行数
+DB_COPY_THRESHOLD = int(os.getenv("DB_COPY_THRESHOLD", 10000))  # 批量写入达到该条数时改用COPY，0表示不使用COPY
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", 1000))  # 异步写入时攒够多少条写入一次
+DB_WRITE_FLUSH_SECONDS = float(os.getenv("DB_WRITE_FLUSH_SECONDS", 2))  # 异步写入时记录最多等待多少秒就写入
+DB_WRITE_QUEUE_MAX = int(os.getenv("DB_WRITE_QUEUE_MAX", 100000))  # 异步写入队列的最大长度（满时放入记录需等待）
+DB_WRITE_SPOOL = os.getenv("DB_WRITE_SPOOL", os.path.join(COPY_FOLDER, ".db_spool.jsonl"))  # 数据库不可用时暂存记录的缓冲文件
+DB_WRITE_RETRY_SECONDS = float(os.getenv("DB_WRITE_RETRY_SECONDS", 30))  # 数据库不可用时每隔多少秒重试
+DB_WRITE_DEAD_LETTER = os.getenv("DB_WRITE_DEAD_LETTER", os.path.join(COPY_FOLDER, ".db_dead_letter.jsonl"))  # 数据本身写不进数据库的记录
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")  # 写入数据库的摘要同步加入搜索索引
+SEARCH_INDEX_DIR = os.getenv("SEARCH_INDEX_DIR", os.path.join(COPY_FOLDER, ".search_index"))  # 标题搜索索引目录
+
+# -------------------- 批量处理配置 --------------------
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", 8))  # 批量下载的最大并发数
+BATCH_PER_HOST_LIMIT = int(os.getenv("BATCH_PER_HOST_LIMIT", 2))  # 同一站点的最大并发连接数
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", 3))  # PDF下载中断后的最大续传次数
@@ -2,134 +2,531 @@
 # -*- coding: utf-8 -*-
 """
 数据库模块 - 负责数据库连接和操作
+
+DatabaseManager 通过存储后端读写数据（DB_BACKEND）：
+- postgres：PostgreSQL（需要psycopg2）
+- sqlite：本地SQLite数据库文件（SQLITE_PATH），无需数据库服务，单机部署即可使用
+- auto（默认）：优先使用PostgreSQL，未安装psycopg2或连接失败时改用SQLite
+
+两种后端的数据表结构相同（见 db_schema：报纸、期、版面、新闻、AI调用），首次连接时执行
+尚未执行的迁移。新闻写入 articles，以 (报纸, 日期, 标题) 唯一，重复的记录跳过；
+newspaper_summary 为兼容视图，列与早期的扁平表相同。
+
+PostgreSQL：同一进程内的所有 DatabaseManager 共享一个线程安全的连接池（按连接参数区分）
+- 首次连接时完成一次初始化（检查/创建数据库、执行数据库迁移），之后的连接直接从池中借用
+- 目标数据库已存在时直接连接，只有连接失败提示数据库不存在时才连接默认的postgres数据库创建
+- 并发的处理线程各自借用一个连接，用完归还；连接数达到 DB_POOL_MAX 时等待其他线程归还
+- 批量写入按多行VALUES分页发送（每页一条语句），数量较大时改用COPY写入临时表再合并
+- articles 按月分区，写入前按需创建涉及的月分区
+
+SQLite：同一数据库文件在进程内共享一个连接（写入加锁），使用WAL模式，
+批量写入每页一个事务，读取不会被写入阻塞。
+
+查询：
+- list_summaries 按日期从新到旧键集分页（以上一页最后一条的 (日期, 编号) 为游标），翻到多深都只读一页的索引
+- export_summaries 分批读取（PostgreSQL使用服务器端游标）写入CSV，导出整个归档也只占用一页的内存
+- daily_stats / monthly_stats 只读每日统计表 daily_stats，不扫描新闻表
 """
 
+import io
 import os
-from config import COPY_FOLDER
+import abc
+import csv
+import collections
+import atexit
+import sqlite3
+import datetime
+import threading
+import contextlib
+from config import (COPY_FOLDER, DB_POOL_MIN, DB_POOL_MAX, DB_BATCH_PAGE_SIZE, DB_COPY_THRESHOLD,
+                    SEARCH_INDEX_ENABLED, DB_BACKEND, SQLITE_PATH)
+from search_index import search_index
+from db_schema import migrate, missing_partitions, create_partitions, remember_partitions
 from logger import logger
 
 # 尝试导入psycopg2，如果失败则标记为不可用
 try:
     import psycopg2
-    from psycopg2 import OperationalError
+    from psycopg2 import OperationalError, sql
+    from psycopg2.pool import ThreadedConnectionPool
+    from psycopg2.extras import execute_values
     POSTGRES_AVAILABLE = True
 except ImportError:
     POSTGRES_AVAILABLE = False
 
 
-class DatabaseManager:
-    """数据库管理类"""
-    
+if POSTGRES_AVAILABLE:
+    class BlockingConnectionPool(ThreadedConnectionPool):
+        """连接数达到上限时等待归还，而不是像 ThreadedConnectionPool 那样直接抛出 PoolError"""
+
+        def __init__(self, minconn, maxconn, *args, **kwargs):
+            self._slots = threading.BoundedSemaphore(maxconn)
+            super().__init__(minconn, maxconn, *args, **kwargs)
+
+        def getconn(self, key=None):
+            self._slots.acquire()
+            try:
+                return super().getconn(key)
+            except Exception:
+                self._slots.release()
+                raise
+
+        def putconn(self, conn, key=None, close=False):
+            try:
+                super().putconn(conn, key, close)
+            finally:
+                self._slots.release()
+
+
+# 进程内共享的连接池/连接和已完成初始化的数据库：连接参数 -> 连接池（PostgreSQL）或连接（SQLite）
+_pools = {}
+_bootstrapped = set()
+_pools_lock = threading.Lock()
+
+
+def close_pools():
+    """关闭进程内的所有连接池和连接（进程退出时自动调用）"""
+    with _pools_lock:
+        for pool in _pools.values():
+            try:
+                if isinstance(pool, sqlite3.Connection):
+                    pool.close()
+                else:
+                    pool.closeall()
+            except Exception as e:
+                logger.debug(f"关闭连接池失败：{e}")
+        _pools.clear()
+
+
+atexit.register(close_pools)
+
+
+def _is_missing_database(error):
+    """连接失败是否因为目标数据库不存在"""
+    return 'does not exist' in str(error) or '不存在' in str(error)
+
+
+def normalize_date(value):
+    """把日期（date对象、YYYYMMDD 或 YYYY-MM-DD）统一为 YYYY-MM-DD 字符串"""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime('%Y-%m-%d')
+    value = str(value).strip()
+    if len(value) == 8 and value.isdigit():
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value
+
+
+class StorageBackend(abc.ABC):
+    """存储后端接口"""
+
+    name = ''
+
+    @abc.abstractmethod
+    def connect(self):
+        """连接数据库并完成初始化，成功时返回True"""
+
+    def insert_summary(self, row):
+        """插入一条 (报纸, 日期, 标题, 摘要)，返回是否新增（已存在时为False）"""
+        return self.bulk_insert([tuple(row)], DB_BATCH_PAGE_SIZE, 0) == 1
+
+    @abc.abstractmethod
+    def bulk_insert(self, rows, page_size, copy_threshold):
+        """批量插入，已存在的记录跳过，返回实际插入的条数；失败时回滚并抛出异常"""
+
+    @abc.abstractmethod
+    def iter_summaries(self, page_size, newspaper=None, start=None, end=None):
+        """按日期顺序分批读取摘要（可按报纸和日期范围过滤），每批为 [(报纸, 日期, 标题, 摘要), ...]"""
+
+    @abc.abstractmethod
+    def _fetch(self, query, params):
+        """执行一条查询，返回全部结果"""
+
+    def close(self):
+        """结束本实例的使用（共享的连接池/连接不在这里关闭）"""
+
+    placeholder = '%s'
+
+    def _where(self, alias, newspaper=None, start=None, end=None, after=None):
+        """按报纸、日期范围和翻页位置（日期, 编号）生成 WHERE 子句和参数"""
+        p = self.placeholder
+        clauses, params = [], []
+        if newspaper:
+            clauses.append(f"n.name = {p}")
+            params.append(newspaper)
+        if start:
+            clauses.append(f"{alias}.date >= {p}")
+            params.append(normalize_date(start))
+        if end:
+            clauses.append(f"{alias}.date <= {p}")
+            params.append(normalize_date(end))
+        if after:
+            clauses.append(f"({alias}.date, {alias}.id) < ({p}, {p})")
+            params.extend(after)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _summaries_query(self, columns, order, **filters):
+        where, params = self._where('a', **filters)
+        return (f"SELECT {columns} FROM articles a JOIN newspapers n ON n.id = a.newspaper_id{where} "
+                f"ORDER BY {order}"), params
+
+    def list_summaries(self, newspaper=None, start=None, end=None, after=None, limit=100):
+        """按 (日期, 编号) 倒序取 after 之后的一页，每条为 (编号, 报纸, 日期, 标题, 摘要)"""
+        query, params = self._summaries_query("a.id, n.name, a.date, a.title, a.summary",
+                                              "a.date DESC, a.id DESC", newspaper=newspaper,
+                                              start=start, end=end, after=after)
+        return self._fetch(f"{query} LIMIT {self.placeholder}", params + [limit])
+
+    def daily_stats(self, newspaper=None, start=None, end=None):
+        """按日期、报纸排列的每日统计，每条为 (报纸, 日期, 新闻条数, 标题字数, 摘要字数)"""
+        where, params = self._where('s', newspaper=newspaper, start=start, end=end)
+        return self._fetch("SELECT n.name, s.date, s.articles, s.title_chars, s.summary_chars "
+                           f"FROM daily_stats s JOIN newspapers n ON n.id = s.newspaper_id{where} "
+                           "ORDER BY s.date, n.name", params)
+
+
+class PostgresBackend(StorageBackend):
+    """PostgreSQL存储后端（进程内共享连接池）"""
+
+    name = 'postgres'
+
     def __init__(self):
-        """初始化数据库连接"""
-        if not POSTGRES_AVAILABLE:
-            self.available = False
-            return
-        
-        self.available = True
         self.host = os.getenv("DB_HOST", "localhost")
         self.port = int(os.getenv("DB_PORT", "5432"))  # PostgreSQL默认端口
         self.user = os.getenv("DB_USER", "postgres")  # PostgreSQL默认用户
         self.password = os.getenv("DB_PASSWORD", "")
         self.database = os.getenv("DB_NAME", "newspaper_db")
-        self.connection = None
-        self.cursor = None
-    
-    def connect(self):
-        """连接数据库"""
-        if not self.available:
-            logger.warning("数据库功能不可用，请安装psycopg2")
-            print("❌ 数据库功能不可用，请安装psycopg2")
-            print("💡 运行命令：pip install psycopg2-binary")
-            return False
-        
+        self.pool = None
+
+    @property
+    def _pool_key(self):
+        return (self.host, self.port, self.user, self.database)
+
+    def _connect_args(self, dbname):
+        return dict(host=self.host, port=self.port, user=self.user, password=self.password, dbname=dbname)
+
+    def _create_database(self):
+        """连接默认的postgres数据库，目标数据库不存在时创建"""
+        logger.debug("连接默认数据库检查目标数据库...")
+        temp_conn = psycopg2.connect(**self._connect_args("postgres"))
         try:
-            # 首先尝试连接到默认的postgres数据库
-            logger.debug(f"尝试连接默认数据库...")
-            temp_conn = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                dbname="postgres"
-            )
             temp_conn.autocommit = True
-            temp_cursor = temp_conn.cursor()
-            
-            # 检查目标数据库是否存在
-            temp_cursor.execute(f"SELECT 1 FROM pg_database WHERE datname = '{self.database}'")
-            exists = temp_cursor.fetchone()
-            
-            if not exists:
-                # 创建数据库
-                logger.info(f"数据库 {self.database} 不存在，正在创建...")
-                print(f"📋 数据库 {self.database} 不存在，正在创建...")
-                temp_cursor.execute(f"CREATE DATABASE {self.database}")
-                logger.info(f"数据库 {self.database} 创建成功")
-                print(f"✅ 数据库 {self.database} 创建成功")
-            
-            # 关闭临时连接
-            temp_cursor.close()
+            with temp_conn.cursor() as temp_cursor:
+                temp_cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (self.database,))
+                if not temp_cursor.fetchone():
+                    logger.info(f"数据库 {self.database} 不存在，正在创建...")
+                    print(f"📋 数据库 {self.database} 不存在，正在创建...")
+                    temp_cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(self.database)))
+                    logger.info(f"数据库 {self.database} 创建成功")
+                    print(f"✅ 数据库 {self.database} 创建成功")
+        finally:
             temp_conn.close()
-            
-            # 连接到目标数据库
-            logger.debug(f"尝试连接数据库：{self.host}:{self.port}/{self.database}")
-            self.connection = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                dbname=self.database
-            )
-            logger.info("数据库连接成功")
-            print("✅ 数据库连接成功")
-            self.cursor = self.connection.cursor()
-            self.create_table()
+
+    def _open_pool(self):
+        """创建连接池；目标数据库不存在时先创建数据库"""
+        connect_args = self._connect_args(self.database)
+        logger.debug(f"尝试连接数据库：{self.host}:{self.port}/{self.database}")
+        try:
+            return BlockingConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **connect_args)
+        except OperationalError as e:
+            if not _is_missing_database(e):
+                raise
+        self._create_database()
+        return BlockingConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **connect_args)
+
+    def connect(self):
+        """连接数据库（进程内首次调用时创建连接池并初始化数据表，之后直接复用）"""
+        try:
+            with _pools_lock:
+                pool = _pools.get(self._pool_key)
+                if pool is None:
+                    pool = _pools[self._pool_key] = self._open_pool()
+                    logger.info("数据库连接成功")
+                    print("✅ 数据库连接成功")
+                self.pool = pool
+                if self._pool_key not in _bootstrapped and self.migrate_schema():
+                    _bootstrapped.add(self._pool_key)
             return True
         except OperationalError as e:
             logger.error(f"数据库连接失败：{e}")
             print(f"❌ 数据库连接失败：{e}")
             print("💡 请检查.env文件中的数据库配置")
             return False
-    
-    def create_table(self):
-        """创建数据表"""
+
+    @contextlib.contextmanager
+    def borrow(self):
+        """从连接池借用一个连接，正常结束时提交、出错时回滚，用完归还"""
+        conn = self.pool.getconn()
         try:
-            logger.debug("检查/创建数据表")
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS newspaper_summary (
-                id SERIAL PRIMARY KEY,
-                newspaper VARCHAR(100) NOT NULL,
-                date DATE NOT NULL,
-                title VARCHAR(255) NOT NULL,
-                summary TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE (newspaper, date, title)
-            );
-            """
-            self.cursor.execute(create_table_query)
-            self.connection.commit()
-            logger.info("数据表检查/创建成功")
-            print("✅ 数据表检查/创建成功")
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            # 已断开的连接不再放回池中
+            self.pool.putconn(conn, close=bool(conn.closed))
+
+    def migrate_schema(self):
+        """执行尚未执行的数据库迁移，成功时返回True"""
+        try:
+            logger.debug("检查/升级数据库结构")
+            with self.borrow() as conn:
+                migrate(conn, 'postgres')
+            logger.info("数据库结构检查完成")
+            print("✅ 数据库结构检查完成")
+            return True
         except Exception as e:
-            logger.error(f"创建数据表失败：{e}")
-            print(f"❌ 创建数据表失败：{e}")
-    
+            logger.error(f"数据库迁移失败：{e}")
+            print(f"❌ 数据库迁移失败：{e}")
+            return False
+
+    @staticmethod
+    def _newspaper_ids(cursor, names):
+        """报纸名称 -> 编号（不存在的报纸先登记）"""
+        names = sorted(names)
+        cursor.execute("INSERT INTO newspapers (name) SELECT unnest(%s::varchar[]) ON CONFLICT (name) DO NOTHING",
+                       (names,))
+        cursor.execute("SELECT name, id FROM newspapers WHERE name = ANY(%s)", (names,))
+        return dict(cursor.fetchall())
+
+    @classmethod
+    def _insert_values(cls, cursor, summaries, page_size):
+        """多行VALUES分页插入，返回实际插入的条数"""
+        ids = cls._newspaper_ids(cursor, {row[0] for row in summaries})
+        insert_query = """
+        INSERT INTO articles (newspaper_id, date, title, summary)
+        VALUES %s
+        ON CONFLICT (newspaper_id, date, title) DO NOTHING
+        RETURNING 1
+        """
+        rows = [(ids[newspaper], date, title, summary) for newspaper, date, title, summary in summaries]
+        inserted = execute_values(cursor, insert_query, rows, page_size=page_size, fetch=True)
+        return len(inserted)
+
+    @staticmethod
+    def _insert_copy(cursor, summaries, page_size):
+        """COPY写入临时表后合并到数据表，返回实际插入的条数"""
+        cursor.execute("""
+        CREATE TEMP TABLE articles_staging (
+            newspaper VARCHAR(100), date DATE, title TEXT, summary TEXT
+        ) ON COMMIT DROP
+        """)
+        # 每次COPY一页，内存中只保留一页的CSV文本
+        for start in range(0, len(summaries), page_size):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(summaries[start:start + page_size])
+            buffer.seek(0)
+            cursor.copy_expert("COPY articles_staging (newspaper, date, title, summary) "
+                               "FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute("INSERT INTO newspapers (name) SELECT DISTINCT newspaper FROM articles_staging "
+                       "ON CONFLICT (name) DO NOTHING")
+        cursor.execute("""
+        INSERT INTO articles (newspaper_id, date, title, summary)
+        SELECT DISTINCT ON (n.id, s.date, s.title) n.id, s.date, s.title, s.summary
+        FROM articles_staging s JOIN newspapers n ON n.name = s.newspaper
+        ON CONFLICT (newspaper_id, date, title) DO NOTHING
+        """)
+        return cursor.rowcount
+
+    def bulk_insert(self, rows, page_size, copy_threshold):
+        """条数达到 copy_threshold 时使用COPY，否则按 page_size 条一页的多行VALUES插入（整批一个事务）"""
+        use_copy = copy_threshold and len(rows) >= copy_threshold
+        logger.debug(f"批量插入数据：{len(rows)} 条（{'COPY' if use_copy else '多行VALUES'}）")
+        rows = [(newspaper, normalize_date(date), title, summary) for newspaper, date, title, summary in rows]
+        months = missing_partitions(self._pool_key, {row[1] for row in rows})
+        if months:
+            # 分区在写入之前单独建立并提交，批量写入的事务不持有 articles 的排他锁
+            with self.borrow() as conn, conn.cursor() as cursor:
+                create_partitions(cursor, months)
+            remember_partitions(self._pool_key, months)
+        with self.borrow() as conn, conn.cursor() as cursor:
+            if use_copy:
+                return self._insert_copy(cursor, rows, page_size)
+            return self._insert_values(cursor, rows, page_size)
+
+    def iter_summaries(self, page_size, newspaper=None, start=None, end=None):
+        # 服务器端游标分批读取，不把整张表读入内存
+        query, params = self._summaries_query("n.name, a.date, a.title, a.summary", "a.date, a.id",
+                                              newspaper=newspaper, start=start, end=end)
+        with self.borrow() as conn, conn.cursor(name="newspaper_summary_scan") as cursor:
+            cursor.itersize = page_size
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    break
+                yield rows
+
+    def _fetch(self, query, params):
+        with self.borrow() as conn, conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def close(self):
+        self.pool = None
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite存储后端（WAL模式，进程内同一数据库文件共享一个连接）"""
+
+    name = 'sqlite'
+    placeholder = '?'
+
+    # 同一数据库文件的写入锁
+    _locks = {}
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self.conn = None
+        self._lock = None
+
+    def connect(self):
+        """打开数据库文件（进程内首次调用时设置WAL模式并初始化数据表，之后直接复用）"""
+        key = ('sqlite', os.path.abspath(self.path))
+        try:
+            with _pools_lock:
+                conn = _pools.get(key)
+                if conn is None:
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    # 事务由本类显式控制（isolation_level=None），多个线程共用连接，写入时加锁
+                    conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    # WAL模式下NORMAL只在检查点时同步磁盘，断电最多丢失最近的事务，不会损坏数据库
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.execute("PRAGMA temp_store=MEMORY")
+                    _pools[key] = conn
+                    logger.info(f"本地数据库连接成功：{self.path}")
+                    print(f"✅ 本地数据库连接成功：{self.path}")
+                self.conn = conn
+                self._lock = self._locks.setdefault(key, threading.Lock())
+                if key not in _bootstrapped and self.migrate_schema():
+                    _bootstrapped.add(key)
+            return True
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"本地数据库连接失败：{e}")
+            print(f"❌ 本地数据库连接失败：{e}")
+            return False
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """加锁执行一个写事务，正常结束时提交、出错时回滚（提交失败如 database is locked 也回滚）"""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+                self.conn.execute("COMMIT")
+            except Exception:
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                raise
+
+    def migrate_schema(self):
+        """执行尚未执行的数据库迁移，成功时返回True"""
+        try:
+            logger.debug("检查/升级数据库结构")
+            with self._lock:
+                migrate(self.conn, 'sqlite')
+            logger.info("数据库结构检查完成")
+            print("✅ 数据库结构检查完成")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"数据库迁移失败：{e}")
+            print(f"❌ 数据库迁移失败：{e}")
+            return False
+
+    def bulk_insert(self, rows, page_size, copy_threshold):
+        """按 page_size 条一个事务写入（SQLite没有COPY，忽略 copy_threshold）"""
+        insert_query = ("INSERT INTO articles (newspaper_id, date, title, summary) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (newspaper_id, date, title) DO NOTHING")
+        ids = {}
+        inserted = 0
+        for start in range(0, len(rows), page_size):
+            page = rows[start:start + page_size]
+            with self.transaction() as conn:
+                for newspaper in {row[0] for row in page} - ids.keys():
+                    conn.execute("INSERT INTO newspapers (name) VALUES (?) ON CONFLICT (name) DO NOTHING", (newspaper,))
+                    ids[newspaper] = conn.execute("SELECT id FROM newspapers WHERE name = ?",
+                                                  (newspaper,)).fetchone()[0]
+                # rowcount 不含触发器写入统计表的行，ON CONFLICT 跳过的记录计为0
+                cursor = conn.executemany(insert_query, [(ids[newspaper], normalize_date(date), title, summary)
+                                                         for newspaper, date, title, summary in page])
+                inserted += cursor.rowcount
+        return inserted
+
+    def iter_summaries(self, page_size, newspaper=None, start=None, end=None):
+        # WAL模式下读取不阻塞写入，使用独立的连接读取
+        query, params = self._summaries_query("n.name, a.date, a.title, a.summary", "a.date, a.id",
+                                              newspaper=newspaper, start=start, end=end)
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def _fetch(self, query, params):
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+    def close(self):
+        self.conn = None
+
+
+def create_backend(name=DB_BACKEND):
+    """按名称（auto/postgres/sqlite）创建存储后端；postgres 需要psycopg2，不可用时返回None"""
+    name = (name or 'auto').lower()
+    if name == 'sqlite' or (name == 'auto' and not POSTGRES_AVAILABLE):
+        return SQLiteBackend()
+    if POSTGRES_AVAILABLE:
+        return PostgresBackend()
+    return None
+
+
+class DatabaseManager:
+    """数据库管理类"""
+
+    def __init__(self, backend=None):
+        """初始化存储后端（默认按 DB_BACKEND 选择，连接在 connect 时建立）"""
+        # 写入的摘要同步加入标题搜索索引
+        self.search_index = search_index if SEARCH_INDEX_ENABLED else None
+        self.backend = backend or create_backend()
+        self.available = self.backend is not None
+        self.connected = False
+
+    def connect(self):
+        """连接数据库；auto 模式下PostgreSQL连接失败时改用本地SQLite数据库"""
+        if not self.available:
+            logger.warning("数据库功能不可用，请安装psycopg2")
+            print("❌ 数据库功能不可用，请安装psycopg2")
+            print("💡 运行命令：pip install psycopg2-binary，或在.env中设置 DB_BACKEND=sqlite 使用本地数据库")
+            return False
+
+        self.connected = self.backend.connect()
+        if not self.connected and DB_BACKEND.lower() == 'auto' and isinstance(self.backend, PostgresBackend):
+            logger.warning(f"PostgreSQL不可用，改用本地SQLite数据库：{SQLITE_PATH}")
+            print(f"⚠️  PostgreSQL不可用，改用本地SQLite数据库：{SQLITE_PATH}")
+            self.backend = SQLiteBackend()
+            self.connected = self.backend.connect()
+        return self.connected
+
     def insert_summary(self, newspaper, date, title, summary):
         """插入摘要数据"""
-        if not self.available:
+        if not self.connected:
             return False
-        
+
         try:
             logger.debug(f"插入数据：{newspaper} - {title}")
-            insert_query = """
-            INSERT INTO newspaper_summary (newspaper, date, title, summary)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (newspaper, date, title) DO NOTHING
-            """
-            self.cursor.execute(insert_query, (newspaper, date, title, summary))
-            self.connection.commit()
-            if self.cursor.rowcount > 0:
+            inserted = self.backend.insert_summary((newspaper, date, title, summary))
+            if inserted:
+                self._index_summaries([(newspaper, date, title, summary)])
                 logger.info(f"已保存到数据库：{newspaper} - {title}")
                 print(f"✅ 已保存到数据库：{newspaper} - {title}")
                 return True
@@ -141,41 +538,138 @@ class DatabaseManager:
             logger.error(f"保存到数据库失败：{e}")
             print(f"❌ 保存到数据库失败：{e}")
             return False
-    
+
+    def bulk_insert_summaries(self, summaries, page_size=DB_BATCH_PAGE_SIZE, copy_threshold=DB_COPY_THRESHOLD):
+        """
+        批量插入摘要数据，返回 (插入条数, 跳过条数)；未连接时返回 (0, 0)，失败时回滚并抛出异常
+
+        summaries 为 [(报纸, 日期, 标题, 摘要), ...]。PostgreSQL条数达到 copy_threshold 时使用COPY，
+        否则按 page_size 条一页的多行VALUES插入；已存在（同报纸、日期、标题）的记录计为跳过。
+        """
+        if not self.connected:
+            return 0, 0
+        summaries = [tuple(row) for row in summaries]
+        if not summaries:
+            return 0, 0
+        inserted = self.backend.bulk_insert(summaries, page_size, copy_threshold)
+        self._index_summaries(summaries)
+        return inserted, len(summaries) - inserted
+
     def batch_insert_summaries(self, summaries):
         """批量插入摘要数据"""
-        if not self.available:
+        if not self.connected:
             return False
-        
+
         try:
-            logger.debug(f"批量插入数据：{len(summaries)} 条")
-            insert_query = """
-            INSERT INTO newspaper_summary (newspaper, date, title, summary)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (newspaper, date, title) DO NOTHING
-            """
-            self.cursor.executemany(insert_query, summaries)
-            self.connection.commit()
-            logger.info(f"批量保存成功，处理了 {len(summaries)} 条记录")
-            print(f"✅ 批量保存成功，处理了 {len(summaries)} 条记录")
+            inserted, skipped = self.bulk_insert_summaries(summaries)
+            logger.info(f"批量保存成功，新增 {inserted} 条，已存在跳过 {skipped} 条")
+            print(f"✅ 批量保存成功，新增 {inserted} 条，已存在跳过 {skipped} 条")
             return True
         except Exception as e:
             logger.error(f"批量保存失败：{e}")
             print(f"❌ 批量保存失败：{e}")
             return False
-    
+
+    def _index_summaries(self, summaries):
+        """把已写入数据库的摘要加入搜索索引（索引出错不影响写入）"""
+        if self.search_index is None:
+            return
+        try:
+            self.search_index.add_many(summaries)
+        except Exception as e:
+            logger.error(f"更新搜索索引失败：{e}")
+
+    def rebuild_search_index(self, page_size=DB_BATCH_PAGE_SIZE):
+        """把数据表中已有的摘要全部加入搜索索引（已索引的跳过），返回新增的篇数"""
+        if not self.connected or self.search_index is None:
+            return 0
+        added = 0
+        for rows in self.backend.iter_summaries(page_size):
+            added += self.search_index.add_many(rows)
+        self.search_index.save()
+        logger.info(f"搜索索引重建完成，新增 {added} 篇")
+        print(f"✅ 搜索索引重建完成，新增 {added} 篇")
+        return added
+
+    def search_summaries(self, query, newspaper=None, date_range=None, limit=50):
+        """按关键词搜索标题和摘要（不查询数据库），参数和结果见 search_index.SearchIndex.search"""
+        if self.search_index is None:
+            return []
+        return self.search_index.search(query, newspaper=newspaper, date_range=date_range, limit=limit)
+
+    def list_summaries(self, newspaper=None, date_range=None, cursor=None, limit=100):
+        """
+        按日期从新到旧分页列出摘要，返回 (本页记录, 下一页游标)
+
+        cursor 为上一次返回的游标（第一页为None），没有下一页时返回的游标为None。
+        每条记录为 {'id', 'newspaper', 'date'(YYYY-MM-DD), 'title', 'summary'}。
+        """
+        if not self.connected:
+            return [], None
+        start, end = date_range or (None, None)
+        after = None
+        if cursor:
+            date, _, last_id = cursor.rpartition(':')
+            after = (date, int(last_id))
+        # 多取一条判断是否还有下一页
+        rows = self.backend.list_summaries(newspaper, start, end, after, limit + 1)
+        items = [{'id': row[0], 'newspaper': row[1], 'date': normalize_date(row[2]), 'title': row[3],
+                  'summary': row[4]} for row in rows[:limit]]
+        next_cursor = f"{items[-1]['date']}:{items[-1]['id']}" if len(rows) > limit else None
+        return items, next_cursor
+
+    def export_summaries(self, path, newspaper=None, date_range=None, page_size=DB_BATCH_PAGE_SIZE):
+        """按日期顺序把摘要分批导出为CSV（带表头，Excel可直接打开），返回导出的条数"""
+        if not self.connected:
+            return 0
+        start, end = date_range or (None, None)
+        count = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['newspaper', 'date', 'title', 'summary'])
+            for rows in self.backend.iter_summaries(page_size, newspaper=newspaper, start=start, end=end):
+                writer.writerows((newspaper_name, normalize_date(date), title, summary)
+                                 for newspaper_name, date, title, summary in rows)
+                count += len(rows)
+        logger.info(f"已导出 {count} 条摘要到：{path}")
+        print(f"✅ 已导出 {count} 条摘要到：{path}")
+        return count
+
+    def daily_stats(self, newspaper=None, date_range=None):
+        """
+        每份报纸每天的统计（只读统计表），按日期、报纸排列
+
+        每条为 {'newspaper', 'date', 'articles'(新闻条数), 'title_chars', 'summary_chars'}。
+        """
+        if not self.connected:
+            return []
+        start, end = date_range or (None, None)
+        return [{'newspaper': row[0], 'date': normalize_date(row[1]), 'articles': row[2],
+                 'title_chars': row[3], 'summary_chars': row[4]}
+                for row in self.backend.daily_stats(newspaper, start, end)]
+
+    def monthly_stats(self, newspaper=None, date_range=None):
+        """每份报纸每月的统计（由每日统计合并），每条的 'month' 为 YYYY-MM，其余字段同 daily_stats"""
+        months = collections.OrderedDict()
+        for row in self.daily_stats(newspaper, date_range):
+            key = (row['date'][:7], row['newspaper'])
+            month = months.setdefault(key, {'newspaper': row['newspaper'], 'month': key[0], 'articles': 0,
+                                            'title_chars': 0, 'summary_chars': 0})
+            for name in ('articles', 'title_chars', 'summary_chars'):
+                month[name] += row[name]
+        return list(months.values())
+
     def close(self):
-        """关闭数据库连接"""
-        if not self.available:
+        """
+        结束本实例的数据库使用
+
+        连接池和连接由进程内的所有实例共享，不在这里关闭（进程退出时由 close_pools 统一关闭），
+        下一个任务可以直接使用已建立的连接。
+        """
+        if not self.connected:
             return
-        
-        if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            try:
-                self.connection.close()
-                logger.info("数据库连接已关闭")
-                print("✅ 数据库连接已关闭")
-            except Exception as e:
-                logger.error(f"关闭数据库连接失败：{e}")
-                print(f"⚠️  关闭数据库连接失败：{e}")
+
+        self.backend.close()
+        self.connected = False
+        logger.debug("已归还数据库连接")
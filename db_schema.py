@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库结构模块 - 带版本号的数据库迁移（PostgreSQL / SQLite）
+
+数据表：
+    newspapers     报纸
+    articles       解析出的新闻（标题、摘要）；PostgreSQL按月分区
+    daily_stats    每份报纸每天的新闻条数和标题/摘要字数，由 articles 的插入触发器增量更新，
+                   看板按天/按月统计只读这张小表，不扫描 articles
+    newspaper_summary  兼容视图：与旧的扁平表列相同，旧的查询无需修改
+
+迁移按版本号顺序执行，已执行的版本记录在 schema_migrations 中；PostgreSQL迁移时加咨询锁，
+多个进程同时启动也只有一个执行。articles 在PostgreSQL上按日期分区，每月一个分区，
+写入前由 create_partitions 在单独的短事务中按需创建，按报纸和日期范围的查询只扫描涉及的月份。
+"""
+
+import threading
+from logger import logger
+
+# 迁移时使用的PostgreSQL咨询锁编号
+MIGRATION_LOCK_ID = 20260219
+# 创建月分区时使用的PostgreSQL咨询锁编号
+PARTITION_LOCK_ID = 20260220
+
+
+def _statements(script):
+    """把多条SQL拆成单条（SQLite的execute一次只能执行一条）"""
+    return [statement.strip() for statement in script.split(';') if statement.strip()]
+
+
+def _table_kind(cursor, dialect, name):
+    """表/视图的类型：'table'、'view'，不存在时返回None"""
+    if dialect == 'postgres':
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (name,))
+        row = cursor.fetchone()
+        return {'r': 'table', 'p': 'table', 'v': 'view'}.get(row[0]) if row else None
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _v1_summary_table(cursor, dialect):
+    """扁平的摘要表（早期版本的唯一数据表，已存在时不做改动）"""
+    if dialect == 'postgres':
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS newspaper_summary (
+            id SERIAL PRIMARY KEY,
+            newspaper VARCHAR(100) NOT NULL,
+            date DATE NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            summary TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (newspaper, date, title)
+        )
+        """)
+    else:
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS newspaper_summary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            newspaper TEXT NOT NULL,
+            date TEXT NOT NULL,
+            title TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (newspaper, date, title)
+        )
+        """)
+
+
+POSTGRES_V2 = """
+CREATE TABLE IF NOT EXISTS newspapers (
+    id SMALLSERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS articles (
+    id BIGSERIAL,
+    newspaper_id SMALLINT NOT NULL REFERENCES newspapers (id),
+    date DATE NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, date),
+    UNIQUE (newspaper_id, date, title)
+) PARTITION BY RANGE (date);
+CREATE INDEX IF NOT EXISTS articles_date_idx ON articles (date)
+"""
+
+SQLITE_V2 = """
+CREATE TABLE IF NOT EXISTS newspapers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    newspaper_id INTEGER NOT NULL REFERENCES newspapers (id),
+    date TEXT NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (newspaper_id, date, title)
+);
+CREATE INDEX IF NOT EXISTS articles_date_idx ON articles (date)
+"""
+
+SUMMARY_VIEW = """
+CREATE VIEW newspaper_summary AS
+SELECT a.id, n.name AS newspaper, a.date, a.title, a.summary, a.created_at
+FROM articles a JOIN newspapers n ON n.id = a.newspaper_id
+"""
+
+
+def _v2_normalized_schema(cursor, dialect):
+    """规范化的表结构；旧的扁平表数据迁入 articles，原表改名保留（新安装时的空表直接删除），并建立同名兼容视图"""
+    for statement in _statements(POSTGRES_V2 if dialect == 'postgres' else SQLITE_V2):
+        cursor.execute(statement)
+
+    if _table_kind(cursor, dialect, 'newspaper_summary') == 'table':
+        cursor.execute("SELECT COUNT(*) FROM newspaper_summary")
+        count = cursor.fetchone()[0]
+    else:
+        count = None
+    if count == 0:
+        # 新安装时迁移1刚建立的空表，没有需要迁移的数据
+        cursor.execute("DROP TABLE newspaper_summary")
+    elif count:
+        if dialect == 'postgres':
+            cursor.execute("SELECT DISTINCT date_trunc('month', date)::date FROM newspaper_summary")
+            for (month,) in cursor.fetchall():
+                create_partition(cursor, month.year, month.month)
+        # INSERT ... SELECT 带 ON CONFLICT 时SQLite要求SELECT有WHERE子句，否则会把ON当作连接条件
+        cursor.execute("INSERT INTO newspapers (name) SELECT DISTINCT newspaper FROM newspaper_summary WHERE true "
+                       "ON CONFLICT (name) DO NOTHING")
+        cursor.execute("""
+        INSERT INTO articles (newspaper_id, date, title, summary, created_at)
+        SELECT n.id, s.date, s.title, s.summary, COALESCE(s.created_at, CURRENT_TIMESTAMP)
+        FROM newspaper_summary s JOIN newspapers n ON n.name = s.newspaper
+        WHERE true
+        ORDER BY s.id
+        ON CONFLICT (newspaper_id, date, title) DO NOTHING
+        """)
+        logger.info(f"旧的摘要表 {count} 条数据已迁移到 articles，原表改名为 newspaper_summary_v1")
+        cursor.execute("ALTER TABLE newspaper_summary RENAME TO newspaper_summary_v1")
+    if _table_kind(cursor, dialect, 'newspaper_summary') is None:
+        cursor.execute(SUMMARY_VIEW)
+
+
+STATS_TABLE = {
+    'postgres': """
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        newspaper_id SMALLINT NOT NULL REFERENCES newspapers (id),
+        date DATE NOT NULL,
+        articles INTEGER NOT NULL DEFAULT 0,
+        title_chars BIGINT NOT NULL DEFAULT 0,
+        summary_chars BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (newspaper_id, date)
+    )
+    """,
+    'sqlite': """
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        newspaper_id INTEGER NOT NULL REFERENCES newspapers (id),
+        date TEXT NOT NULL,
+        articles INTEGER NOT NULL DEFAULT 0,
+        title_chars INTEGER NOT NULL DEFAULT 0,
+        summary_chars INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (newspaper_id, date)
+    )
+    """,
+}
+
+# PostgreSQL：语句级触发器，通过转换表按 (报纸, 日期) 汇总一条语句插入的全部新闻后合并到统计表；
+# ON CONFLICT DO NOTHING 跳过的记录不在转换表中
+POSTGRES_STATS_TRIGGER = [
+    """
+    CREATE OR REPLACE FUNCTION articles_daily_stats() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO daily_stats AS d (newspaper_id, date, articles, title_chars, summary_chars)
+        SELECT newspaper_id, date, COUNT(*), SUM(LENGTH(title)), SUM(LENGTH(summary))
+        FROM new_articles GROUP BY newspaper_id, date
+        ON CONFLICT (newspaper_id, date) DO UPDATE SET
+            articles = d.articles + EXCLUDED.articles,
+            title_chars = d.title_chars + EXCLUDED.title_chars,
+            summary_chars = d.summary_chars + EXCLUDED.summary_chars,
+            updated_at = CURRENT_TIMESTAMP;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER articles_daily_stats AFTER INSERT ON articles
+    REFERENCING NEW TABLE AS new_articles
+    FOR EACH STATEMENT EXECUTE FUNCTION articles_daily_stats()
+    """,
+]
+
+# SQLite没有语句级触发器，逐行累加（ON CONFLICT DO NOTHING 跳过的记录不触发）
+SQLITE_STATS_TRIGGER = [
+    """
+    CREATE TRIGGER IF NOT EXISTS articles_daily_stats AFTER INSERT ON articles
+    BEGIN
+        INSERT INTO daily_stats (newspaper_id, date, articles, title_chars, summary_chars)
+        VALUES (NEW.newspaper_id, NEW.date, 1, LENGTH(NEW.title), LENGTH(NEW.summary))
+        ON CONFLICT (newspaper_id, date) DO UPDATE SET
+            articles = articles + 1,
+            title_chars = title_chars + excluded.title_chars,
+            summary_chars = summary_chars + excluded.summary_chars,
+            updated_at = CURRENT_TIMESTAMP;
+    END
+    """,
+]
+
+
+def _v3_keyset_and_stats(cursor, dialect):
+    """键集分页索引和每日统计表（按已有新闻补齐统计，之后由触发器增量更新）"""
+    # 分页按 (日期, 编号) 倒序，(日期) 索引被 (日期, 编号) 覆盖
+    cursor.execute("CREATE INDEX IF NOT EXISTS articles_newspaper_keyset_idx ON articles (newspaper_id, date, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS articles_keyset_idx ON articles (date, id)")
+    cursor.execute("DROP INDEX IF EXISTS articles_date_idx")
+    cursor.execute(STATS_TABLE[dialect])
+    cursor.execute("CREATE INDEX IF NOT EXISTS daily_stats_date_idx ON daily_stats (date)")
+    cursor.execute("""
+    INSERT INTO daily_stats (newspaper_id, date, articles, title_chars, summary_chars)
+    SELECT newspaper_id, date, COUNT(*), SUM(LENGTH(title)), SUM(LENGTH(summary))
+    FROM articles GROUP BY newspaper_id, date
+    """)
+    for statement in (POSTGRES_STATS_TRIGGER if dialect == 'postgres' else SQLITE_STATS_TRIGGER):
+        cursor.execute(statement)
+
+
+# 迁移列表：(版本号, 说明, 迁移函数(cursor, dialect))；只能追加，不能修改已发布的迁移
+MIGRATIONS = [
+    (1, "扁平的摘要表 newspaper_summary", _v1_summary_table),
+    (2, "规范化表结构：报纸、新闻（按月分区）", _v2_normalized_schema),
+    (3, "键集分页索引和每日统计表 daily_stats", _v3_keyset_and_stats),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn, dialect):
+    """
+    执行尚未执行的迁移（在一个事务中），返回执行的版本号列表
+
+    conn 为PostgreSQL连接（非自动提交）或SQLite连接（isolation_level=None）；dialect 为 'postgres' 或 'sqlite'。
+    """
+    cursor = conn.cursor()
+    try:
+        if dialect == 'sqlite':
+            cursor.execute("BEGIN IMMEDIATE")
+        else:
+            # 事务级咨询锁：同时启动的进程排队，后面的进程会看到已执行的版本
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+        placeholder = '%s' if dialect == 'postgres' else '?'
+        executed = []
+        for version, description, step in MIGRATIONS:
+            if version in applied:
+                continue
+            logger.info(f"执行数据库迁移 {version}：{description}")
+            step(cursor, dialect)
+            cursor.execute(f"INSERT INTO schema_migrations (version, description) "
+                           f"VALUES ({placeholder}, {placeholder})", (version, description))
+            executed.append(version)
+        if dialect == 'sqlite':
+            cursor.execute("COMMIT")
+        else:
+            conn.commit()
+    except Exception:
+        if dialect == 'sqlite':
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+        else:
+            conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    if executed:
+        print(f"✅ 数据库结构已更新到版本 {LATEST_VERSION}")
+    return executed
+
+
+def partition_name(year, month):
+    """articles 的月分区表名"""
+    return f"articles_y{year:04d}m{month:02d}"
+
+
+def create_partition(cursor, year, month):
+    """创建 articles 的月分区（已存在时不做改动，仅PostgreSQL）"""
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {partition_name(year, month)} PARTITION OF articles "
+                   f"FOR VALUES FROM (%s) TO (%s)",
+                   (f"{year:04d}-{month:02d}-01", f"{next_year:04d}-{next_month:02d}-01"))
+
+
+# 进程内已确认存在的分区：数据库 -> {(年, 月)}
+_known_partitions = {}
+_partitions_lock = threading.Lock()
+
+
+def missing_partitions(database_key, dates):
+    """dates（YYYY-MM-DD）涉及的、进程内尚未确认存在的月分区，按时间排序"""
+    months = {(int(date[:4]), int(date[5:7])) for date in dates}
+    with _partitions_lock:
+        return sorted(months - _known_partitions.get(database_key, set()))
+
+
+def create_partitions(cursor, months):
+    """
+    创建 months 中尚不存在的月分区（仅PostgreSQL），返回新创建的月份
+
+    CREATE TABLE ... PARTITION OF 需要对 articles 加 ACCESS EXCLUSIVE 锁，调用方应在写入之前用单独的短事务
+    执行并立即提交，不能放进批量写入的事务（否则整个COPY期间都阻塞其他读写）。CREATE TABLE IF NOT EXISTS
+    并发执行时仍可能报错，这里先加事务级咨询锁再检查分区是否存在，多个进程同时写入新月份时只有一个创建。
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITION_LOCK_ID,))
+    created = []
+    for year, month in months:
+        cursor.execute("SELECT to_regclass(%s)", (partition_name(year, month),))
+        if cursor.fetchone()[0] is None:
+            create_partition(cursor, year, month)
+            created.append((year, month))
+    return created
+
+
+def remember_partitions(database_key, months):
+    """登记已提交（确认存在）的月分区，之后的写入不再检查"""
+    with _partitions_lock:
+        _known_partitions.setdefault(database_key, set()).update(months)
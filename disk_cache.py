@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+磁盘缓存模块 - 带容量上限的持久化键值缓存
+
+每个缓存项保存为一个文件，写入时先写临时文件再重命名，多个进程共享同一目录也不会读到半个文件。
+文件的访问时间（atime）记录最近使用时间，修改时间（mtime）记录写入时间；
+总大小超过上限时按最近使用时间淘汰最久未用的缓存项（LRU），设置了有效期（ttl）时过期的缓存项视为不存在。
+"""
+
+import os
+import time
+import hashlib
+import threading
+from logger import logger
+
+
+def make_cache_key(*parts):
+    """由多个参数生成缓存键"""
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    """带容量上限、按LRU淘汰的磁盘缓存"""
+
+    def __init__(self, directory, max_bytes, suffix='.bin', ttl=None):
+        """初始化缓存（目录在首次写入时创建），ttl为缓存有效期（秒），None表示永不过期"""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 首次写入时统计
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}{self.suffix}")
+
+    def _iter_entries(self):
+        """遍历所有缓存文件：(路径, os.stat结果)"""
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+    def get(self, key):
+        """读取缓存项，不存在或已过期时返回None；命中时更新最近使用时间"""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            now = time.time()
+            if self.ttl is not None and now - stat.st_mtime > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, (now, stat.st_mtime))
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, data):
+        """写入缓存项，超过容量上限时淘汰最久未用的缓存项"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+        with self._lock:
+            # 覆盖已有的缓存项时只累加大小的差值
+            try:
+                old_size = os.stat(path).st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            if self._total_bytes is None:
+                self._total_bytes = sum(stat.st_size for _, stat in self._iter_entries())
+            else:
+                self._total_bytes += len(data) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """先删除已过期的缓存项，再按最近使用时间淘汰，直到总大小降到上限的90%以下"""
+        entries = sorted(self._iter_entries(), key=lambda item: item[1].st_atime)
+        total = sum(stat.st_size for _, stat in entries)
+        target = self.max_bytes * 0.9
+        expire_before = time.time() - self.ttl if self.ttl is not None else None
+        removed = 0
+        for path, stat in entries:
+            expired = expire_before is not None and stat.st_mtime < expire_before
+            if total <= target and not expired:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= stat.st_size
+            removed += 1
+        self._total_bytes = total
+        logger.debug(f"缓存淘汰：{self.directory} 删除 {removed} 项，当前 {total / 1024 / 1024:.1f} MB")
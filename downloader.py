@@ -2,21 +2,423 @@
 # -*- coding: utf-8 -*-
 """
 下载模块 - 负责下载报纸文件（PDF/图片）
+
+核心逻辑基于asyncio + aiohttp实现，一个事件循环即可同时处理大量下载；
+download_newspaper_file 保留为同步接口，在 transport 模块的后台事件循环中运行异步版本。
 """
 
 import os
-import requests
 import re
+import asyncio
+import contextlib
 import urllib.parse
 import time
+import aiohttp
 from PIL import Image
-from config import NEWSPAPER_CONFIG, IMAGE_FOLDER, USER_AGENT, REQUEST_TIMEOUT
+from config import NEWSPAPER_CONFIG, IMAGE_FOLDER, REQUEST_TIMEOUT, BATCH_PER_HOST_LIMIT, DOWNLOAD_RETRIES
 from utils import format_date
+from artifact_store import artifact_store
+from transport import get_proxies, get_shared_session, run_sync
 from logger import logger
 
 
-def download_newspaper_file(newspaper_name, date_obj, date_str):
-    """下载报纸文件（PDF/图片）"""
+# 自适应写入块大小的上下限
+CHUNK_MIN_SIZE = 64 * 1024
+CHUNK_MAX_SIZE = 4 * 1024 * 1024
+
+# 纽约时报下载失败时的原因和解决方案提示
+NYT_ERROR_TIPS = {
+    'connect_timeout': (
+        "连接超时",
+        ["VPN连接不稳定或配置错误", "纽约时报服务器暂时不可用", "网络连接不稳定"],
+        ["检查VPN连接是否正常", "尝试更换VPN服务器", "稍后再试，可能是临时问题",
+         "选择人民日报作为替代", "在.env文件中设置代理：HTTPS_PROXY=http://your-proxy:port"],
+    ),
+    'read_timeout': (
+        "读取超时",
+        ["网络速度太慢", "VPN连接不稳定", "纽约时报服务器响应慢"],
+        ["检查网络速度", "尝试更换VPN服务器", "稍后再试，可能是临时问题", "选择人民日报作为替代"],
+    ),
+    'ssl': (
+        "SSL错误",
+        ["SSL证书问题", "VPN配置问题", "网络安全设置"],
+        ["检查VPN配置", "关闭防火墙或安全软件", "稍后再试，可能是临时问题", "选择人民日报作为替代"],
+    ),
+    'proxy': (
+        "代理错误",
+        ["代理配置错误", "代理服务器不可用"],
+        ["检查代理配置", "尝试其他代理服务器", "选择不使用代理", "选择人民日报作为替代"],
+    ),
+    'other': (
+        "下载失败",
+        ["VPN连接问题", "网络连接问题", "纽约时报服务器问题"],
+        ["检查VPN连接是否正常", "尝试更换VPN服务器", "检查网络连接",
+         "稍后再试，可能是临时问题", "选择人民日报作为替代"],
+    ),
+}
+
+
+class HostLimiter:
+    """按站点限制并发请求数（每个站点一个asyncio信号量）"""
+
+    def __init__(self, per_host_limit=BATCH_PER_HOST_LIMIT):
+        self.per_host_limit = max(1, per_host_limit)
+        self._semaphores = {}
+
+    @contextlib.asynccontextmanager
+    async def limit(self, url):
+        """在该URL所属站点的并发额度内执行请求"""
+        host = urllib.parse.urlparse(url).netloc
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        async with semaphore:
+            yield
+
+
+def classify_download_error(error):
+    """将下载异常归类为 NYT_ERROR_TIPS 中的错误类型"""
+    if isinstance(error, aiohttp.ClientProxyConnectionError):
+        return 'proxy'
+    if isinstance(error, aiohttp.ClientSSLError):
+        return 'ssl'
+    connect_timeout_error = getattr(aiohttp, 'ConnectionTimeoutError', None)
+    if connect_timeout_error and isinstance(error, connect_timeout_error):
+        return 'connect_timeout'
+    if isinstance(error, asyncio.TimeoutError):
+        return 'read_timeout'
+    return 'other'
+
+
+def print_error_tips(error_type):
+    """打印下载失败的可能原因和解决方案"""
+    _, reasons, solutions = NYT_ERROR_TIPS[error_type]
+    print()
+    print("💡 可能的原因：")
+    for reason in reasons:
+        print(f"   - {reason}")
+    print()
+    print("💡 建议的解决方案：")
+    for idx, solution in enumerate(solutions, 1):
+        print(f"   {idx}. {solution}")
+    print()
+
+
+def extract_pdf_url(html, layout_url):
+    """从版面页HTML中提取PDF地址（返回绝对地址，未找到返回None）"""
+    match = re.search(r'href="([^"]+\.pdf)"', html)
+    if not match:
+        return None
+    return urllib.parse.urljoin(layout_url, match.group(1))
+
+
+async def fetch_layout_html(session, layout_url, limiter):
+    """获取版面页HTML"""
+    logger.debug(f"获取版面页URL：{layout_url}")
+    print(f"🌐 正在获取版面页: {layout_url}")
+
+    timeout = aiohttp.ClientTimeout(sock_connect=30, sock_read=REQUEST_TIMEOUT)
+    async with limiter.limit(layout_url):
+        async with session.get(layout_url, timeout=timeout) as resp:
+            resp.raise_for_status()
+            return await resp.text(encoding='utf-8', errors='replace')
+
+
+async def fetch_layout_pdf_url(session, layout_url, limiter):
+    """获取版面页并提取PDF地址"""
+    html = await fetch_layout_html(session, layout_url, limiter)
+    return extract_pdf_url(html, layout_url)
+
+
+def parse_content_range(value):
+    """解析 Content-Range 响应头，返回 (起始字节, 文件总大小或None)"""
+    match = re.match(r'bytes\s+(\d+)-\d+/(\d+|\*)', value or '')
+    if not match:
+        return None, None
+    total = match.group(2)
+    return int(match.group(1)), (int(total) if total != '*' else None)
+
+
+async def fetch_to_file(session, url, save_path, limiter, timeout, proxy=None, on_response=None, headers=None):
+    """
+    单次尝试下载文件，支持断点续传
+
+    数据先写入 save_path + '.part'，已有的 .part 文件会通过HTTP Range请求续传缺失部分；
+    只有下载完整后才原子地重命名为 save_path，中断的下载不会留下被当作缓存使用的残缺文件。
+    headers 为额外的请求头（如条件请求头）。
+
+    返回HTTP状态码（200/206表示下载完成，304表示内容未变化、未写入文件）；
+    返回None表示连接提前结束，需要再次调用以继续续传。
+    网络异常和HTTP错误直接抛出，由调用方决定是否重试（重试时自动续传）。
+    """
+    part_path = save_path + '.part'
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    # 禁用压缩传输，保证字节偏移与文件内容一一对应
+    headers = dict(headers or {}, **{'Accept-Encoding': 'identity'})
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+
+    async with limiter.limit(url):
+        async with session.get(url, headers=headers, timeout=timeout, proxy=proxy, allow_redirects=True) as response:
+            if on_response:
+                on_response(response)
+
+            if response.status == 416 and offset:
+                # 服务器无法满足续传范围（文件可能已变化），丢弃 .part 重新下载
+                logger.warning(f"续传范围无效，重新下载：{url}")
+                os.remove(part_path)
+                return None
+            if response.status == 304:
+                return 304
+            response.raise_for_status()
+
+            total = None
+            if response.status == 206:
+                start, total = parse_content_range(response.headers.get('Content-Range'))
+                if start != offset:
+                    logger.warning(f"续传位置不匹配（期望 {offset}，实际 {start}），重新下载：{url}")
+                    os.remove(part_path)
+                    return None
+                mode = 'ab'
+                logger.info(f"断点续传：已有 {offset} 字节，继续下载剩余部分")
+                print(f"   ↪️ 断点续传：已有 {offset / 1024:.0f} KB，继续下载剩余部分")
+            else:
+                # 服务器不支持Range或无需续传，从头写入
+                offset = 0
+                mode = 'wb'
+                if response.content_length is not None:
+                    total = response.content_length
+
+            logger.debug(f"保存文件到：{part_path}")
+            with open(part_path, mode) as f:
+                written = offset + await write_body_adaptive(response, f)
+            status = response.status
+
+    if total is not None and written < total:
+        logger.warning(f"下载未完成（{written}/{total} 字节），等待续传：{url}")
+        return None
+
+    os.replace(part_path, save_path)
+    return status
+
+
+async def download_artifact(session, url, ext, limiter, timeout, proxy=None, on_response=None):
+    """
+    单次尝试将URL下载到文件存储中
+
+    存储中已有该URL时发起条件请求，服务器返回304则直接复用已存储的内容；
+    否则（断点续传）下载到临时文件，完成后按内容哈希存入存储。
+    返回存储条目；返回None表示连接提前结束，需要再次调用以继续续传。
+    """
+    response_headers = {}
+
+    def _on_response(response):
+        response_headers.update(response.headers)
+        if on_response:
+            on_response(response)
+
+    # 占用临时文件后再查询，其他进程刚下载完成的内容也能按条件请求复用
+    with artifact_store.reserve_temp(url, ext) as temp_path:
+        entry = artifact_store.lookup(url)
+        # 正在续传时不发条件请求，避免304与Range混用
+        headers = None
+        if entry and not os.path.exists(temp_path + '.part'):
+            headers = artifact_store.conditional_headers(entry)
+
+        status = await fetch_to_file(session, url, temp_path, limiter, timeout, proxy=proxy,
+                                     on_response=_on_response, headers=headers)
+        if status is None:
+            return None
+        if status == 304:
+            logger.info(f"内容未变化（304），使用已存储的文件：{url}")
+            print("✅ 服务器确认内容未变化，使用已存储的文件")
+            return artifact_store.revalidated(entry, response_headers.get('ETag'),
+                                              response_headers.get('Last-Modified'))
+        return artifact_store.commit(url, temp_path, ext,
+                                     etag=response_headers.get('ETag'),
+                                     last_modified=response_headers.get('Last-Modified'),
+                                     content_type=response_headers.get('Content-Type'))
+
+
+async def write_body_adaptive(response, f):
+    """
+    以自适应块大小将响应体写入文件，返回写入的字节数
+
+    网络数据先累积到缓冲区，达到当前块大小后一次性写入；读满一块越快，块越大
+    （最大 CHUNK_MAX_SIZE），慢速链路上则缩小块以便及时落盘。连接中断时，
+    已收到的数据也会写入文件，续传时只需补齐缺失的部分。
+    """
+    chunk_size = CHUNK_MIN_SIZE
+    buffer = bytearray()
+    written = 0
+    block_start = time.monotonic()
+    try:
+        while True:
+            data = await response.content.readany()
+            if not data:
+                break
+            buffer += data
+            if len(buffer) >= chunk_size:
+                f.write(buffer)
+                written += len(buffer)
+                buffer.clear()
+
+                elapsed = time.monotonic() - block_start
+                if elapsed < 0.25:
+                    chunk_size = min(chunk_size * 2, CHUNK_MAX_SIZE)
+                elif elapsed > 2:
+                    chunk_size = max(chunk_size // 2, CHUNK_MIN_SIZE)
+                block_start = time.monotonic()
+    finally:
+        if buffer:
+            f.write(buffer)
+            written += len(buffer)
+    return written
+
+
+async def download_pdf(session, pdf_url, limiter, max_retries=DOWNLOAD_RETRIES):
+    """下载PDF文件到文件存储（连接中断时自动续传），返回存储条目"""
+    logger.debug(f"开始下载PDF：{pdf_url}")
+    timeout = aiohttp.ClientTimeout(sock_connect=30, sock_read=REQUEST_TIMEOUT)
+    for attempt in range(1, max_retries + 1):
+        try:
+            entry = await download_artifact(session, pdf_url, 'pdf', limiter, timeout)
+            if entry:
+                return entry
+            logger.warning(f"PDF下载中断，正在续传... ({attempt}/{max_retries})")
+        except aiohttp.ClientResponseError:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == max_retries:
+                raise
+            logger.warning(f"PDF下载中断：{e}，正在续传... ({attempt}/{max_retries})")
+            print(f"⚠️  PDF下载中断：{e}，正在续传... ({attempt}/{max_retries})")
+            await asyncio.sleep(min(2 * attempt, 10))
+    raise aiohttp.ClientPayloadError(f"PDF下载未完成，已达到最大重试次数：{pdf_url}")
+
+
+def print_response_info(response):
+    """打印纽约时报下载的响应信息"""
+    print(f"   状态码：{response.status}")
+    if response.status == 304:
+        print("   ✅ 内容未变化，无需重新下载")
+    elif response.status in (200, 206):
+        print("   ✅ 连接成功，开始下载...")
+        print(f"   文件大小：{response.headers.get('Content-Length', '未知')} bytes")
+        print(f"   内容类型：{response.headers.get('Content-Type', '未知')}")
+
+
+async def download_image_with_retry(session, cover_url, limiter, max_retries=5):
+    """下载纽约时报图片到文件存储（带重试、断点续传、逐次放宽超时和代理支持），返回存储条目，失败返回None"""
+    # 增加更详细的超时设置
+    connect_timeout = 45  # 连接超时
+    read_timeout = 180     # 读取超时
+
+    proxies = get_proxies()
+    proxy = proxies.get(urllib.parse.urlparse(cover_url).scheme)
+    if proxy:
+        print(f"🔧 使用代理：{proxy}")
+        logger.debug(f"使用代理：{proxy}")
+    else:
+        print("⚠️  未检测到代理配置，尝试直接连接...")
+        print("💡 如果连接失败，请检查VPN是否正确配置系统代理")
+        print("💡 或在.env文件中手动配置代理：")
+        print("   HTTP_PROXY=http://127.0.0.1:7890")
+        print("   HTTPS_PROXY=http://127.0.0.1:7890")
+
+    for attempt in range(1, max_retries + 1):
+        error_type = None
+        try:
+            print(f"📥 正在下载... (尝试 {attempt}/{max_retries})")
+            print(f"   连接超时：{connect_timeout}秒，读取超时：{read_timeout}秒")
+
+            timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+            entry = await download_artifact(session, cover_url, 'jpg', limiter, timeout,
+                                            proxy=proxy, on_response=print_response_info)
+            if entry:
+                return entry
+            print("   ⚠️  连接提前结束，下次尝试将继续续传")
+            if attempt == max_retries:
+                print("   ❌ 已达到最大重试次数")
+                return None
+        except aiohttp.ClientResponseError as e:
+            print(f"   ❌ 连接失败，状态码：{e.status}")
+            if e.headers:
+                print("   响应头：")
+                for key, value in list(e.headers.items())[:5]:  # 只显示前5个
+                    print(f"     {key}: {value}")
+            if attempt == max_retries:
+                print("   ❌ 已达到最大重试次数")
+                return None
+        except Exception as e:
+            error_type = classify_download_error(e)
+            label = NYT_ERROR_TIPS[error_type][0]
+            if attempt == max_retries:
+                logger.error(f"纽约时报{label}，已达到最大重试次数：{e}")
+                print(f"❌ 纽约时报{label}，已达到最大重试次数：{e}")
+                print_error_tips(error_type)
+                return None
+            logger.warning(f"{label}：{e}，正在重试... ({attempt}/{max_retries})")
+            print(f"⚠️  {label}：{e}，正在重试... ({attempt}/{max_retries})")
+
+        # 超时类错误和非200状态码时放宽超时时间
+        if error_type in (None, 'connect_timeout', 'read_timeout'):
+            connect_timeout += 15
+            read_timeout += 30
+        # 等待一段时间再重试（不阻塞事件循环中的其他下载）
+        wait_time = min(5 * (attempt + 1), 30)
+        print(f"   等待 {wait_time} 秒后重试...")
+        await asyncio.sleep(wait_time)
+
+    return None
+
+
+async def fetch_newspaper_entry(session, limiter, newspaper_name, date_obj, date_str):
+    """下载报纸文件到文件存储，返回存储条目，未找到/失败返回None"""
+    config = NEWSPAPER_CONFIG[newspaper_name]
+    date_formats = format_date(date_obj)
+    if config['type'] == "pdf_dynamic":
+        # 动态提取人民日报的PDF链接
+        layout_url = config['layout_url_template'].format(**date_formats)
+        pdf_url = await fetch_layout_pdf_url(session, layout_url, limiter)
+        if not pdf_url:
+            logger.warning(f"未找到该日期的报纸PDF：{date_str}")
+            print("❌ 未找到该日期的报纸PDF，该日期可能停刊或未发布")
+            return None
+        logger.info(f"找到PDF地址：{pdf_url}")
+        print(f"✅ 找到PDF地址: {pdf_url}")
+
+        return await download_pdf(session, pdf_url, limiter)
+
+    # 直接下载纽约时报图片
+    cover_url = config['url_template'].format(**date_formats)
+    logger.debug(f"下载图片URL：{cover_url}")
+    print(f"🌐 正在下载图片: {cover_url}")
+
+    entry = await download_image_with_retry(session, cover_url, limiter)
+    if entry:
+        blob_path = artifact_store.blob_path(entry['sha256'], entry['ext'])
+        try:
+            with Image.open(blob_path) as img:
+                img.verify()
+        except Exception:
+            # 损坏的图片不能留在存储中（其他URL共用的内容文件保留）
+            artifact_store.discard(entry['url'])
+            raise
+    return entry
+
+
+async def async_download_newspaper_file(newspaper_name, date_obj, date_str, session=None, limiter=None):
+    """
+    异步下载报纸文件（PDF/图片）
+
+    文件保存在按内容寻址的文件存储中，每次都会向服务器发起条件请求校验，
+    内容未变化时不会重复下载；IMAGE_FOLDER 中的 {报纸}_{日期}.{扩展名} 为指向存储内容的链接。
+    网络不可用时退回使用之前下载的同名文件。
+
+    session/limiter 可由调用方传入以便多个下载共享连接和站点并发额度；
+    未传入时使用当前事件循环共享的连接池。返回保存路径，失败返回None。
+    """
     logger.info(f"开始下载 {newspaper_name} ({date_obj.strftime('%Y-%m-%d')})")
     print(f"📥 开始下载 {newspaper_name} ({date_obj.strftime('%Y-%m-%d')}) ...")
 
@@ -25,322 +427,14 @@ def download_newspaper_file(newspaper_name, date_obj, date_str):
     filename = f"{newspaper_name}_{date_str}.{file_ext}"
     save_path = os.path.join(IMAGE_FOLDER, filename)
 
-    # 检查文件是否已存在
-    if os.path.exists(save_path):
-        logger.info(f"文件已存在：{filename}")
-        # 自动使用已存在的文件，避免交互式输入
-        logger.info(f"使用已存在的文件：{save_path}")
-        print("✅ 使用已存在的文件")
-        return save_path
-
-    headers = {'User-Agent': USER_AGENT, 'Accept': '*/*'}
-
-    # 创建session，提高连接复用率
-    session = requests.Session()
-    session.headers.update(headers)
+    limiter = limiter or HostLimiter()
+    session = session or await get_shared_session()
 
+    entry = None
     try:
-        if config['type'] == "pdf_dynamic":
-            # 动态提取人民日报的PDF链接
-            date_formats = format_date(date_obj)
-            layout_url = config['layout_url_template'].format(**date_formats)
-            logger.debug(f"获取版面页URL：{layout_url}")
-            print(f"🌐 正在获取版面页: {layout_url}")
-
-            resp = session.get(layout_url, timeout=(30, REQUEST_TIMEOUT))
-            resp.raise_for_status()
-            resp.encoding = 'utf-8'
-
-            # 正则提取PDF链接
-            match = re.search(r'href="([^"]+\.pdf)"', resp.text)
-            if match:
-                relative_pdf = match.group(1)
-                pdf_url = urllib.parse.urljoin(layout_url, relative_pdf)
-                logger.info(f"找到PDF地址：{pdf_url}")
-                print(f"✅ 找到PDF地址: {pdf_url}")
-            else:
-                logger.warning(f"未找到该日期的报纸PDF：{date_str}")
-                print("❌ 未找到该日期的报纸PDF，该日期可能停刊或未发布")
-                return None
-
-            # 下载PDF
-            logger.debug(f"开始下载PDF：{pdf_url}")
-            response = session.get(pdf_url, timeout=(30, REQUEST_TIMEOUT), stream=True)
-        else:
-            # 直接下载纽约时报图片
-            date_formats = format_date(date_obj)
-            cover_url = config['url_template'].format(**date_formats)
-            logger.debug(f"下载图片URL：{cover_url}")
-            print(f"🌐 正在下载图片: {cover_url}")
-            
-            # 添加重试机制，最多重试5次
-            max_retries = 5
-            retry_count = 0
-            response = None
-            
-            # 增加更详细的超时设置
-            connect_timeout = 45  # 连接超时
-            read_timeout = 180     # 读取超时
-            
-            # 配置代理（支持环境变量和系统自动检测）
-            proxies = {}
-            
-            # 1. 首先检查环境变量
-            http_proxy = os.getenv('HTTP_PROXY', '') or os.getenv('http_proxy', '')
-            https_proxy = os.getenv('HTTPS_PROXY', '') or os.getenv('https_proxy', '')
-            
-            if http_proxy:
-                proxies['http'] = http_proxy
-            if https_proxy:
-                proxies['https'] = https_proxy
-            
-            # 2. 如果没有配置代理，尝试从系统获取（Windows）
-            if not proxies and os.name == 'nt':
-                try:
-                    import winreg
-                    # 读取Windows系统代理设置
-                    key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, 
-                                        r'Software\Microsoft\Windows\CurrentVersion\Internet Settings')
-                    proxy_enable, _ = winreg.QueryValueEx(key, 'ProxyEnable')
-                    if proxy_enable:
-                        proxy_server, _ = winreg.QueryValueEx(key, 'ProxyServer')
-                        if proxy_server:
-                            # 如果代理服务器包含协议，直接使用
-                            if '://' in proxy_server:
-                                proxies['http'] = proxy_server
-                                proxies['https'] = proxy_server
-                            else:
-                                # 否则添加http://前缀
-                                proxies['http'] = f"http://{proxy_server}"
-                                proxies['https'] = f"http://{proxy_server}"
-                            print(f"🔧 检测到系统代理: {proxy_server}")
-                except Exception as e:
-                    logger.debug(f"读取系统代理设置失败: {e}")
-            
-            # 清理空代理
-            proxies = {k: v for k, v in proxies.items() if v}
-            
-            if proxies:
-                print(f"🔧 使用代理：{proxies}")
-                logger.debug(f"使用代理：{proxies}")
-            else:
-                print("⚠️  未检测到代理配置，尝试直接连接...")
-                print("💡 如果连接失败，请检查VPN是否正确配置系统代理")
-                print("💡 或在.env文件中手动配置代理：")
-                print("   HTTP_PROXY=http://127.0.0.1:7890")
-                print("   HTTPS_PROXY=http://127.0.0.1:7890")
-            
-            while retry_count < max_retries:
-                try:
-                    print(f"📥 正在下载... (尝试 {retry_count + 1}/{max_retries})")
-                    print(f"   连接超时：{connect_timeout}秒，读取超时：{read_timeout}秒")
-                    
-                    # 记录开始时间
-                    start_time = time.time()
-                    
-                    # 发送请求
-                    response = session.get(
-                        cover_url, 
-                        timeout=(connect_timeout, read_timeout), 
-                        stream=True,
-                        allow_redirects=True,
-                        proxies=proxies if proxies else None
-                    )
-                    
-                    # 记录响应时间
-                    response_time = time.time() - start_time
-                    print(f"   响应时间：{response_time:.2f}秒")
-                    print(f"   状态码：{response.status_code}")
-                    
-                    if response.status_code == 200:
-                        print("   ✅ 连接成功，开始下载...")
-                        # 检查响应头
-                        content_length = response.headers.get('Content-Length', '未知')
-                        content_type = response.headers.get('Content-Type', '未知')
-                        print(f"   文件大小：{content_length} bytes")
-                        print(f"   内容类型：{content_type}")
-                        break
-                    else:
-                        print(f"   ❌ 连接失败，状态码：{response.status_code}")
-                        # 打印响应头
-                        print("   响应头：")
-                        for key, value in list(response.headers.items())[:5]:  # 只显示前5个
-                            print(f"     {key}: {value}")
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            print(f"   正在重试... ({retry_count}/{max_retries})")
-                            # 增加超时时间
-                            connect_timeout += 15
-                            read_timeout += 30
-                            # 等待一段时间再重试
-                            wait_time = min(5 * (retry_count + 1), 30)
-                            print(f"   等待 {wait_time} 秒后重试...")
-                            time.sleep(wait_time)
-                        else:
-                            print("   ❌ 已达到最大重试次数")
-                            return None
-                except requests.exceptions.ConnectTimeout:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        logger.warning(f"连接超时，正在重试... ({retry_count}/{max_retries})")
-                        print(f"⚠️  连接超时，正在重试... ({retry_count}/{max_retries})")
-                        # 增加超时时间
-                        connect_timeout += 15
-                        read_timeout += 30
-                        # 等待一段时间再重试
-                        wait_time = min(5 * (retry_count + 1), 30)
-                        print(f"   等待 {wait_time} 秒后重试...")
-                        time.sleep(wait_time)
-                    else:
-                        logger.error("纽约时报连接超时，已达到最大重试次数")
-                        print("❌ 纽约时报连接超时，已达到最大重试次数")
-                        print()
-                        print("💡 可能的原因：")
-                        print("   - VPN连接不稳定或配置错误")
-                        print("   - 纽约时报服务器暂时不可用")
-                        print("   - 网络连接不稳定")
-                        print()
-                        print("💡 建议的解决方案：")
-                        print("   1. 检查VPN连接是否正常")
-                        print("   2. 尝试更换VPN服务器")
-                        print("   3. 稍后再试，可能是临时问题")
-                        print("   4. 选择人民日报作为替代")
-                        print("   5. 在.env文件中设置代理：HTTPS_PROXY=http://your-proxy:port")
-                        print()
-                        return None
-                except requests.exceptions.ReadTimeout:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        logger.warning(f"读取超时，正在重试... ({retry_count}/{max_retries})")
-                        print(f"⚠️  读取超时，正在重试... ({retry_count}/{max_retries})")
-                        # 增加超时时间
-                        connect_timeout += 15
-                        read_timeout += 30
-                        # 等待一段时间再重试
-                        wait_time = min(5 * (retry_count + 1), 30)
-                        print(f"   等待 {wait_time} 秒后重试...")
-                        time.sleep(wait_time)
-                    else:
-                        logger.error("纽约时报读取超时，已达到最大重试次数")
-                        print("❌ 纽约时报读取超时，已达到最大重试次数")
-                        print()
-                        print("💡 可能的原因：")
-                        print("   - 网络速度太慢")
-                        print("   - VPN连接不稳定")
-                        print("   - 纽约时报服务器响应慢")
-                        print()
-                        print("💡 建议的解决方案：")
-                        print("   1. 检查网络速度")
-                        print("   2. 尝试更换VPN服务器")
-                        print("   3. 稍后再试，可能是临时问题")
-                        print("   4. 选择人民日报作为替代")
-                        print()
-                        return None
-                except requests.exceptions.SSLError as e:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        logger.warning(f"SSL错误，正在重试... ({retry_count}/{max_retries})")
-                        print(f"⚠️  SSL错误：{e}，正在重试... ({retry_count}/{max_retries})")
-                        # 等待一段时间再重试
-                        wait_time = min(5 * (retry_count + 1), 30)
-                        print(f"   等待 {wait_time} 秒后重试...")
-                        time.sleep(wait_time)
-                    else:
-                        logger.error(f"纽约时报SSL错误：{e}")
-                        print(f"❌ 纽约时报SSL错误：{e}")
-                        print()
-                        print("💡 可能的原因：")
-                        print("   - SSL证书问题")
-                        print("   - VPN配置问题")
-                        print("   - 网络安全设置")
-                        print()
-                        print("💡 建议的解决方案：")
-                        print("   1. 检查VPN配置")
-                        print("   2. 关闭防火墙或安全软件")
-                        print("   3. 稍后再试，可能是临时问题")
-                        print("   4. 选择人民日报作为替代")
-                        print()
-                        return None
-                except requests.exceptions.ProxyError as e:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        logger.warning(f"代理错误，正在重试... ({retry_count}/{max_retries})")
-                        print(f"⚠️  代理错误：{e}，正在重试... ({retry_count}/{max_retries})")
-                        # 等待一段时间再重试
-                        wait_time = min(5 * (retry_count + 1), 30)
-                        print(f"   等待 {wait_time} 秒后重试...")
-                        time.sleep(wait_time)
-                    else:
-                        logger.error(f"代理错误：{e}")
-                        print(f"❌ 代理错误：{e}")
-                        print()
-                        print("💡 可能的原因：")
-                        print("   - 代理配置错误")
-                        print("   - 代理服务器不可用")
-                        print()
-                        print("💡 建议的解决方案：")
-                        print("   1. 检查代理配置")
-                        print("   2. 尝试其他代理服务器")
-                        print("   3. 选择不使用代理")
-                        print("   4. 选择人民日报作为替代")
-                        print()
-                        return None
-                except Exception as e:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        logger.warning(f"下载失败：{str(e)}，正在重试... ({retry_count}/{max_retries})")
-                        print(f"⚠️  下载失败：{str(e)}，正在重试... ({retry_count}/{max_retries})")
-                        # 等待一段时间再重试
-                        wait_time = min(5 * (retry_count + 1), 30)
-                        print(f"   等待 {wait_time} 秒后重试...")
-                        time.sleep(wait_time)
-                    else:
-                        logger.error(f"纽约时报下载失败：{str(e)}")
-                        print(f"❌ 纽约时报下载失败：{str(e)}")
-                        print()
-                        print("💡 可能的原因：")
-                        print("   - VPN连接问题")
-                        print("   - 网络连接问题")
-                        print("   - 纽约时报服务器问题")
-                        print()
-                        print("💡 建议的解决方案：")
-                        print("   1. 检查VPN连接是否正常")
-                        print("   2. 尝试更换VPN服务器")
-                        print("   3. 检查网络连接")
-                        print("   4. 稍后再试，可能是临时问题")
-                        print("   5. 选择人民日报作为替代")
-                        print()
-                        return None
-
-        # 检查响应状态
-        response.raise_for_status()
-
-        # 保存文件
-        logger.debug(f"保存文件到：{save_path}")
-        with open(save_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-
-        # 验证文件
-        if file_ext == 'jpg':
-            img = Image.open(save_path)
-            img.verify()
-            logger.info(f"图片下载成功！尺寸：{img.size[0]}x{img.size[1]}")
-            print(f"✅ 图片下载成功！尺寸：{img.size[0]}x{img.size[1]}")
-        else:
-            # 验证PDF文件大小
-            file_size = os.path.getsize(save_path) / 1024 / 1024  # MB
-            logger.info(f"PDF下载成功！大小：{file_size:.2f} MB")
-            print(f"✅ PDF下载成功！大小：{file_size:.2f} MB")
-        
-        logger.info(f"文件保存路径：{save_path}")
-        print(f"📁 保存路径：{save_path}")
-        print()
-        return save_path
-
-    except requests.exceptions.HTTPError as e:
-        error_code = e.response.status_code
+        entry = await fetch_newspaper_entry(session, limiter, newspaper_name, date_obj, date_str)
+    except aiohttp.ClientResponseError as e:
+        error_code = e.status
         logger.error(f"下载失败：HTTP错误 {error_code}")
         print(f"❌ 下载失败：HTTP错误 {error_code}")
         if error_code == 404:
@@ -349,12 +443,38 @@ def download_newspaper_file(newspaper_name, date_obj, date_str):
         elif error_code == 403:
             logger.warning("访问被拒绝，可能是网站反爬限制")
             print("💡 访问被拒绝，可能是网站反爬限制，建议稍后再试")
-        return None
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         logger.error("下载超时，网络连接不稳定")
         print("❌ 下载超时，网络连接不稳定")
-        return None
     except Exception as e:
         logger.error(f"下载失败：{str(e)}", exc_info=True)
         print(f"❌ 下载失败：{str(e)}")
+
+    if not entry:
+        if os.path.exists(save_path):
+            # 无法连接服务器校验时，自动使用已存在的文件，避免交互式输入
+            logger.info(f"使用已存在的文件：{save_path}")
+            print("✅ 使用已存在的文件")
+            return save_path
         return None
+
+    artifact_store.materialize(entry, save_path)
+    if file_ext == 'jpg':
+        with Image.open(save_path) as img:
+            logger.info(f"图片下载成功！尺寸：{img.size[0]}x{img.size[1]}")
+            print(f"✅ 图片下载成功！尺寸：{img.size[0]}x{img.size[1]}")
+    else:
+        # 验证PDF文件大小
+        file_size = entry['size'] / 1024 / 1024  # MB
+        logger.info(f"PDF下载成功！大小：{file_size:.2f} MB")
+        print(f"✅ PDF下载成功！大小：{file_size:.2f} MB")
+
+    logger.info(f"文件保存路径：{save_path}")
+    print(f"📁 保存路径：{save_path}")
+    print()
+    return save_path
+
+
+def download_newspaper_file(newspaper_name, date_obj, date_str):
+    """下载报纸文件（PDF/图片）- 同步接口，多次调用复用同一个连接池"""
+    return run_sync(async_download_newspaper_file(newspaper_name, date_obj, date_str))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+整版抓取模块 - 发现并下载一期报纸的全部版面
+
+人民日报等 pdf_dynamic 类型的报纸每个版面（node_01 ~ node_NN）都有单独的版面页和PDF。
+本模块从第一版的版面页中解析出所有版面，并发获取其余版面页，
+得到每个版面的PDF地址；解析结果按日期缓存，之后无需重复抓取版面页。
+"""
+
+import os
+import re
+import json
+import asyncio
+import urllib.parse
+from config import NEWSPAPER_CONFIG, IMAGE_FOLDER, EDITION_CACHE_DIR
+from downloader import (HostLimiter, fetch_layout_html, extract_pdf_url, download_pdf,
+                        async_download_newspaper_file)
+from artifact_store import artifact_store
+from transport import get_shared_session, run_sync
+from utils import format_date
+from logger import logger
+
+
+# 版面页中指向各版面的链接，如 <a href="node_02.html">02版：要闻</a>
+NODE_LINK_PATTERN = re.compile(r'<a[^>]*href="?([^"\s>]*node_(\d+)\.html)"?[^>]*>([^<]*)</a>', re.IGNORECASE)
+
+
+def parse_page_links(html, layout_url):
+    """从版面页HTML中解析所有版面：返回按版面号排序的 [{'page_no', 'name', 'layout_url'}, ...]"""
+    pages = {}
+    for href, page_no, name in NODE_LINK_PATTERN.findall(html):
+        page_no = int(page_no)
+        name = name.strip()
+        # 同一版面可能出现多个链接（如缩略图和文字链接），保留有文字的那个
+        if page_no not in pages or (name and not pages[page_no]['name']):
+            pages[page_no] = {
+                'page_no': page_no,
+                'name': name,
+                'layout_url': urllib.parse.urljoin(layout_url, href),
+            }
+    return [pages[page_no] for page_no in sorted(pages)]
+
+
+def _cache_path(newspaper_name, date_str):
+    """版面列表缓存文件路径"""
+    return os.path.join(EDITION_CACHE_DIR, f"{newspaper_name}_{date_str}.json")
+
+
+def load_cached_edition(newspaper_name, date_str):
+    """读取缓存的版面列表，不存在时返回None"""
+    try:
+        with open(_cache_path(newspaper_name, date_str), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_edition(newspaper_name, date_str, pages):
+    """保存版面列表缓存"""
+    os.makedirs(EDITION_CACHE_DIR, exist_ok=True)
+    cache_path = _cache_path(newspaper_name, date_str)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(pages, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, cache_path)
+
+
+async def discover_edition(newspaper_name, date_obj, session=None, limiter=None, use_cache=True):
+    """
+    发现一期报纸的全部版面及其PDF地址
+
+    返回按版面号排序的 [{'page_no', 'name', 'layout_url', 'pdf_url'}, ...]；
+    未发布/停刊时返回空列表。只有所有版面都解析成功时才写入缓存。
+    """
+    date_str = date_obj.strftime('%Y%m%d')
+    if use_cache:
+        cached = load_cached_edition(newspaper_name, date_str)
+        if cached:
+            logger.debug(f"使用缓存的版面列表：{newspaper_name} {date_str}，共 {len(cached)} 版")
+            return cached
+
+    limiter = limiter or HostLimiter()
+    session = session or await get_shared_session()
+    config = NEWSPAPER_CONFIG[newspaper_name]
+    first_url = config['layout_url_template'].format(**format_date(date_obj))
+
+    first_html = await fetch_layout_html(session, first_url, limiter)
+    pages = parse_page_links(first_html, first_url)
+    if not pages:
+        # 页面中没有版面导航时，至少保留第一版
+        pages = [{'page_no': 1, 'name': '', 'layout_url': first_url}]
+
+    async def _fill_pdf_url(page):
+        if page['layout_url'] == first_url:
+            html = first_html
+        else:
+            try:
+                html = await fetch_layout_html(session, page['layout_url'], limiter)
+            except Exception as e:
+                logger.warning(f"获取版面页失败：{page['layout_url']} - {e}")
+                html = ''
+        page['pdf_url'] = extract_pdf_url(html, page['layout_url'])
+
+    await asyncio.gather(*(_fill_pdf_url(page) for page in pages))
+    if not any(page['pdf_url'] for page in pages):
+        logger.warning(f"未找到该日期的报纸PDF：{date_str}")
+        print("❌ 未找到该日期的报纸PDF，该日期可能停刊或未发布")
+        return []
+
+    logger.info(f"{newspaper_name} {date_str} 共发现 {len(pages)} 个版面")
+    print(f"📰 {newspaper_name} {date_str} 共发现 {len(pages)} 个版面")
+    if all(page['pdf_url'] for page in pages):
+        save_cached_edition(newspaper_name, date_str, pages)
+    return pages
+
+
+async def async_download_edition(newspaper_name, date_obj, date_str, session=None, limiter=None):
+    """
+    并发下载一期报纸的全部版面
+
+    图片类型的报纸（如纽约时报）只有头版，直接按普通方式下载。
+    PDF保存为 {报纸}_{日期}_{版面号}.pdf，返回成功下载的路径列表（按版面号排序）。
+    """
+    config = NEWSPAPER_CONFIG[newspaper_name]
+    limiter = limiter or HostLimiter()
+    session = session or await get_shared_session()
+    if config['type'] != "pdf_dynamic":
+        save_path = await async_download_newspaper_file(newspaper_name, date_obj, date_str,
+                                                        session=session, limiter=limiter)
+        return [save_path] if save_path else []
+
+    try:
+        pages = await discover_edition(newspaper_name, date_obj, session=session, limiter=limiter)
+    except Exception as e:
+        logger.error(f"获取版面列表失败：{newspaper_name} {date_str} - {e}")
+        print(f"❌ 获取版面列表失败：{e}")
+        return []
+
+    async def _download_page(page):
+        if not page['pdf_url']:
+            return None
+        save_path = os.path.join(IMAGE_FOLDER, f"{newspaper_name}_{date_str}_{page['page_no']:02d}.pdf")
+        try:
+            entry = await download_pdf(session, page['pdf_url'], limiter)
+        except Exception as e:
+            logger.error(f"版面下载失败：{newspaper_name} {date_str} 第{page['page_no']:02d}版 - {e}")
+            return None
+        return artifact_store.materialize(entry, save_path)
+
+    paths = await asyncio.gather(*(_download_page(page) for page in pages))
+    saved = [path for path in paths if path]
+    if len(saved) < len(pages):
+        logger.warning(f"{newspaper_name} {date_str} 有 {len(pages) - len(saved)} 个版面下载失败")
+    print(f"✅ {newspaper_name} {date_str} 整版下载完成：{len(saved)}/{len(pages)} 个版面")
+    return saved
+
+
+def download_edition(newspaper_name, date_obj, date_str):
+    """并发下载一期报纸的全部版面 - 同步接口"""
+    return run_sync(async_download_edition(newspaper_name, date_obj, date_str))
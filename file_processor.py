@@ -5,132 +5,410 @@
 """
 
 import os
-import base64
 import io
+import math
+import collections
+import threading
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
-from config import COPY_FOLDER
+from config import (COPY_FOLDER, POPPLER_PATH, RENDER_WORKERS, RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB,
+                    PDF_TEXT_MIN_CHARS)
+from artifact_store import sha256_file
+from disk_cache import DiskCache, make_cache_key
 
 
-def image_to_base64(image_path):
-    """将图片转为base64编码（适配AI接口）"""
-    try:
+# 发送给AI的图片参数
+IMAGE_MAX_SIZE = 800  # 更小的尺寸，减少内容审核风险
+IMAGE_QUALITY = 75  # 适中的质量
+IMAGE_MAX_BYTES = 3 * 1024 * 1024  # 编码后的大小上限，超过时降低JPEG质量
+IMAGE_MIN_QUALITY = 40  # 降低质量时的下限
+PDF_DPI = 120  # 更低的dpi，减少内容审核风险
+
+# 分块解析参数：整版先以较高dpi渲染，再切成若干块，每块单独缩放到 TILE_MAX_SIZE
+TILE_DPI = 200
+TILE_MAX_SIZE = 1024
+
+# 近似重复版面匹配用的缩略图（纯文本解析时不渲染整版，只需计算感知哈希）
+THUMBNAIL_DPI = 36
+THUMBNAIL_MAX_SIZE = 256
+
+# 渲染结果缓存：编码方式变化时递增版本号，使旧缓存失效
+RENDER_CACHE_VERSION = 2
+render_cache = DiskCache(RENDER_CACHE_DIR, RENDER_CACHE_MAX_MB * 1024 * 1024, suffix='.jpg')
+
+_hash_lock = threading.Lock()
+_hash_memo = {}
+
+
+def file_hash(path):
+    """计算文件SHA-256（按路径、大小和修改时间记忆，同一文件只计算一次）"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        digest = _hash_memo.get(memo_key)
+    if digest is None:
+        digest = sha256_file(path)
+        with _hash_lock:
+            _hash_memo[memo_key] = digest
+    return digest
+
+
+def render_cache_key(source_hash, page_no, dpi, max_size, quality):
+    """渲染缓存键：(文件哈希, 页码, dpi, 最大尺寸, JPEG质量)"""
+    return make_cache_key(RENDER_CACHE_VERSION, source_hash, page_no, dpi, max_size, quality)
+
+
+def _save_jpeg(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def encode_jpeg(img, max_size=IMAGE_MAX_SIZE, quality=IMAGE_QUALITY, max_bytes=IMAGE_MAX_BYTES):
+    """
+    缩小图片并编码为JPEG字节
+
+    超过 max_bytes 时在 [IMAGE_MIN_QUALITY, quality) 区间内二分查找满足大小上限的最高质量；
+    查找都在已缩小的图片上进行，每次编码的开销很小。
+    """
+    # 调整图片大小，确保符合API要求
+    if img.width > max_size or img.height > max_size:
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+    # 确保图片模式为RGB
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    img_bytes = _save_jpeg(img, quality)
+    if len(img_bytes) <= max_bytes:
+        return img_bytes
+
+    # 检查数据大小
+    print("⚠️  图片数据过大，正在进一步压缩...")
+    low, high = IMAGE_MIN_QUALITY, quality - 1
+    best = None
+    while low <= high:
+        mid = (low + high) // 2
+        candidate = _save_jpeg(img, mid)
+        if len(candidate) <= max_bytes:
+            best, low = candidate, mid + 1
+        else:
+            high = mid - 1
+    # 最低质量仍超出上限时返回最低质量的结果
+    return best if best is not None else _save_jpeg(img, IMAGE_MIN_QUALITY)
+
+
+def open_scaled_image(image_path, max_size=IMAGE_MAX_SIZE):
+    """
+    打开图片并尽量按缩小的比例解码
+
+    JPEG使用draft模式在解码时直接按1/2、1/4、1/8缩小（DCT缩放），
+    解码后的尺寸仍不小于 max_size，多兆像素的扫描图无需完整解码。
+    """
+    img = Image.open(image_path)
+    if img.format == 'JPEG':
+        # 按缩放后的目标尺寸（保持宽高比）申请，长边不小于 max_size 即可
+        scale = min(1.0, max_size / max(img.size))
+        img.draft('RGB', (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+    img.load()
+    return img
+
+
+def image_to_jpeg(image_path, max_size=IMAGE_MAX_SIZE, quality=IMAGE_QUALITY):
+    """将图片缩小并编码为JPEG字节，优先使用渲染缓存"""
+    cache_key = render_cache_key(file_hash(image_path), 0, None, max_size, quality)
+    img_bytes = render_cache.get(cache_key)
+    if img_bytes is None:
         # 打开并压缩图片（减少传输大小）
-        img = Image.open(image_path)
-        
-        # 调整图片大小，确保符合API要求
-        max_size = 800  # 更小的尺寸，减少内容审核风险
-        if img.width > max_size or img.height > max_size:
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-        
-        # 确保图片模式为RGB
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # 保存到字节流并转base64
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='JPEG', quality=75)  # 适中的质量
-        img_byte_arr = img_byte_arr.getvalue()
-        
-        # 检查数据大小
-        if len(img_byte_arr) > 3 * 1024 * 1024:  # 3MB限制
-            print("⚠️  图片数据过大，正在进一步压缩...")
-            # 进一步压缩
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='JPEG', quality=60)
-            img_byte_arr = img_byte_arr.getvalue()
-        
-        base64_data = base64.b64encode(img_byte_arr).decode('utf-8')
-        print(f"✅ 图片转base64成功，数据大小：{len(base64_data) / 1024:.2f} KB")
-        return base64_data
+        with open_scaled_image(image_path, max_size=max_size) as img:
+            img_bytes = encode_jpeg(img, max_size=max_size, quality=quality)
+        render_cache.put(cache_key, img_bytes)
+    return img_bytes
+
+
+def render_pdf_page(pdf_path, page_no, dpi=PDF_DPI, max_size=IMAGE_MAX_SIZE, quality=IMAGE_QUALITY):
+    """将PDF的某一页渲染并编码为JPEG字节（可在子进程中运行）"""
+    from pdf2image import convert_from_path
+
+    pages = convert_from_path(
+        pdf_path,
+        first_page=page_no,
+        last_page=page_no,
+        dpi=dpi,
+        poppler_path=POPPLER_PATH  # Windows用户需在.env中指定poppler路径，如 C:\poppler-24.02.0\Library\bin
+    )
+    return encode_jpeg(pages[0], max_size=max_size, quality=quality)
+
+
+def pdf_page_to_jpeg(pdf_path, page_no, dpi=PDF_DPI, max_size=IMAGE_MAX_SIZE, quality=IMAGE_QUALITY):
+    """将PDF的某一页渲染为JPEG字节，优先使用渲染缓存"""
+    cache_key = render_cache_key(file_hash(pdf_path), page_no, dpi, max_size, quality)
+    img_bytes = render_cache.get(cache_key)
+    if img_bytes is None:
+        img_bytes = render_pdf_page(pdf_path, page_no, dpi=dpi, max_size=max_size, quality=quality)
+        render_cache.put(cache_key, img_bytes)
+    return img_bytes
+
+
+def get_pdf_page_count(pdf_path):
+    """获取PDF页数"""
+    from pdf2image import pdfinfo_from_path
+
+    return int(pdfinfo_from_path(pdf_path, poppler_path=POPPLER_PATH)['Pages'])
+
+
+def iter_pdf_pages(pdf_path, first_page=1, last_page=None, dpi=PDF_DPI, max_size=IMAGE_MAX_SIZE,
+                   quality=IMAGE_QUALITY, max_workers=RENDER_WORKERS):
+    """
+    使用进程池并行渲染PDF的多个页面，按页码顺序逐页返回 (页码, JPEG字节)
+
+    以生成器方式输出，同时在渲染或等待取走的页面不超过 max_workers 的两倍，
+    整期报纸也只占用少量页面的内存。max_workers 为0时使用全部CPU核心。
+    已在渲染缓存中的页面直接读取，不再提交给进程池。
+    """
+    if last_page is None:
+        last_page = get_pdf_page_count(pdf_path)
+    page_numbers = iter(range(first_page, last_page + 1))
+    max_workers = max_workers or os.cpu_count() or 1
+    source_hash = file_hash(pdf_path)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque()
+
+        def _submit_next():
+            page_no = next(page_numbers, None)
+            if page_no is None:
+                return
+            cache_key = render_cache_key(source_hash, page_no, dpi, max_size, quality)
+            cached = render_cache.get(cache_key)
+            if cached is not None:
+                pending.append((page_no, cache_key, cached, None))
+            else:
+                pending.append((page_no, cache_key, None, executor.submit(
+                    render_pdf_page, pdf_path, page_no, dpi, max_size, quality)))
+
+        for _ in range(max_workers * 2):
+            _submit_next()
+
+        while pending:
+            page_no, cache_key, jpeg_bytes, future = pending.popleft()
+            if future is not None:
+                jpeg_bytes = future.result()
+                render_cache.put(cache_key, jpeg_bytes)
+            _submit_next()
+            yield page_no, jpeg_bytes
+
+
+def tile_boxes(width, height, rows, cols, overlap=0.1):
+    """
+    将 width×height 的页面切成 rows×cols 块，返回按行优先排列的裁剪框 [(left, top, right, bottom), ...]
+
+    相邻块之间各向外扩展 overlap（占块宽/高的比例）的一半，跨越分割线的标题和段落至少完整出现在一块中。
+    """
+    boxes = []
+    tile_w, tile_h = width / cols, height / rows
+    pad_w, pad_h = tile_w * overlap / 2, tile_h * overlap / 2
+    for row in range(rows):
+        for col in range(cols):
+            boxes.append((
+                max(0, int(col * tile_w - pad_w)),
+                max(0, int(row * tile_h - pad_h)),
+                min(width, int((col + 1) * tile_w + pad_w)),
+                min(height, int((row + 1) * tile_h + pad_h)),
+            ))
+    return boxes
+
+
+def load_page_image(file_path, dpi=TILE_DPI):
+    """读取整版图片：PDF按dpi渲染第一页，图片文件直接打开"""
+    if file_path.endswith(".pdf"):
+        from pdf2image import convert_from_path
+
+        return convert_from_path(file_path, first_page=1, last_page=1, dpi=dpi, poppler_path=POPPLER_PATH)[0]
+    with Image.open(file_path) as img:
+        img.load()
+        return img.copy()
+
+
+def image_tiles_to_jpeg(file_path, rows, cols, overlap=0.1, dpi=TILE_DPI, max_size=TILE_MAX_SIZE,
+                        quality=IMAGE_QUALITY):
+    """将整版切成 rows×cols 块并分别编码为JPEG字节，按行优先返回列表，优先使用渲染缓存"""
+    source_hash = file_hash(file_path)
+    tile_count = rows * cols
+    cache_keys = [render_cache_key(source_hash, f"tile{rows}x{cols}@{overlap}:{index}", dpi, max_size, quality)
+                  for index in range(tile_count)]
+    tiles = [render_cache.get(cache_key) for cache_key in cache_keys]
+    if all(tile is not None for tile in tiles):
+        return tiles
+
+    page = load_page_image(file_path, dpi=dpi)
+    for index, box in enumerate(tile_boxes(page.width, page.height, rows, cols, overlap)):
+        if tiles[index] is None:
+            tiles[index] = encode_jpeg(page.crop(box), max_size=max_size, quality=quality)
+            render_cache.put(cache_keys[index], tiles[index])
+    return tiles
+
+
+def load_image_tiles(file_path, rows, cols, overlap=0.1):
+    """将整版切块并编码为JPEG字节列表（发送给AI），失败时返回None"""
+    try:
+        tiles = image_tiles_to_jpeg(file_path, rows, cols, overlap=overlap)
+        total_kb = sum(len(tile) for tile in tiles) / 1024
+        print(f"✅ 整版切分为 {rows}×{cols} 块，数据大小共：{total_kb:.2f} KB")
+        return tiles
+    except ImportError:
+        print("❌ 缺少PDF处理库，请先安装：pip install pdf2image")
+        return None
     except Exception as e:
-        print(f"❌ 图片转base64失败：{str(e)}")
+        print(f"❌ 整版切块失败：{str(e)}")
         return None
 
 
-def pdf_to_image_base64(pdf_path):
-    """将PDF第一页转为图片并编码为base64"""
+def load_image_for_ai(file_path):
+    """将图片或PDF第一页编码为发送给AI的JPEG字节，失败时返回None"""
     try:
-        from pdf2image import convert_from_path
-        
-        # 提取PDF第一页（降低dpi以减少大小）
-        print("📄 正在提取PDF第一页并转为图片...")
-        pages = convert_from_path(
-            pdf_path, 
-            first_page=1, 
-            last_page=1, 
-            dpi=120,  # 更低的dpi，减少内容审核风险
-            poppler_path=None  # Windows用户需指定poppler路径，如 r'C:\poppler-24.02.0\Library\bin'
-        )
-        
-        # 处理图片
-        img = pages[0]
-        
-        # 调整图片大小，确保符合API要求
-        max_size = 800  # 更小的尺寸，减少内容审核风险
-        if img.width > max_size or img.height > max_size:
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-        
-        # 确保图片模式为RGB
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # 转为base64
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='JPEG', quality=75)  # 适中的质量
-        img_byte_arr = img_byte_arr.getvalue()
-        
-        # 检查数据大小
-        if len(img_byte_arr) > 3 * 1024 * 1024:  # 3MB限制
-            print("⚠️  图片数据过大，正在进一步压缩...")
-            # 进一步压缩
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='JPEG', quality=60)
-            img_byte_arr = img_byte_arr.getvalue()
-        
-        base64_data = base64.b64encode(img_byte_arr).decode('utf-8')
-        print(f"✅ PDF转base64成功，数据大小：{len(base64_data) / 1024:.2f} KB")
-        return base64_data
-    
+        if file_path.endswith(".pdf"):
+            print("📄 正在提取PDF第一页并转为图片...")
+            img_bytes = pdf_page_to_jpeg(file_path, 1)
+        else:
+            img_bytes = image_to_jpeg(file_path)
+        print(f"✅ 图片编码成功，数据大小：{len(img_bytes) / 1024:.2f} KB")
+        return img_bytes
     except ImportError:
         print("❌ 缺少PDF处理库，请先安装：pip install pdf2image")
         print("💡 Windows用户还需下载poppler：https://github.com/oschwartz10612/poppler-windows/releases")
         return None
     except Exception as e:
-        print(f"❌ PDF转图片失败：{str(e)}")
+        print(f"❌ 图片编码失败：{str(e)}")
         return None
 
 
-def parse_ai_content(content, newspaper_name, date_str):
-    """解析AI生成的内容，提取新闻标题和摘要"""
-    if not content or not content.strip():
-        return []
-    
-    summaries = []
-    lines = content.strip().split('\n')
-    current_title = None
-    current_summary = []
-    
-    for line in lines:
+def load_page_thumbnail(file_path):
+    """PDF第一页或图片的低分辨率缩略图（JPEG字节，用于近似重复版面匹配），失败时返回None"""
+    try:
+        if file_path.endswith(".pdf"):
+            return pdf_page_to_jpeg(file_path, 1, dpi=THUMBNAIL_DPI, max_size=THUMBNAIL_MAX_SIZE)
+        return image_to_jpeg(file_path, max_size=THUMBNAIL_MAX_SIZE)
+    except Exception:
+        # 缩略图只用于复用已有结果，渲染失败时照常解析
+        return None
+
+
+def extract_pdf_text(pdf_path, page_no=1):
+    """
+    用poppler的pdftotext按阅读顺序提取PDF某一页的文字层
+
+    没有文字层、未安装poppler或提取失败时返回空字符串。
+    """
+    pdftotext = os.path.join(POPPLER_PATH, 'pdftotext') if POPPLER_PATH else 'pdftotext'
+    try:
+        result = subprocess.run(
+            [pdftotext, '-f', str(page_no), '-l', str(page_no), '-enc', 'UTF-8', '-nopgbrk', pdf_path, '-'],
+            capture_output=True, timeout=60, check=True,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ''
+    return result.stdout.decode('utf-8', errors='replace')
+
+
+def normalize_text_layer(text):
+    """整理提取出的文字：去掉行首尾空白和多余空行"""
+    lines = []
+    for line in text.replace('\f', '\n').splitlines():
         line = line.strip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return '\n'.join(lines).strip()
+
+
+def has_text_layer(text, min_chars=PDF_TEXT_MIN_CHARS):
+    """判断提取的文字是否可用：有效字符（汉字、字母、数字）足够多，且乱码很少"""
+    meaningful = sum(1 for char in text if char.isalnum())
+    garbled = text.count('\ufffd')
+    return meaningful >= min_chars and garbled <= meaningful * 0.01
+
+
+def load_pdf_text(pdf_path, page_no=1):
+    """提取PDF某一页可用的文字层，没有可用文字层（如扫描件）时返回None"""
+    print("📄 正在提取PDF文字层...")
+    text = normalize_text_layer(extract_pdf_text(pdf_path, page_no))
+    if not has_text_layer(text):
+        print("⚠️  PDF没有可用的文字层，改用图片解析")
+        return None
+    print(f"✅ PDF文字层提取成功，共 {len(text)} 字")
+    return text
+
+
+class IncrementalSummaryParser:
+    """
+    增量解析AI生成的内容，提取新闻标题和摘要
+
+    流式输出时逐段调用 feed()，每条新闻在下一条「【头条新闻N】」出现时即完成并返回，
+    输出结束后调用 close() 取出最后一条。记录格式为 (报纸名称, 日期, 标题, 摘要)。
+    """
+
+    def __init__(self, newspaper_name, date_str):
+        self.newspaper_name = newspaper_name
+        self.date_str = date_str
+        self._pending = ''
+        self._title = None
+        self._summary = []
+
+    def _flush(self):
+        """结束当前新闻，标题和摘要都有时返回记录"""
+        record = None
+        if self._title and self._summary:
+            record = (self.newspaper_name, self.date_str, self._title, ' '.join(self._summary))
+        return record
+
+    def _parse_line(self, line):
+        """处理一行内容，有新闻完成时返回其记录"""
+        line = line.strip()
+        record = None
         if line.startswith('【头条新闻'):
             # 保存上一条新闻
-            if current_title and current_summary:
-                summaries.append((newspaper_name, date_str, current_title, ' '.join(current_summary)))
-            # 提取新标题
             title_match = line.split('】', 1)
             if len(title_match) > 1:
-                current_title = title_match[1].strip()
-                current_summary = []
-        elif line.startswith('📝 核心内容：') and current_title:
+                record = self._flush()
+                # 提取新标题
+                self._title = title_match[1].strip()
+                self._summary = []
+        elif line.startswith('📝 核心内容：') and self._title:
             # 提取摘要
-            summary = line.replace('📝 核心内容：', '').strip()
-            current_summary.append(summary)
-    
-    # 保存最后一条新闻
-    if current_title and current_summary:
-        summaries.append((newspaper_name, date_str, current_title, ' '.join(current_summary)))
-    
-    return summaries
+            self._summary.append(line.replace('📝 核心内容：', '').strip())
+        return record
+
+    def feed(self, text):
+        """输入一段新生成的内容，返回其中已完成的新闻记录列表"""
+        self._pending += text
+        *lines, self._pending = self._pending.split('\n')
+        return [record for record in map(self._parse_line, lines) if record]
+
+    def close(self):
+        """输出结束，返回剩余的新闻记录列表"""
+        records = []
+        if self._pending:
+            record = self._parse_line(self._pending)
+            self._pending = ''
+            if record:
+                records.append(record)
+        # 保存最后一条新闻
+        record = self._flush()
+        self._title, self._summary = None, []
+        if record:
+            records.append(record)
+        return records
+
+
+def parse_ai_content(content, newspaper_name, date_str):
+    """解析AI生成的内容，提取新闻标题和摘要"""
+    if not content or not content.strip():
+        return []
+
+    parser = IncrementalSummaryParser(newspaper_name, date_str)
+    return parser.feed(content.strip()) + parser.close()
+
 
 def save_content_to_file(content, newspaper_name, date_str):
     """保存AI解析后的精华内容"""
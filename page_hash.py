@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+版面感知哈希模块 - 识别近似重复的版面，复用已有的AI解析结果
+
+报纸常有重复刊登的版面，纽约时报有时连续几天提供同一张 scan.jpg，
+但重新渲染/压缩后的图片字节不同，按字节哈希的结果缓存无法命中。本模块：
+- 把图片缩小为 9×8 的灰度图，按相邻像素的明暗关系生成64位差异哈希（dHash），
+  轻微的缩放、压缩、亮度变化基本不影响哈希值
+- 64位哈希分辨不出版式相同、文字不同的密集版面（同一报头、同样的分栏），
+  因此另外计算 16×16 的256位细哈希，两个哈希的汉明距离都不超过各自的阈值才视为同一版面
+- 64位哈希按8个字节分段建立索引：距离小于8的两个哈希至少有一段完全相同，查询时只需比较同段的候选项
+
+索引以JSON Lines格式追加写入，每行记录 (哈希, 细哈希, 请求参数范围, AI结果缓存键)。
+"""
+
+import io
+import os
+import json
+import threading
+from PIL import Image
+from logger import logger
+
+HASH_SIZE = 8
+FINE_HASH_SIZE = 16
+BANDS = 8
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """计算PIL图片的差异哈希（hash_size² 位整数）"""
+    # 按区域取平均缩小（BOX），比插值缩放更不受原图尺寸和压缩噪点影响
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.BOX)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def page_hash(image_bytes):
+    """计算图片数据（JPEG等）的 (64位哈希, 256位细哈希)，无法解码时返回None"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            # JPEG直接按最小比例解码，只需要极小的缩略图
+            img.draft('L', (FINE_HASH_SIZE * 4, FINE_HASH_SIZE * 4))
+            return dhash(img), dhash(img, FINE_HASH_SIZE)
+    except Exception as e:
+        logger.debug(f"计算版面哈希失败：{e}")
+        return None
+
+
+def hamming_distance(a, b):
+    """两个哈希值不同的位数"""
+    return bin(a ^ b).count('1')
+
+
+def _bands(value):
+    """把64位哈希拆成8个字节段"""
+    return [(value >> (8 * i)) & 0xFF for i in range(BANDS)]
+
+
+class PageHashIndex:
+    """近似重复版面索引（按请求参数范围分别索引，线程安全）"""
+
+    def __init__(self, path, max_distance=5, fine_max_distance=10):
+        """
+        path 为索引文件路径（首次写入时创建）；
+        max_distance、fine_max_distance 分别为64位哈希和256位细哈希视为重复的最大汉明距离
+        """
+        self.path = path
+        self.max_distance = max_distance
+        self.fine_max_distance = fine_max_distance
+        self._lock = threading.Lock()
+        self._by_scope = None  # 请求参数范围 -> [(哈希, 细哈希, 缓存键)]
+        self._buckets = None   # (请求参数范围, 段号, 段值) -> [(哈希, 细哈希, 缓存键)]
+
+    def _load(self):
+        """首次使用时读取索引文件（调用方持有锁）"""
+        if self._by_scope is not None:
+            return
+        self._by_scope = {}
+        self._buckets = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self._insert(entry['scope'], (int(entry['hash'], 16), int(entry['fine'], 16)), entry['key'])
+                except (ValueError, KeyError, TypeError):
+                    continue  # 跳过写入中断的残缺行和没有细哈希的旧条目
+
+    def _insert(self, scope, hashes, key):
+        value, fine = hashes
+        item = (value, fine, key)
+        self._by_scope.setdefault(scope, []).append(item)
+        for band_no, band in enumerate(_bands(value)):
+            self._buckets.setdefault((scope, band_no, band), []).append(item)
+
+    def find(self, scope, hashes):
+        """
+        查找与 hashes（page_hash 的结果）最接近的已索引版面
+
+        返回 (缓存键, 64位哈希的汉明距离)，没有近似重复时返回None。
+        """
+        value, fine = hashes
+        with self._lock:
+            self._load()
+            if self.max_distance < BANDS:
+                candidates = []
+                for band_no, band in enumerate(_bands(value)):
+                    candidates.extend(self._buckets.get((scope, band_no, band), ()))
+            else:
+                candidates = self._by_scope.get(scope, ())
+            best = None
+            for other, other_fine, key in candidates:
+                distance = hamming_distance(value, other)
+                if distance > self.max_distance:
+                    continue
+                # 64位哈希相近时再用细哈希确认，排除版式相同、内容不同的版面
+                fine_distance = hamming_distance(fine, other_fine)
+                if fine_distance <= self.fine_max_distance and (best is None or fine_distance < best[2]):
+                    best = (key, distance, fine_distance)
+            return best[:2] if best else None
+
+    def add(self, scope, hashes, key):
+        """登记一个已解析版面的哈希（page_hash 的结果）"""
+        value, fine = hashes
+        with self._lock:
+            self._load()
+            self._insert(scope, hashes, key)
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'hash': f"{value:016x}", 'fine': f"{fine:064x}", 'scope': scope,
+                                    'key': key}) + '\n')
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+标题搜索模块 - 按字二元组（bigram）建立的进程内倒排索引
+
+PostgreSQL默认的全文检索不会切分中文，LIKE '%关键词%' 又需要全表扫描。本模块：
+- 把标题和摘要规范化（英文转小写、合并空白）后切成单字和相邻两字，每个词项对应一个
+  按文档编号升序排列的 array('I') 倒排列表，每条只占4字节
+- 查询时对关键词的各个二元组求交集得到候选，再用原文确认关键词确实连续出现，没有误报
+- 写入数据库的摘要同步加入索引（相同报纸、日期、标题只索引一次）
+
+持久化（SEARCH_INDEX_DIR 目录）：
+    docs.jsonl     已索引的文档，逐行追加，是索引的数据来源
+    postings.bin   倒排列表快照，记录覆盖的文档数、docs.jsonl 字节数和校验和；加载时校验一致后读取快照，
+                   再补索引快照之后追加的文档，不一致时从 docs.jsonl 重建
+    index.lock     多个进程共用同一目录时，追加文档和保存快照在该文件锁内进行；追加前先读入其他进程
+                   新追加的文档，同一篇文档不会重复写入
+"""
+
+import os
+import sys
+import json
+import array
+import struct
+import atexit
+import bisect
+import datetime
+import zlib
+import threading
+from config import SEARCH_INDEX_DIR
+from logger import logger
+from utils import file_lock
+
+SNAPSHOT_MAGIC = b'NGI2'
+# 文件头之后：文档数、docs.jsonl 字节数、docs.jsonl 的CRC32、词项数
+SNAPSHOT_HEADER = struct.Struct('<IQII')
+# 距上次快照新增多少篇文档后重新保存快照
+SNAPSHOT_EVERY = 5000
+
+
+def normalize_text(text):
+    """英文转小写、合并空白，便于不区分大小写地匹配"""
+    return ' '.join(str(text or '').lower().split())
+
+
+def text_terms(text):
+    """文本的全部词项：单字和相邻两字（不含空格）"""
+    terms = set()
+    previous = ''
+    for char in text:
+        if char == ' ':
+            previous = ''
+            continue
+        terms.add(char)
+        if previous:
+            terms.add(previous + char)
+        previous = char
+    return terms
+
+
+def query_terms(keyword):
+    """关键词检索使用的词项：单字关键词用单字，其余用全部相邻两字"""
+    if len(keyword) == 1:
+        return [keyword]
+    return [keyword[i:i + 2] for i in range(len(keyword) - 1) if ' ' not in keyword[i:i + 2]]
+
+
+def date_key(value):
+    """把日期（date对象、YYYY-MM-DD 或 YYYYMMDD）转换为整数 YYYYMMDD，无法识别时返回None"""
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.year * 10000 + value.month * 100 + value.day
+    digits = str(value).replace('-', '').replace('/', '').strip()
+    return int(digits) if len(digits) == 8 and digits.isdigit() else None
+
+
+def _intersect(postings):
+    """多个升序倒排列表的交集（从最短的列表出发二分查找其余列表）"""
+    postings = sorted(postings, key=len)
+    result = []
+    for doc_id in postings[0]:
+        for other in postings[1:]:
+            index = bisect.bisect_left(other, doc_id)
+            if index == len(other) or other[index] != doc_id:
+                break
+        else:
+            result.append(doc_id)
+    return result
+
+
+class SearchIndex:
+    """报纸摘要的二元组倒排索引（线程安全）"""
+
+    def __init__(self, directory=SEARCH_INDEX_DIR):
+        """directory 为持久化目录（首次写入时创建），为None时只保存在内存中"""
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._postings = {}             # 词项 -> array('I') 文档编号
+        self._docs = []                 # 文档编号 -> (报纸, 日期整数, 标题, 摘要)
+        self._keys = set()              # 已索引的 (报纸, 日期整数, 标题)
+        self._snapshot_docs = 0         # 本进程最近保存（或加载）的快照覆盖的文档数
+        self._offset = 0                # 已读入的 docs.jsonl 字节数（只含完整的行）
+        self._crc = 0                   # 已读入部分的CRC32
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        """首次使用时加载快照和文档（调用方持有锁）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.directory:
+            return
+        snapshot = self._read_snapshot()
+        lines = self._read_lines()
+        if snapshot:
+            snapshot_docs, offset, crc, postings = snapshot
+            # 快照覆盖的文档只登记，不重新切词
+            covered = [line for line in lines if line[1] <= offset]
+            for doc, _, _ in covered:
+                if doc and doc[:3] not in self._keys:
+                    self._docs.append(doc)
+                    self._keys.add(doc[:3])
+            end, end_crc = (covered[-1][1], covered[-1][2]) if covered else (0, 0)
+            if (end, end_crc, len(self._docs)) == (offset, crc, snapshot_docs):
+                self._postings = postings
+                self._snapshot_docs = snapshot_docs
+                self._offset, self._crc = offset, crc
+                lines = lines[len(covered):]
+            else:
+                logger.warning("搜索索引快照与 docs.jsonl 不一致，将重新建立")
+                self._docs, self._keys = [], set()
+        self._consume(lines)
+        logger.debug(f"搜索索引已加载：{len(self._docs)} 篇文档，{len(self._postings)} 个词项")
+
+    def _read_lines(self):
+        """
+        读取 docs.jsonl 中 self._offset 之后的完整行（调用方持有锁）
+
+        返回 [(文档, 读到该行末尾时的字节数, 读到该行末尾时的CRC32), ...]，无法解析的行文档为None。
+        没有换行结尾的最后一行可能正在被其他进程写入，留到下次读取。
+        """
+        path = self._path('docs.jsonl')
+        try:
+            with open(path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        lines = []
+        offset, crc = self._offset, self._crc
+        for raw in data.splitlines(keepends=True):
+            if not raw.endswith(b'\n'):
+                break
+            offset += len(raw)
+            crc = zlib.crc32(raw, crc)
+            try:
+                newspaper, date, title, summary = json.loads(raw)
+                doc = (newspaper, date, title, summary)
+            except ValueError:
+                doc = None  # 跳过写入中断的残缺行
+            lines.append((doc, offset, crc))
+        return lines
+
+    def _consume(self, lines):
+        """把 _read_lines 读到的行加入索引并前移读取位置（调用方持有锁）"""
+        for doc, offset, crc in lines:
+            if doc:
+                self._index_doc(doc)
+            self._offset, self._crc = offset, crc
+
+    def _sync(self):
+        """读入其他进程追加到 docs.jsonl 的文档（调用方持有锁）"""
+        if not self.directory:
+            return
+        try:
+            size = os.path.getsize(self._path('docs.jsonl'))
+        except OSError:
+            size = 0
+        if size < self._offset:
+            # 文件被截断或替换，重新加载
+            self._postings, self._docs, self._keys = {}, [], set()
+            self._snapshot_docs = self._offset = self._crc = 0
+            self._loaded = False
+            self._load()
+        elif size > self._offset:
+            self._consume(self._read_lines())
+
+    def _read_snapshot(self):
+        """读取倒排列表快照，返回 (文档数, docs.jsonl 字节数, CRC32, 倒排列表)，快照缺失或无效时返回None"""
+        path = self._path('postings.bin')
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if data[:4] != SNAPSHOT_MAGIC:
+                raise ValueError("文件头不正确")
+            snapshot_docs, docs_size, docs_crc, term_count = SNAPSHOT_HEADER.unpack_from(data, 4)
+            offset = 4 + SNAPSHOT_HEADER.size
+            postings = {}
+            for _ in range(term_count):
+                term_size, = struct.unpack_from('<H', data, offset)
+                offset += 2
+                term = data[offset:offset + term_size].decode('utf-8')
+                offset += term_size
+                count, = struct.unpack_from('<I', data, offset)
+                offset += 4
+                ids = array.array('I')
+                ids.frombytes(data[offset:offset + count * 4])
+                offset += count * 4
+                if len(ids) != count:
+                    raise ValueError("倒排列表不完整")
+                if sys.byteorder != 'little':
+                    ids.byteswap()
+                postings[term] = ids
+        except (OSError, ValueError, struct.error, UnicodeDecodeError) as e:
+            logger.warning(f"搜索索引快照无效，将重新建立：{e}")
+            return None
+        return snapshot_docs, docs_size, docs_crc, postings
+
+    def save(self):
+        """把倒排列表写入快照（在文件锁内先读入其他进程追加的文档）"""
+        with self._lock:
+            if not self._loaded or not self.directory:
+                return
+            with file_lock(self._path('index.lock')):
+                self._sync()
+                self._write_snapshot()
+
+    def _write_snapshot(self):
+        """写入快照，先写临时文件再替换（调用方持有锁和文件锁）"""
+        if self._snapshot_docs == len(self._docs):
+            return
+        path = self._path('postings.bin')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC + SNAPSHOT_HEADER.pack(len(self._docs), self._offset, self._crc,
+                                                          len(self._postings)))
+            for term, ids in self._postings.items():
+                encoded = term.encode('utf-8')
+                f.write(struct.pack('<H', len(encoded)) + encoded + struct.pack('<I', len(ids)))
+                if sys.byteorder != 'little':
+                    ids = array.array('I', ids)
+                    ids.byteswap()
+                f.write(ids.tobytes())
+        os.replace(tmp_path, path)
+        self._snapshot_docs = len(self._docs)
+        logger.debug(f"搜索索引快照已保存：{len(self._docs)} 篇文档")
+
+    def _index_doc(self, doc):
+        """把一篇文档加入内存索引（调用方持有锁），返回是否新增"""
+        if doc[:3] in self._keys:
+            return False
+        doc_id = len(self._docs)
+        self._docs.append(doc)
+        self._keys.add(doc[:3])
+        for term in text_terms(normalize_text(f"{doc[2]} {doc[3]}")):
+            ids = self._postings.get(term)
+            if ids is None:
+                ids = self._postings[term] = array.array('I')
+            ids.append(doc_id)  # 文档编号递增，追加后仍然有序
+        return True
+
+    def add_many(self, summaries):
+        """索引一批 (报纸, 日期, 标题, 摘要)，已索引过的跳过，返回新增的篇数"""
+        docs = [(newspaper, date_key(date), title, summary) for newspaper, date, title, summary in summaries]
+        with self._lock:
+            self._load()
+            if not self.directory:
+                return sum(self._index_doc(doc) for doc in docs)
+            with file_lock(self._path('index.lock')):
+                # 先读入其他进程已追加的文档，避免重复写入
+                self._sync()
+                added = [doc for doc in docs if self._index_doc(doc)]
+                if added:
+                    data = ''.join(json.dumps(doc, ensure_ascii=False) + '\n' for doc in added)
+                    path = self._path('docs.jsonl')
+                    if os.path.exists(path) and os.path.getsize(path) > self._offset:
+                        data = '\n' + data  # 结束中断写入留下的残缺行
+                    with open(path, 'a', encoding='utf-8', newline='') as f:
+                        f.write(data)
+                    # 本进程追加的文档已在索引中，这里只前移读取位置
+                    self._consume(self._read_lines())
+                    if len(self._docs) - self._snapshot_docs >= SNAPSHOT_EVERY:
+                        self._write_snapshot()
+            return len(added)
+
+    def add(self, newspaper, date, title, summary):
+        """索引一条摘要，返回是否新增"""
+        return self.add_many([(newspaper, date, title, summary)]) == 1
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            self._sync()
+            return len(self._docs)
+
+    def search(self, query, newspaper=None, date_range=None, limit=50):
+        """
+        搜索标题和摘要中同时包含 query 各关键词（空格分隔）的新闻
+
+        newspaper 限定报纸；date_range 为 (开始日期, 结束日期)，任一端为None表示不限。
+        结果按标题命中优先、日期从新到旧排列，每条为
+        {'newspaper', 'date'(YYYY-MM-DD), 'title', 'summary', 'in_title'}。
+        """
+        keywords = normalize_text(query).split()
+        if not keywords:
+            return []
+        start, end = (date_key(value) for value in (date_range or (None, None)))
+
+        with self._lock:
+            self._load()
+            self._sync()
+            postings = []
+            for keyword in keywords:
+                for term in query_terms(keyword):
+                    ids = self._postings.get(term)
+                    if ids is None:
+                        return []
+                    postings.append(ids)
+            candidates = _intersect(postings)
+            docs = [self._docs[doc_id] for doc_id in candidates]
+
+        results = []
+        for doc_newspaper, date, title, summary in docs:
+            if newspaper and doc_newspaper != newspaper:
+                continue
+            if (start and (date or 0) < start) or (end and (date or 0) > end):
+                continue
+            title_text = normalize_text(title)
+            text = f"{title_text} {normalize_text(summary)}"
+            # 二元组都出现不代表关键词连续出现，用原文确认
+            if not all(keyword in text for keyword in keywords):
+                continue
+            results.append({
+                'newspaper': doc_newspaper,
+                'date': f"{date // 10000:04d}-{date // 100 % 100:02d}-{date % 100:02d}" if date else None,
+                'title': title,
+                'summary': summary,
+                'in_title': all(keyword in title_text for keyword in keywords),
+            })
+        results.sort(key=lambda item: (not item['in_title'], -(date_key(item['date']) or 0)))
+        return results[:limit] if limit else results
+
+
+# 创建全局索引实例（进程退出时保存快照）
+search_index = SearchIndex()
+atexit.register(search_index.save)
+
+
+def search_summaries(query, newspaper=None, date_range=None, limit=50):
+    """在全局索引中搜索新闻摘要，参数见 SearchIndex.search"""
+    return search_index.search(query, newspaper=newspaper, date_range=date_range, limit=limit)
@@ -194,5 +194,1530 @@ class TestDateValidation(unittest.TestCase):
             self.assertEqual(len(date_formats['yyyymmdd']), 8)
 
 
+class TestBatchMode(unittest.TestCase):
+    """测试批量处理功能"""
+
+    def test_build_jobs_covers_dates_and_newspapers(self):
+        """测试日期范围 × 报纸的任务生成"""
+        from batch import build_jobs
+
+        jobs = build_jobs(['人民日报', '纽约时报'], datetime.datetime(2026, 2, 27), datetime.datetime(2026, 3, 1))
+
+        self.assertEqual(len(jobs), 6)
+        self.assertEqual(jobs[0][0], '人民日报')
+        self.assertEqual(jobs[0][2], '20260227')
+        self.assertEqual(jobs[-1][2], '20260301')
+
+    def test_run_batch_respects_per_host_limit(self):
+        """测试单站点并发上限"""
+        import asyncio
+        from unittest import mock
+        import batch
+
+        active = {'now': 0, 'max': 0}
+
+        async def fake_download(newspaper_name, date_obj, date_str, session=None, limiter=None):
+            async with limiter.limit('http://paper.people.com.cn/rmrb/pc/layout/node_01.html'):
+                active['now'] += 1
+                active['max'] = max(active['max'], active['now'])
+                await asyncio.sleep(0.01)
+                active['now'] -= 1
+            return f"{newspaper_name}_{date_str}"
+
+        jobs = batch.build_jobs(['人民日报'], datetime.datetime(2026, 2, 1), datetime.datetime(2026, 2, 10))
+        with mock.patch.object(batch, 'async_download_newspaper_file', side_effect=fake_download):
+            results = batch.run_batch(jobs, max_workers=8, per_host_limit=2)
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(active['max'], 2)
+        self.assertEqual(results[0], ('人民日报', '20260201', '人民日报_20260201'))
+
+
+class TestResumableDownload(unittest.TestCase):
+    """测试断点续传下载"""
+
+    def test_fetch_to_file_resumes_part_file(self):
+        """测试从 .part 文件续传并原子重命名"""
+        import asyncio
+        import os
+        import tempfile
+        import aiohttp
+        from aiohttp import web
+        from downloader import fetch_to_file, HostLimiter
+        from transport import create_http_session
+
+        payload = os.urandom(300 * 1024)
+        received_ranges = []
+
+        async def handler(request):
+            received_ranges.append(request.headers.get('Range'))
+            start = int(request.headers['Range'].split('=')[1].rstrip('-'))
+            return web.Response(status=206, body=payload[start:], headers={
+                'Content-Range': f'bytes {start}-{len(payload) - 1}/{len(payload)}'
+            })
+
+        async def run(save_path):
+            app = web.Application()
+            app.router.add_get('/scan.jpg', handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            try:
+                async with create_http_session() as session:
+                    return await fetch_to_file(session, f'http://127.0.0.1:{port}/scan.jpg', save_path,
+                                               HostLimiter(), aiohttp.ClientTimeout(total=10))
+            finally:
+                await runner.cleanup()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            save_path = os.path.join(tmp_dir, 'scan.jpg')
+            with open(save_path + '.part', 'wb') as f:
+                f.write(payload[:100 * 1024])
+
+            self.assertEqual(asyncio.run(run(save_path)), 206)
+            self.assertEqual(received_ranges, [f'bytes={100 * 1024}-'])
+            self.assertFalse(os.path.exists(save_path + '.part'))
+            with open(save_path, 'rb') as f:
+                self.assertEqual(f.read(), payload)
+
+
+class TestArtifactStore(unittest.TestCase):
+    """测试按内容寻址的文件存储"""
+
+    def test_commit_lookup_and_dedup(self):
+        """测试存储、查询以及相同内容只保存一份"""
+        import os
+        import tempfile
+        from artifact_store import ArtifactStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ArtifactStore(os.path.join(tmp_dir, '.store'))
+            self.assertIsNone(store.lookup('https://example.com/a.jpg'))
+
+            entries = []
+            for url in ('https://example.com/a.jpg', 'https://example.com/b.jpg'):
+                temp_path = store.temp_path(url, 'jpg')
+                with open(temp_path, 'wb') as f:
+                    f.write(b'same-content')
+                entries.append(store.commit(url, temp_path, 'jpg', etag='"v1"',
+                                            last_modified='Thu, 19 Feb 2026 00:00:00 GMT'))
+
+            self.assertEqual(entries[0]['sha256'], entries[1]['sha256'])
+            self.assertEqual(len(os.listdir(os.path.join(store.blob_dir, entries[0]['sha256'][:2]))), 1)
+            self.assertEqual(store.lookup('https://example.com/a.jpg')['size'], len(b'same-content'))
+            self.assertEqual(store.conditional_headers(entries[0]), {
+                'If-None-Match': '"v1"',
+                'If-Modified-Since': 'Thu, 19 Feb 2026 00:00:00 GMT',
+            })
+
+            dest_path = os.path.join(tmp_dir, '纽约时报_20260219.jpg')
+            store.materialize(entries[0], dest_path)
+            with open(dest_path, 'rb') as f:
+                self.assertEqual(f.read(), b'same-content')
+
+    def test_discard_keeps_shared_blob(self):
+        """测试删除一个URL的条目时，其他URL共用的内容文件保留，最后一个引用删除后才删除内容"""
+        import os
+        import tempfile
+        from artifact_store import ArtifactStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ArtifactStore(os.path.join(tmp_dir, '.store'))
+            urls = ('https://example.com/a.jpg', 'https://example.com/b.jpg')
+            for url in urls:
+                temp_path = store.temp_path(url, 'jpg')
+                with open(temp_path, 'wb') as f:
+                    f.write(b'shared-content')
+                entry = store.commit(url, temp_path, 'jpg')
+            blob_path = store.blob_path(entry['sha256'], 'jpg')
+
+            self.assertFalse(store.discard(urls[0]))
+            self.assertIsNone(store.lookup(urls[0]))
+            self.assertTrue(os.path.exists(blob_path))
+            self.assertEqual(store.lookup(urls[1])['sha256'], entry['sha256'])
+
+            self.assertTrue(store.discard(urls[1]))
+            self.assertFalse(os.path.exists(blob_path))
+            self.assertFalse(store.discard(urls[1]))
+
+    def test_concurrent_downloads_do_not_share_part_file(self):
+        """测试同一URL的临时文件被占用时，另一个下载使用独立的临时文件，结束后删除其残留"""
+        import os
+        import tempfile
+        from artifact_store import ArtifactStore
+
+        url = 'https://example.com/a.pdf'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ArtifactStore(os.path.join(tmp_dir, '.store'))
+            with store.reserve_temp(url, 'pdf') as shared_path:
+                self.assertEqual(shared_path, store.temp_path(url, 'pdf'))
+                with store.reserve_temp(url, 'pdf') as private_path:
+                    self.assertNotEqual(private_path, shared_path)
+                    open(f"{private_path}.part", 'wb').close()
+                self.assertFalse(os.path.exists(f"{private_path}.part"))
+            # 锁释放后重新使用固定的临时文件续传
+            with store.reserve_temp(url, 'pdf') as path:
+                self.assertEqual(path, shared_path)
+
+
+class TestTransport(unittest.TestCase):
+    """测试共享连接池"""
+
+    def test_sync_calls_share_one_session(self):
+        """测试多次同步调用复用同一个会话"""
+        from transport import run_sync, get_shared_session
+
+        first = run_sync(get_shared_session())
+        second = run_sync(get_shared_session())
+
+        self.assertIs(first, second)
+        self.assertFalse(first.closed)
+
+    def test_session_closed_when_loop_finishes(self):
+        """测试 asyncio.run 结束时关闭该事件循环的共享会话"""
+        import asyncio
+        from transport import get_shared_session
+
+        async def _twice():
+            first = await get_shared_session()
+            self.assertIs(await get_shared_session(), first)
+            return first
+
+        session = asyncio.run(_twice())
+        self.assertTrue(session.closed)
+        self.assertFalse(asyncio.run(get_shared_session()) is session)
+
+    def test_http_client_uses_detected_proxies(self):
+        """测试AI调用的httpx客户端使用与下载相同的代理"""
+        import sys
+        from unittest import mock
+        import transport
+
+        httpx = mock.MagicMock()
+        proxies = {'http': 'http://proxy:8080', 'https': 'http://proxy:8443'}
+        with mock.patch.dict(sys.modules, {'httpx': httpx}), \
+                mock.patch.object(transport, '_http_client', None), \
+                mock.patch.object(transport, 'get_proxies', return_value=proxies):
+            transport.get_http_client()
+
+        self.assertEqual(sorted(call[1]['proxy'] for call in httpx.HTTPTransport.call_args_list),
+                         ['http://proxy:8080', 'http://proxy:8443'])
+        self.assertEqual(sorted(httpx.Client.call_args[1]['mounts']), ['http://', 'https://'])
+
+
+class TestEditionCrawler(unittest.TestCase):
+    """测试整版版面发现"""
+
+    def test_parse_page_links(self):
+        """测试从版面页解析全部版面"""
+        from edition_crawler import parse_page_links
+
+        html = (
+            '<a href="node_01.html"><img src="t1.jpg"></a><a href="node_01.html">01版：要闻</a>'
+            '<a id=pageLink href=node_02.html>02版：要闻</a>'
+            '<a href="node_10.html">10版：国际</a>'
+        )
+        pages = parse_page_links(html, 'http://paper.people.com.cn/rmrb/pc/layout/202602/19/node_01.html')
+
+        self.assertEqual([page['page_no'] for page in pages], [1, 2, 10])
+        self.assertEqual(pages[0]['name'], '01版：要闻')
+        self.assertEqual(pages[2]['layout_url'], 'http://paper.people.com.cn/rmrb/pc/layout/202602/19/node_10.html')
+
+    def test_discover_edition_fetches_all_pages_and_caches(self):
+        """测试发现全部版面的PDF并缓存结果"""
+        import asyncio
+        import tempfile
+        from unittest import mock
+        import edition_crawler
+
+        layouts = {
+            'node_01.html': '<a href="../../../attachement/p1.pdf">PDF</a><a href="node_02.html">02版：要闻</a>'
+                            '<a href="node_01.html">01版：要闻</a>',
+            'node_02.html': '<a href="../../../attachement/p2.pdf">PDF</a>',
+        }
+        fetched = []
+
+        async def fake_fetch(session, url, limiter):
+            fetched.append(url)
+            return layouts[url.rsplit('/', 1)[1]]
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(edition_crawler, 'EDITION_CACHE_DIR', tmp_dir), \
+                mock.patch.object(edition_crawler, 'fetch_layout_html', side_effect=fake_fetch):
+            date_obj = datetime.datetime(2026, 2, 19)
+            pages = asyncio.run(edition_crawler.discover_edition('人民日报', date_obj, session=object()))
+            cached = asyncio.run(edition_crawler.discover_edition('人民日报', date_obj, session=object()))
+
+        self.assertEqual(len(fetched), 2)
+        self.assertEqual([page['pdf_url'].rsplit('/', 1)[1] for page in pages], ['p1.pdf', 'p2.pdf'])
+        self.assertEqual(cached, pages)
+
+
+class TestPdfRendering(unittest.TestCase):
+    """测试图片编码和PDF并行渲染"""
+
+    def test_encode_jpeg_downscales(self):
+        """测试图片缩放和JPEG编码"""
+        import io
+        from PIL import Image
+        from file_processor import encode_jpeg
+
+        jpeg_bytes = encode_jpeg(Image.new('RGBA', (2400, 1600), (200, 30, 30, 255)), max_size=800)
+
+        with Image.open(io.BytesIO(jpeg_bytes)) as img:
+            self.assertEqual(img.format, 'JPEG')
+            self.assertEqual(img.size, (800, 533))
+
+    def test_encode_jpeg_meets_byte_budget(self):
+        """测试编码结果超过大小上限时降低质量直到满足上限"""
+        import random
+        from PIL import Image
+        from file_processor import encode_jpeg
+
+        random.seed(0)
+        noise = Image.frombytes('RGB', (400, 400), bytes(random.getrandbits(8) for _ in range(400 * 400 * 3)))
+        full = encode_jpeg(noise.copy(), max_size=400, quality=75, max_bytes=10 ** 8)
+        budget = len(full) * 2 // 3
+
+        self.assertLessEqual(len(encode_jpeg(noise.copy(), max_size=400, quality=75, max_bytes=budget)), budget)
+
+    def test_open_scaled_image_uses_reduced_jpeg_decode(self):
+        """测试JPEG按缩小的比例解码，长边不小于目标尺寸"""
+        import os
+        import tempfile
+        from PIL import Image
+        from file_processor import open_scaled_image
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            image_path = os.path.join(tmp_dir, 'scan.jpg')
+            Image.new('RGB', (4000, 6000), (240, 240, 240)).save(image_path)
+            with open_scaled_image(image_path, max_size=800) as img:
+                self.assertEqual(img.size, (1000, 1500))
+
+    @unittest.skipUnless(__import__('shutil').which('pdftoppm'), "未安装poppler")
+    def test_iter_pdf_pages_in_order(self):
+        """测试多页PDF按页码顺序并行渲染"""
+        import os
+        import tempfile
+        from PIL import Image
+        from file_processor import iter_pdf_pages
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, 'edition.pdf')
+            pages = [Image.new('RGB', (600, 800), (i * 40, 0, 0)) for i in range(5)]
+            pages[0].save(pdf_path, format='PDF', save_all=True, append_images=pages[1:])
+
+            rendered = list(iter_pdf_pages(pdf_path, first_page=2, max_workers=2))
+
+        self.assertEqual([page_no for page_no, _ in rendered], [2, 3, 4, 5])
+        self.assertTrue(all(jpeg_bytes[:2] == b'\xff\xd8' for _, jpeg_bytes in rendered))
+
+
+class TestRenderCache(unittest.TestCase):
+    """测试渲染结果磁盘缓存"""
+
+    def test_disk_cache_evicts_least_recently_used(self):
+        """测试超过容量上限时淘汰最久未用的缓存项"""
+        import os
+        import tempfile
+        from disk_cache import DiskCache
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DiskCache(tmp_dir, max_bytes=2500)
+            cache.put('aa01', b'x' * 1000)
+            cache.put('bb02', b'y' * 1000)
+            # 让 aa01 成为最近使用的缓存项
+            os.utime(cache._path('bb02'), (1000, 1000))
+            self.assertEqual(cache.get('aa01'), b'x' * 1000)
+
+            cache.put('cc03', b'z' * 1000)
+
+            self.assertIsNone(cache.get('bb02'))
+            self.assertEqual(cache.get('aa01'), b'x' * 1000)
+            self.assertEqual(cache.get('cc03'), b'z' * 1000)
+
+    def test_overwrite_counts_size_difference(self):
+        """测试覆盖已有的缓存项只累加大小差值，不会提前淘汰"""
+        import tempfile
+        from disk_cache import DiskCache
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DiskCache(tmp_dir, max_bytes=2500)
+            cache.put('aa01', b'x' * 1000)
+            for _ in range(3):
+                cache.put('bb02', b'y' * 1000)
+            cache.put('bb02', b'y' * 600)
+
+            self.assertEqual(cache._total_bytes, 1600)
+            self.assertEqual(cache.get('aa01'), b'x' * 1000)
+
+    def test_image_to_jpeg_uses_cache(self):
+        """测试同一图片第二次编码直接读取缓存"""
+        import os
+        import tempfile
+        from unittest import mock
+        from PIL import Image
+        from disk_cache import DiskCache
+        import file_processor
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            image_path = os.path.join(tmp_dir, 'scan.jpg')
+            Image.new('RGB', (1600, 1200), (10, 20, 30)).save(image_path)
+            cache = DiskCache(os.path.join(tmp_dir, 'cache'), 10 * 1024 * 1024, suffix='.jpg')
+
+            with mock.patch.object(file_processor, 'render_cache', cache), \
+                    mock.patch.object(file_processor, 'encode_jpeg', wraps=file_processor.encode_jpeg) as encode:
+                first = file_processor.image_to_jpeg(image_path)
+                second = file_processor.image_to_jpeg(image_path)
+                other_quality = file_processor.image_to_jpeg(image_path, quality=50)
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other_quality)
+        self.assertEqual(encode.call_count, 2)
+
+    def test_disk_cache_ttl_expiry(self):
+        """测试超过有效期的缓存项视为不存在并被删除"""
+        import os
+        import tempfile
+        from disk_cache import DiskCache
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DiskCache(tmp_dir, max_bytes=10000, ttl=60)
+            cache.put('aa01', b'old')
+            cache.put('bb02', b'new')
+            # 把 aa01 的写入时间改到两分钟前
+            os.utime(cache._path('aa01'), (1000, os.path.getmtime(cache._path('aa01')) - 120))
+
+            self.assertIsNone(cache.get('aa01'))
+            self.assertFalse(os.path.exists(cache._path('aa01')))
+            self.assertEqual(cache.get('bb02'), b'new')
+
+
+class AITestCase(unittest.TestCase):
+    """
+    AI解析测试的基类：每个测试使用临时目录中的结果缓存、版面索引、渲染缓存、调用统计和独立的调度器，
+    只启用通义千问（测试密钥），不读写真实的缓存和日志
+    """
+
+    def setUp(self):
+        import os
+        import tempfile
+        from disk_cache import DiskCache
+        from ai_scheduler import AIScheduler
+        from ai_metrics import MetricsStore
+        import ai_client
+        import ai_providers
+        import file_processor
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp_dir = tmp.name
+        self.patch(ai_client, 'response_cache',
+                   DiskCache(os.path.join(self.tmp_dir, 'ai_cache'), 10 ** 8, suffix='.txt'))
+        self.patch(ai_client, 'page_index', ai_client.PageHashIndex(os.path.join(self.tmp_dir, 'pages.jsonl')))
+        self.metrics = self.patch(ai_client, 'metrics',
+                                  MetricsStore(os.path.join(self.tmp_dir, 'ai_metrics.jsonl'), enabled=True))
+        self.patch(ai_client, 'get_http_client')
+        self.patch(ai_client, 'AI_STREAM', False)
+        self.patch(file_processor, 'render_cache', DiskCache(os.path.join(self.tmp_dir, 'render'), 10 ** 8))
+        self.patch(ai_providers, 'AI_PROVIDERS', 'qwen')
+        self.patch(ai_providers, 'TONGYI_API_KEY', 'test-key')
+        self.patch(ai_providers, 'qwen_scheduler', AIScheduler(rpm=10 ** 6, tpm=10 ** 9, max_retries=0))
+        self.patch(ai_providers, '_router', None)
+
+    def patch(self, target, attribute, *args, **kwargs):
+        """在本测试内替换 target.attribute，返回替换后的对象"""
+        from unittest import mock
+
+        patcher = mock.patch.object(target, attribute, *args, **kwargs)
+        patched = patcher.start()
+        self.addCleanup(patcher.stop)
+        return patched
+
+
+class TestAIResponseCache(AITestCase):
+    """测试AI解析结果缓存"""
+
+    def _analyze_twice(self, use_cache):
+        import os
+        from PIL import Image
+        import ai_client
+        import ai_providers
+
+        image_path = os.path.join(self.tmp_dir, 'scan.jpg')
+        Image.new('RGB', (400, 300), (200, 200, 200)).save(image_path)
+        completion = {'choices': [{'message': {'content': '【主要新闻】\n- 测试新闻'}}]}
+        post = self.patch(ai_providers, 'post_chat_completion', return_value=completion)
+        first = ai_client.analyze_with_free_ai(image_path, '测试报', '20260219', use_cache=use_cache)
+        second = ai_client.analyze_with_free_ai(image_path, '测试报', '20260219', use_cache=use_cache)
+        return first, second, post.call_count
+
+    def test_second_call_hits_cache(self):
+        """测试相同图片第二次解析直接返回缓存结果"""
+        first, second, calls = self._analyze_twice(use_cache=True)
+        self.assertEqual(first, '【主要新闻】\n- 测试新闻')
+        self.assertEqual(second, first)
+        self.assertEqual(calls, 1)
+
+    def test_use_cache_false_bypasses_cache(self):
+        """测试关闭缓存时每次都调用AI接口"""
+        _, _, calls = self._analyze_twice(use_cache=False)
+        self.assertEqual(calls, 2)
+
+    def test_cache_is_per_provider_and_skips_mock(self):
+        """测试模拟服务的结果不写入缓存，各服务的结果分别缓存"""
+        import ai_client
+        import ai_providers
+
+        self.patch(ai_providers, 'AI_PROVIDERS', 'mock')
+        mock_result = ai_client.request_analysis('提示词', None, echo=False)
+        self.assertEqual(mock_result, ai_providers.MockProvider.DEFAULT_CONTENT)
+        self.assertIsNone(ai_client.response_cache.get(
+            ai_client.response_cache_key(b'', '提示词', provider='mock', model='mock')))
+
+        completion = {'choices': [{'message': {'content': '【头条新闻1】真实结果'}}]}
+        post = self.patch(ai_providers, 'post_chat_completion', return_value=completion)
+        self.patch(ai_providers, 'AI_PROVIDERS', 'qwen')
+        self.patch(ai_providers, '_router', None)
+        self.assertEqual(ai_client.request_analysis('提示词', None, echo=False), '【头条新闻1】真实结果')
+        self.assertEqual(ai_client.request_analysis('提示词', None, echo=False), '【头条新闻1】真实结果')
+        self.assertEqual(post.call_count, 1)
+        key = ai_client.response_cache_key(b'', '提示词', provider='qwen', model=ai_client.AI_TEXT_MODEL)
+        self.assertIsNotNone(ai_client.response_cache.get(key))
+        self.assertIsNone(ai_client.response_cache.get(
+            ai_client.response_cache_key(b'', '提示词', provider='ernie', model=ai_client.AI_TEXT_MODEL)))
+
+
+class TestTiledAnalysis(AITestCase):
+    """测试整版分块解析"""
+
+    def test_tile_boxes_cover_page_with_overlap(self):
+        """测试分块覆盖整个页面且相邻块有重叠"""
+        from file_processor import tile_boxes
+
+        boxes = tile_boxes(1000, 800, rows=2, cols=2, overlap=0.1)
+        self.assertEqual(len(boxes), 4)
+        self.assertEqual(boxes[0][:2], (0, 0))
+        self.assertEqual(boxes[-1][2:], (1000, 800))
+        # 第一块的右边界越过中线，第二块的左边界在中线之前
+        self.assertGreater(boxes[0][2], 500)
+        self.assertLess(boxes[1][0], 500)
+
+    def test_merge_tile_results_dedupes_overlap(self):
+        """测试重叠区域重复出现的新闻只保留内容更完整的一条"""
+        from ai_client import merge_tile_results
+
+        merged = merge_tile_results([
+            "【头条新闻1】全国两会开幕\n📝 核心内容：会议开幕",
+            None,
+            "【头条新闻2】全国两会开幕！\n📝 核心内容：会议今日在北京开幕，审议政府工作报告\n\n【头条新闻3】春耕生产全面展开",
+        ])
+        self.assertEqual(merged.count('两会开幕'), 1)
+        self.assertIn('审议政府工作报告', merged)
+        self.assertIn('春耕生产全面展开', merged)
+
+    def test_tiled_mode_calls_ai_per_tile(self):
+        """测试分块模式下每块调用一次AI并合并结果"""
+        import os
+        from PIL import Image
+        import ai_client
+        import ai_providers
+
+        image_path = os.path.join(self.tmp_dir, 'page.png')
+        Image.new('RGB', (1200, 1600), (255, 255, 255)).save(image_path)
+        completion = {'choices': [{'message': {'content': '【头条新闻1】跨越分割线的新闻'}}]}
+        post = self.patch(ai_providers, 'post_chat_completion', return_value=completion)
+        result = ai_client.analyze_with_free_ai(image_path, '测试报', '20260219', tile_grid='2x2')
+
+        self.assertEqual(post.call_count, 4)
+        self.assertEqual(result, '【头条新闻1】跨越分割线的新闻')
+
+
+class TestChatPayload(unittest.TestCase):
+    """测试少拷贝的AI请求体构建"""
+
+    def test_payload_matches_json_serialization(self):
+        """测试分段请求体与直接JSON序列化的结果一致"""
+        import json
+        import base64
+        from ai_payload import build_chat_payload
+
+        image_bytes = bytes(range(256)) * 1000 + b'\x01'  # 长度不是3的倍数，且跨越多个编码块
+        payload = build_chat_payload('qwen-vl-plus', '请提取"头条"新闻', image_bytes,
+                                     temperature=0.1, max_tokens=2000, top_p=0.9)
+        body = json.loads(payload.to_bytes())
+
+        self.assertEqual(payload.content_length, len(payload.to_bytes()))
+        self.assertEqual(body['messages'][1]['content'][0]['text'], '请提取"头条"新闻')
+        self.assertEqual(body['messages'][1]['content'][1]['image_url']['url'],
+                         'data:image/jpeg;base64,' + base64.b64encode(image_bytes).decode('ascii'))
+
+    def test_buffer_reused_between_payloads(self):
+        """测试同一线程内多次构建复用编码缓冲区"""
+        from ai_payload import build_chat_payload
+
+        first = build_chat_payload('m', 'p', b'x' * 3000, temperature=0.1, max_tokens=10, top_p=0.9)
+        second = build_chat_payload('m', 'p', b'y' * 300, temperature=0.1, max_tokens=10, top_p=0.9)
+        self.assertIs(first.image_view.obj, second.image_view.obj)
+
+
+class TestStreamingAnalysis(AITestCase):
+    """测试流式输出和增量解析"""
+
+    CONTENT = ("【头条新闻1】两会开幕\n📝 核心内容：会议今日开幕\n\n"
+               "【头条新闻2】春耕生产\n📝 核心内容：各地春耕全面展开\n")
+
+    def test_incremental_parser_emits_when_block_closes(self):
+        """测试逐字输入时，每条新闻在下一条标题出现时即返回"""
+        from file_processor import IncrementalSummaryParser, parse_ai_content
+
+        parser = IncrementalSummaryParser('人民日报', '20260219')
+        emitted = []
+        for index, char in enumerate(self.CONTENT):
+            for record in parser.feed(char):
+                emitted.append((index, record))
+
+        first_index, first_record = emitted[0]
+        self.assertEqual(first_record[2], '两会开幕')
+        self.assertLess(first_index, self.CONTENT.index('各地春耕'))
+        records = [record for _, record in emitted] + parser.close()
+        self.assertEqual(records, parse_ai_content(self.CONTENT, '人民日报', '20260219'))
+
+    def test_stream_emits_records_before_completion(self):
+        """测试流式请求边生成边回调新闻记录"""
+        import os
+        from PIL import Image
+        import ai_client
+        import ai_providers
+
+        events = []
+        pieces = [self.CONTENT[i:i + 7] for i in range(0, len(self.CONTENT), 7)]
+
+        def _fake_stream(payload):
+            for piece in pieces:
+                events.append('chunk')
+                yield {'choices': [{'delta': {'content': piece}}]}
+            yield {'choices': [], 'usage': {'total_tokens': 900}}
+
+        image_path = os.path.join(self.tmp_dir, 'scan.jpg')
+        Image.new('RGB', (400, 300), (200, 200, 200)).save(image_path)
+        self.patch(ai_providers, 'iter_chat_stream', side_effect=_fake_stream)
+        self.patch(ai_client, 'AI_STREAM', True)
+        result = ai_client.analyze_with_free_ai(image_path, '人民日报', '20260219',
+                                                on_record=lambda record: events.append(record[2]))
+
+        self.assertEqual(result, self.CONTENT.strip())
+        # 第一条新闻在流结束前就已回调
+        self.assertLess(events.index('两会开幕'), len(events) - 2)
+        self.assertEqual(events[-1], '春耕生产')
+
+
+class TestPdfTextLayer(AITestCase):
+    """测试PDF文字层提取和纯文本解析"""
+
+    def test_has_text_layer(self):
+        """测试根据有效字符数和乱码比例判断文字层是否可用"""
+        from file_processor import has_text_layer, normalize_text_layer
+
+        self.assertTrue(has_text_layer('人民日报' * 60))
+        self.assertFalse(has_text_layer('  \n\f  '))
+        self.assertFalse(has_text_layer('人民日报' * 60 + '\ufffd' * 50))
+        self.assertEqual(normalize_text_layer('  标题 \n\n\n\f正文  \n'), '标题\n\n正文')
+
+    def test_pdf_with_text_layer_skips_vision(self):
+        """测试有文字层的PDF使用纯文本模型解析，不再渲染图片"""
+        import os
+        import json
+        import ai_client
+        import ai_providers
+        import file_processor
+
+        layer_text = '【要闻】全国春耕生产全面展开，各地抢抓农时。' * 20
+        completion = {'choices': [{'message': {'content': '【头条新闻1】春耕\n📝 核心内容：各地抢抓农时'}}]}
+        pdf_path = os.path.join(self.tmp_dir, '人民日报_20260219.pdf')
+        with open(pdf_path, 'wb') as f:
+            f.write(b'%PDF-1.4')
+        self.patch(file_processor, 'extract_pdf_text', return_value=layer_text)
+        load_image = self.patch(ai_client, 'load_image_for_ai')
+        post = self.patch(ai_providers, 'post_chat_completion', return_value=completion)
+        result = ai_client.analyze_with_free_ai(pdf_path, '人民日报', '20260219')
+
+        self.assertIn('春耕', result)
+        load_image.assert_not_called()
+        body = json.loads(post.call_args[0][0].to_bytes())
+        self.assertEqual(body['model'], ai_client.AI_TEXT_MODEL)
+        self.assertIn('全国春耕生产全面展开', body['messages'][1]['content'])
+
+
+class TestAIScheduler(unittest.TestCase):
+    """测试AI请求调度（令牌桶限额、Retry-After、自适应并发）"""
+
+    class _RateLimitError(Exception):
+        """模拟SDK的限流异常"""
+
+        def __init__(self, retry_after=None):
+            super().__init__("429 Too Many Requests")
+            self.status_code = 429
+            headers = {'retry-after': retry_after} if retry_after is not None else {}
+            self.response = type('Response', (), {'status_code': 429, 'headers': headers})()
+
+    def test_token_bucket_waits_when_exhausted(self):
+        """测试额度用完后按补充速率等待"""
+        import time
+        from ai_scheduler import TokenBucket
+
+        bucket = TokenBucket(per_minute=600, capacity=2)  # 每秒补充10个
+        bucket.acquire(2)
+        started = time.monotonic()
+        bucket.acquire(1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.08)
+
+    def test_parse_retry_after(self):
+        """测试解析秒数形式的Retry-After，没有时返回None"""
+        from ai_scheduler import parse_retry_after
+
+        self.assertEqual(parse_retry_after(self._RateLimitError('3')), 3.0)
+        self.assertIsNone(parse_retry_after(self._RateLimitError()))
+        self.assertIsNone(parse_retry_after(ValueError('bad')))
+
+    def test_throttled_call_honors_retry_after_and_halves_concurrency(self):
+        """测试被限流时按Retry-After暂停后重试，并发数减半"""
+        import time
+        from ai_scheduler import AIScheduler
+
+        scheduler = AIScheduler(rpm=6000, tpm=100000, max_concurrency=4, max_retries=3)
+        responses = [self._RateLimitError('0.2'), 'ok']
+
+        def _call():
+            result = responses.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        started = time.monotonic()
+        self.assertEqual(scheduler.call(_call, estimated_tokens=100), 'ok')
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(scheduler.concurrency.limit, 2)
+
+    def test_non_retryable_error_raises_immediately(self):
+        """测试参数错误等不可重试的异常直接抛出"""
+        from ai_scheduler import AIScheduler
+
+        error = ValueError('400 Bad Request')
+        error.status_code = 400
+        calls = []
+
+        def _call():
+            calls.append(1)
+            raise error
+
+        scheduler = AIScheduler(rpm=6000, tpm=100000, max_concurrency=2, max_retries=3)
+        with self.assertRaises(ValueError):
+            scheduler.call(_call)
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_attempts_refund_tokens(self):
+        """测试失败重试的调用退回预扣的Token额度，额度为0时不限制"""
+        from ai_scheduler import AIScheduler, TokenBucket
+
+        responses = [self._RateLimitError('0'), self._RateLimitError('0'), 'ok']
+
+        def _call():
+            result = responses.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        scheduler = AIScheduler(rpm=6000, tpm=60000, max_concurrency=2, max_retries=3)
+        self.assertEqual(scheduler.call(_call, estimated_tokens=20000), 'ok')
+        # 只有成功的一次调用占用额度（补充速率很慢，误差在几十个以内）
+        self.assertGreater(scheduler.tokens.tokens, 60000 - 20000 - 100)
+
+        unlimited = TokenBucket(per_minute=0)
+        self.assertLess(unlimited.acquire(10 ** 9), 0.01)
+
+
+class TestProviderRouter(unittest.TestCase):
+    """测试多AI服务的对冲请求和故障切换"""
+
+    def test_slow_primary_is_hedged(self):
+        """测试主服务超过等待时间未返回时，取对冲服务先返回的结果"""
+        from ai_providers import MockProvider, ProviderRouter
+
+        slow = MockProvider(content='慢', delay=1.0)
+        fast = MockProvider(content='快')
+        router = ProviderRouter([slow, fast], default_delay=0.05)
+
+        completion, provider = router.complete('提示词', b'jpeg')
+        self.assertIs(provider, fast)
+        self.assertEqual(completion['choices'][0]['message']['content'], '快')
+        self.assertEqual(slow.calls, 1)
+
+    def test_failed_primary_fails_over(self):
+        """测试主服务出错时切换到下一个服务，纯文本服务不参与图片请求"""
+        from ai_providers import MockProvider, ErnieProvider, ProviderRouter
+
+        broken = MockProvider(error=RuntimeError('服务不可用'))
+        backup = MockProvider(content='备用')
+        router = ProviderRouter([broken, ErnieProvider(), backup], default_delay=5)
+
+        completion, provider = router.complete('提示词', b'jpeg')
+        self.assertIs(provider, backup)
+        self.assertEqual(broken.calls, 1)
+        self.assertFalse(router.streams(with_image=True))
+
+    def test_latency_percentile(self):
+        """测试耗时分位数的计算"""
+        from ai_providers import LatencyTracker
+
+        tracker = LatencyTracker(window=100)
+        self.assertIsNone(tracker.percentile(95))
+        for seconds in range(1, 101):
+            tracker.record(seconds)
+        self.assertEqual(tracker.percentile(95), 95)
+        self.assertEqual(tracker.percentile(50), 50)
+
+
+class TestPageDedup(AITestCase):
+    """测试近似重复版面的识别和解析结果复用"""
+
+    @staticmethod
+    def _page(seed=1, size=(600, 800), quality=90):
+        """生成一张随机排版的版面（相同seed排版相同），按指定尺寸和质量编码为JPEG"""
+        import io
+        import random
+        from PIL import Image, ImageDraw
+
+        rnd = random.Random(seed)
+        img = Image.new('RGB', (600, 800), 'white')
+        draw = ImageDraw.Draw(img)
+        for _ in range(60):
+            x, y = rnd.randrange(560), rnd.randrange(760)
+            gray = rnd.randrange(200)
+            draw.rectangle([x, y, x + rnd.randrange(20, 200), y + rnd.randrange(10, 80)], fill=(gray, gray, gray))
+        buffer = io.BytesIO()
+        img.resize(size).save(buffer, format='JPEG', quality=quality)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _dense_page(seed=1):
+        """生成一张密集排版的版面：相同的报头和4栏，只有每行文字的长度随seed变化"""
+        import io
+        import random
+        from PIL import Image, ImageDraw
+
+        rnd = random.Random(seed)
+        img = Image.new('RGB', (600, 800), 'white')
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([20, 20, 580, 90], fill=(30, 30, 30))
+        for col in range(4):
+            left = 20 + col * 142
+            for line in range(60):
+                top = 110 + line * 11
+                draw.rectangle([left, top, left + rnd.randrange(60, 132), top + 6], fill=(60, 60, 60))
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=90)
+        return buffer.getvalue()
+
+    def test_reencoded_page_matches_index(self):
+        """测试缩放、重新压缩后的同一版面被识别为重复，不同版面不会误判"""
+        import os
+        import tempfile
+        from page_hash import PageHashIndex, page_hash
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'pages.jsonl')
+            index = PageHashIndex(path, max_distance=5)
+            index.add('scope', page_hash(self._page()), 'key-1')
+
+            match = index.find('scope', page_hash(self._page(size=(450, 600), quality=60)))
+            self.assertEqual(match[0], 'key-1')
+            self.assertIsNone(index.find('other-scope', page_hash(self._page())))
+            self.assertIsNone(index.find('scope', page_hash(self._page(seed=2))))
+            # 重新加载索引文件
+            self.assertEqual(PageHashIndex(path).find('scope', page_hash(self._page()))[0], 'key-1')
+
+    def test_same_layout_pages_do_not_match(self):
+        """测试版式相同、文字不同的密集版面即使64位哈希相近，细哈希也不会误判为重复"""
+        import os
+        import tempfile
+        from page_hash import PageHashIndex, page_hash, hamming_distance
+
+        first, second = page_hash(self._dense_page(seed=1)), page_hash(self._dense_page(seed=16))
+        self.assertLessEqual(hamming_distance(first[0], second[0]), 5)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = PageHashIndex(os.path.join(tmp_dir, 'pages.jsonl'), max_distance=5)
+            index.add('scope', first, 'key-1')
+            self.assertIsNone(index.find('scope', second))
+            self.assertEqual(index.find('scope', page_hash(self._dense_page(seed=1)))[0], 'key-1')
+
+    def test_duplicate_page_reuses_analysis(self):
+        """测试近似重复的版面直接复用已有的解析结果"""
+        import ai_client
+        import ai_providers
+
+        completion = {'choices': [{'message': {'content': '【头条新闻1】重复版面'}}]}
+        post = self.patch(ai_providers, 'post_chat_completion', return_value=completion)
+        tags = {'newspaper': '纽约时报', 'date': '20260219', 'kind': 'image'}
+        first = ai_client.request_analysis('提示词', self._page(), echo=False, tags=tags)
+        second = ai_client.request_analysis('提示词', self._page(quality=50), echo=False, tags=tags)
+        # 连续几天重复刊登的版面也复用
+        next_day = ai_client.request_analysis('提示词', self._page(quality=40), echo=False,
+                                              tags={**tags, 'date': '20260220'})
+        # 提示词不同、报纸不同时不复用
+        ai_client.request_analysis('另一个提示词', self._page(quality=50), echo=False, tags=tags)
+        ai_client.request_analysis('提示词', self._page(quality=30), echo=False, tags={**tags, 'newspaper': '人民日报'})
+
+        self.assertEqual(second, first)
+        self.assertEqual(next_day, first)
+        self.assertEqual(post.call_count, 3)
+
+    def test_text_layer_pages_use_thumbnail(self):
+        """测试文字层略有差异的同一版面按缩略图复用结果，版式相同、内容不同的版面仍重新解析"""
+        import os
+        import ai_client
+        import ai_providers
+
+        completion = {'choices': [{'message': {'content': '【头条新闻1】文字层版面'}}]}
+        post = self.patch(ai_providers, 'post_chat_completion', return_value=completion)
+        thumbnails = {'a.pdf': self._dense_page(seed=1), 'b.pdf': self._dense_page(seed=1),
+                      'c.pdf': self._dense_page(seed=16)}
+        self.patch(ai_client, 'load_pdf_text', side_effect=lambda path: f'{os.path.basename(path)} 的文字层')
+        self.patch(ai_client, 'load_page_thumbnail', side_effect=lambda path: thumbnails[os.path.basename(path)])
+        for name in thumbnails:
+            path = os.path.join(self.tmp_dir, name)
+            open(path, 'wb').close()
+            ai_client.analyze_with_free_ai(path, '人民日报', '20260219')
+
+        self.assertEqual(post.call_count, 2)
+
+
+class TestAIMetrics(AITestCase):
+    """测试AI调用统计"""
+
+    def test_calls_are_recorded_and_summarized(self):
+        """测试每次调用记录用量和耗时，并按报纸/日期汇总"""
+        from ai_metrics import summarize, format_report
+        import ai_client
+        import ai_providers
+
+        completion = {'choices': [{'message': {'content': '【头条新闻1】测试'}, 'finish_reason': 'length'}],
+                      'usage': {'prompt_tokens': 1200, 'completion_tokens': 300, 'total_tokens': 1500}}
+        store = self.metrics
+        self.patch(ai_providers, 'post_chat_completion', return_value=completion)
+        tags = {'newspaper': '测试报', 'date': '20260219', 'kind': 'image'}
+        ai_client.request_analysis('提示词', b'jpeg' * 256, echo=False, tags=tags)
+        ai_client.request_analysis('提示词', b'jpeg' * 256, echo=False, tags=tags)
+
+        entries = list(store.read())
+        self.assertEqual([entry['status'] for entry in entries], ['ok', 'cache'])
+        self.assertEqual([(entry['provider'], entry['model']) for entry in entries],
+                         [('qwen', ai_client.AI_MODEL)] * 2)
+        self.assertEqual(entries[0]['image_bytes'], 1024)
+
+        rows = summarize(store.read(newspaper='测试报'))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['calls'], rows[0]['cached'], rows[0]['truncated']), (1, 1, 1))
+        self.assertEqual(rows[0]['prompt_tokens'], 1200)
+        self.assertIn('测试报', format_report(rows))
+        self.assertEqual(list(store.read(since='20260220')), [])
+
+    def test_records_model_of_answering_provider(self):
+        """测试记录实际给出结果的服务的模型，而不是通义千问的模型"""
+        import ai_client
+        import ai_providers
+
+        self.patch(ai_providers, 'AI_PROVIDERS', 'mock')
+        ai_client.request_analysis('提示词', b'jpeg' * 256, echo=False)
+        ai_client.request_analysis('提示词', None, echo=False)
+
+        self.assertEqual([(entry['provider'], entry['model']) for entry in self.metrics.read()],
+                         [('mock', 'mock')] * 2)
+
+
+class TestDatabasePool(unittest.TestCase):
+    """测试数据库连接池和一次性初始化"""
+
+    def setUp(self):
+        import database
+        if not database.POSTGRES_AVAILABLE:
+            self.skipTest("未安装psycopg2")
+
+    def _patched(self, pool_side_effect=None):
+        from unittest import mock
+        from search_index import SearchIndex
+        import database
+        import db_schema
+
+        pool = mock.MagicMock()
+        pool.getconn.return_value.closed = 0
+        factory = mock.MagicMock(return_value=pool, side_effect=pool_side_effect)
+        return pool, factory, [mock.patch.object(database, '_pools', {}),
+                               mock.patch.object(database, '_bootstrapped', set()),
+                               mock.patch.object(database, 'BlockingConnectionPool', factory),
+                               mock.patch.object(database, 'search_index', SearchIndex(directory=None)),
+                               mock.patch.object(db_schema, '_known_partitions', {})]
+
+    def test_pool_and_bootstrap_are_shared(self):
+        """测试多个实例共享一个连接池，数据库迁移只执行一次，写入时借用并归还连接"""
+        import contextlib
+        from unittest import mock
+        import database
+        import db_schema
+
+        pool, factory, patches = self._patched()
+        with contextlib.ExitStack() as stack:
+            for patch in patches:
+                stack.enter_context(patch)
+            connect = stack.enter_context(mock.patch.object(database.psycopg2, 'connect'))
+            first, second = database.DatabaseManager(), database.DatabaseManager()
+            self.assertTrue(first.connect())
+            self.assertTrue(second.connect())
+            second.insert_summary('人民日报', '2026-02-19', '标题', '摘要')
+
+        self.assertEqual(factory.call_count, 1)
+        connect.assert_not_called()  # 数据库已存在时不连接默认数据库
+        migration_cursor = pool.getconn.return_value.cursor.return_value
+        recorded = [call for call in migration_cursor.execute.call_args_list
+                    if 'INSERT INTO schema_migrations' in call[0][0]]
+        self.assertEqual([call[0][1][0] for call in recorded], [m[0] for m in db_schema.MIGRATIONS])
+        self.assertEqual(pool.getconn.call_count, pool.putconn.call_count)
+
+    def test_missing_database_is_created_with_parameters(self):
+        """测试目标数据库不存在时才连接默认数据库创建，查询使用参数"""
+        import contextlib
+        from unittest import mock
+        import database
+
+        pool = mock.MagicMock()
+        pool.getconn.return_value.closed = 0
+        _, _, patches = self._patched(
+            pool_side_effect=[database.OperationalError('database "newspaper_db" does not exist'), pool])
+        with contextlib.ExitStack() as stack:
+            for patch in patches:
+                stack.enter_context(patch)
+            connect = stack.enter_context(mock.patch.object(database.psycopg2, 'connect'))
+            cursor = connect.return_value.cursor.return_value.__enter__.return_value
+            cursor.fetchone.return_value = None
+            manager = database.DatabaseManager()
+            self.assertTrue(manager.connect())
+
+        query, params = cursor.execute.call_args_list[0][0]
+        self.assertIn('%s', query)
+        self.assertEqual(params, (manager.backend.database,))
+        self.assertEqual(cursor.execute.call_count, 2)
+        connect.return_value.close.assert_called_once()
+
+    def _connected_manager(self, stack):
+        import database
+
+        pool, _, patches = self._patched()
+        for patch in patches:
+            stack.enter_context(patch)
+        manager = database.DatabaseManager()
+        self.assertTrue(manager.connect())
+        cursor = pool.getconn.return_value.cursor.return_value.__enter__.return_value
+        cursor.reset_mock()
+        return manager, cursor
+
+    def test_bulk_insert_counts_inserted_and_skipped(self):
+        """测试多行VALUES批量插入统计插入和跳过的条数"""
+        import contextlib
+        from unittest import mock
+        import database
+
+        rows = [('人民日报', '2026-02-19', f'标题{i}', '摘要') for i in range(5)]
+        with contextlib.ExitStack() as stack:
+            manager, cursor = self._connected_manager(stack)
+            cursor.fetchall.return_value = [('人民日报', 1)]
+            cursor.fetchone.return_value = (None,)
+            execute_values = stack.enter_context(
+                mock.patch.object(database, 'execute_values', return_value=[(1,)] * 3))
+            self.assertEqual(manager.bulk_insert_summaries(rows, page_size=2), (3, 2))
+
+        self.assertIn('RETURNING', execute_values.call_args[0][1])
+        self.assertEqual(execute_values.call_args[0][2][0], (1, '2026-02-19', '标题0', '摘要'))
+        # 写入前先在咨询锁内创建涉及的月分区
+        self.assertIn('pg_advisory_xact_lock', cursor.execute.call_args_list[0][0][0])
+        self.assertIn('articles_y2026m02', cursor.execute.call_args_list[2][0][0])
+        self.assertEqual(execute_values.call_args[1], {'page_size': 2, 'fetch': True})
+
+    def test_partition_created_in_separate_transaction(self):
+        """测试月分区在写入之前单独提交（写入失败回滚不影响分区），已存在的分区不重复创建"""
+        import contextlib
+        from unittest import mock
+        import database
+
+        rows = [('人民日报', '2026-02-19', '标题', '摘要'), ('人民日报', '2026-03-01', '标题', '摘要')]
+        with contextlib.ExitStack() as stack:
+            manager, cursor = self._connected_manager(stack)
+            conn = manager.backend.pool.getconn.return_value
+            conn.reset_mock()
+            cursor.fetchall.return_value = [('人民日报', 1)]
+            # 2月分区已由其他进程创建，3月分区不存在
+            cursor.fetchone.side_effect = [('articles_y2026m02',), (None,)]
+            stack.enter_context(mock.patch.object(database, 'execute_values',
+                                                  side_effect=[database.OperationalError('连接中断'), [(1,)]]))
+            with self.assertRaises(database.OperationalError):
+                manager.bulk_insert_summaries(rows)
+            # 分区事务已提交，写入事务回滚
+            self.assertEqual((conn.commit.call_count, conn.rollback.call_count), (1, 1))
+            self.assertEqual(manager.bulk_insert_summaries(rows), (1, 1))
+
+        created = [call for call in cursor.execute.call_args_list if 'PARTITION OF' in call[0][0]]
+        self.assertEqual(len(created), 1)
+        self.assertIn('articles_y2026m03', created[0][0][0])
+
+    def test_bulk_insert_uses_copy_for_large_batches(self):
+        """测试条数较多时分页COPY到临时表再合并"""
+        import csv
+        import io
+        import contextlib
+
+        rows = [('纽约时报', '2026-02-19', f'Title, "{i}"', '摘要\n第二行') for i in range(5)]
+        copied = []
+        with contextlib.ExitStack() as stack:
+            manager, cursor = self._connected_manager(stack)
+            cursor.copy_expert.side_effect = lambda query, buffer: copied.extend(csv.reader(io.StringIO(buffer.read())))
+            cursor.rowcount = 4
+            self.assertEqual(manager.bulk_insert_summaries(rows, page_size=2, copy_threshold=5), (4, 1))
+
+        self.assertEqual(cursor.copy_expert.call_count, 3)
+        self.assertEqual([tuple(row) for row in copied], rows)
+        self.assertIn('ON CONFLICT', cursor.execute.call_args_list[-1][0][0])
+
+
+class TestSearchIndex(unittest.TestCase):
+    """测试标题和摘要的二元组搜索索引"""
+
+    ROWS = [
+        ('人民日报', '2026-02-19', '全国春运客流创新高', '铁路部门加开夜间列车，旅客发送量同比增长。'),
+        ('人民日报', '2026-02-20', '央行发布货币政策报告', '报告提到春运期间消费回暖。'),
+        ('纽约时报', '2026-02-20', 'Fed Holds Rates Steady', '美联储维持利率不变。'),
+        ('人民日报', '2026-03-01', '春天的故事', '运动会开幕。'),
+    ]
+
+    def test_search_keywords_filters_and_ranking(self):
+        """测试多关键词检索、报纸和日期过滤、标题命中优先"""
+        from search_index import SearchIndex
+
+        index = SearchIndex(directory=None)
+        self.assertEqual(index.add_many(self.ROWS), 4)
+        self.assertEqual(index.add_many(self.ROWS[:1]), 0)  # 已索引的跳过
+
+        titles = [item['title'] for item in index.search('春运')]
+        self.assertEqual(titles, ['全国春运客流创新高', '央行发布货币政策报告'])
+        # 「春」「运」都出现但不连续的文档不算命中
+        self.assertNotIn('春天的故事', titles)
+        self.assertEqual([item['title'] for item in index.search('春运 列车')], ['全国春运客流创新高'])
+        self.assertEqual(index.search('fed rates')[0]['newspaper'], '纽约时报')
+        self.assertEqual(index.search('春运', date_range=('2026-02-20', None))[0]['date'], '2026-02-20')
+        self.assertEqual(index.search('利率', newspaper='人民日报'), [])
+        self.assertEqual(index.search('不存在的词'), [])
+
+    def test_index_persists_snapshot_and_tail(self):
+        """测试快照和快照之后追加的文档都能重新加载"""
+        import tempfile
+        from search_index import SearchIndex
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = SearchIndex(tmp_dir)
+            index.add_many(self.ROWS[:2])
+            index.save()
+            index.add_many(self.ROWS[2:])
+
+            reloaded = SearchIndex(tmp_dir)
+            self.assertEqual(len(reloaded), 4)
+            self.assertEqual(len(reloaded.search('春运')), 2)
+            self.assertEqual(len(reloaded.search('美联储')), 1)
+
+    def test_instances_sharing_directory_do_not_duplicate(self):
+        """测试多个实例（模拟多个进程）共用同一目录时，文档不重复写入，彼此能搜到对方新增的文档"""
+        import os
+        import tempfile
+        import threading
+        from search_index import SearchIndex
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            first, second = SearchIndex(tmp_dir), SearchIndex(tmp_dir)
+            self.assertEqual(first.add_many(self.ROWS[:2]), 2)
+            self.assertEqual(second.add_many(self.ROWS[1:3]), 1)
+            self.assertEqual(len(first.search('美联储')), 1)
+
+            rows = [('人民日报', '2026-04-01', f'并发标题{i}', '摘要') for i in range(200)]
+            indexes = [SearchIndex(tmp_dir) for _ in range(4)]
+            threads = [threading.Thread(target=index.add_many, args=(rows,)) for index in indexes]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            with open(os.path.join(tmp_dir, 'docs.jsonl'), encoding='utf-8') as f:
+                self.assertEqual(sum(1 for _ in f), 203)
+            indexes[0].save()
+            self.assertEqual(len(SearchIndex(tmp_dir)), 203)
+            self.assertEqual(len(SearchIndex(tmp_dir).search('并发标题', limit=None)), 200)
+
+    def test_inconsistent_snapshot_is_rebuilt(self):
+        """测试快照与 docs.jsonl 不一致（文档数或内容不同）时从 docs.jsonl 重建，不返回错位的结果"""
+        import os
+        import tempfile
+        from search_index import SearchIndex
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = SearchIndex(tmp_dir)
+            index.add_many(self.ROWS)
+            index.save()
+            docs_path = os.path.join(tmp_dir, 'docs.jsonl')
+            with open(docs_path, encoding='utf-8') as f:
+                lines = f.readlines()
+            # 同样的行数，但前面多了一条重复文档、少了最后一篇
+            with open(docs_path, 'w', encoding='utf-8') as f:
+                f.writelines([lines[1]] + lines[:3])
+
+            reloaded = SearchIndex(tmp_dir)
+            self.assertEqual(len(reloaded), 3)
+            self.assertEqual([item['title'] for item in reloaded.search('春运')],
+                             ['全国春运客流创新高', '央行发布货币政策报告'])
+            self.assertEqual(reloaded.search('运动会'), [])
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    """测试本地SQLite存储后端"""
+
+    def test_bulk_insert_skips_duplicates_and_feeds_search(self):
+        """测试批量写入跳过重复记录，写入的摘要可以搜索"""
+        import os
+        import sqlite3
+        import tempfile
+        from unittest import mock
+        from search_index import SearchIndex
+        import database
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(database, '_pools', {}), \
+                mock.patch.object(database, '_bootstrapped', set()), \
+                mock.patch.object(database, 'search_index', SearchIndex(directory=None)):
+            path = os.path.join(tmp_dir, 'newspaper.db')
+            manager = database.DatabaseManager(database.SQLiteBackend(path))
+            self.assertTrue(manager.connect())
+
+            rows = [('人民日报', '20260219', f'标题{i}', '摘要') for i in range(5)]
+            self.assertEqual(manager.bulk_insert_summaries(rows, page_size=2), (5, 0))
+            self.assertEqual(manager.bulk_insert_summaries(rows[3:] + [('人民日报', '2026-02-20', '新标题', '摘要')]),
+                             (1, 2))
+            self.assertFalse(manager.insert_summary('人民日报', datetime.date(2026, 2, 19), '标题0', '摘要'))
+            self.assertEqual(len(manager.search_summaries('新标题')), 1)
+
+            # 另一个实例复用同一个连接，不重复初始化
+            other = database.DatabaseManager(database.SQLiteBackend(path))
+            self.assertTrue(other.connect())
+            self.assertIs(other.backend.conn, manager.backend.conn)
+            self.assertEqual(sum(len(rows) for rows in other.backend.iter_summaries(4)), 6)
+
+            conn = sqlite3.connect(path)
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+            self.assertEqual(conn.execute("SELECT COUNT(DISTINCT date) FROM newspaper_summary").fetchone()[0], 2)
+            conn.close()
+            database.close_pools()
+
+    def test_failed_commit_rolls_back(self):
+        """测试提交失败（如 database is locked）时回滚，连接不会停留在未结束的事务中"""
+        import os
+        import sqlite3
+        import tempfile
+        from unittest import mock
+        import database
+
+        class LockedOnCommit:
+            def __init__(self, conn):
+                self.conn = conn
+
+            def __getattr__(self, name):
+                return getattr(self.conn, name)
+
+            def execute(self, sql, *args):
+                if sql == "COMMIT":
+                    raise sqlite3.OperationalError("database is locked")
+                return self.conn.execute(sql, *args)
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(database, '_pools', {}), \
+                mock.patch.object(database, '_bootstrapped', set()):
+            backend = database.SQLiteBackend(os.path.join(tmp_dir, 'newspaper.db'))
+            self.assertTrue(backend.connect())
+            real_conn = backend.conn
+            backend.conn = LockedOnCommit(real_conn)
+            with self.assertRaises(sqlite3.OperationalError):
+                backend.bulk_insert([('人民日报', '20260219', '标题', '摘要')], page_size=10, copy_threshold=0)
+            self.assertFalse(real_conn.in_transaction)
+
+            backend.conn = real_conn
+            self.assertEqual(backend.bulk_insert([('人民日报', '20260219', '标题', '摘要')], 10, 0), 1)
+            self.assertEqual(backend.bulk_insert([('人民日报', '20260219', '标题', '摘要')], 10, 0), 0)
+            database.close_pools()
+
+    def test_unconnected_manager_inserts_nothing(self):
+        """测试未连接的实例批量写入时直接返回，不访问后端"""
+        import os
+        import tempfile
+        import database
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manager = database.DatabaseManager(database.SQLiteBackend(os.path.join(tmp_dir, 'newspaper.db')))
+            self.assertEqual(manager.bulk_insert_summaries([('人民日报', '20260219', '标题', '摘要')]), (0, 0))
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, 'newspaper.db')))
+
+    def test_migrates_flat_table_to_normalized_schema(self):
+        """测试旧的扁平表数据迁入 articles，newspaper_summary 改为兼容视图，迁移只执行一次"""
+        import os
+        import sqlite3
+        import tempfile
+        from unittest import mock
+        import database
+        import db_schema
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(database, '_pools', {}), \
+                mock.patch.object(database, '_bootstrapped', set()):
+            path = os.path.join(tmp_dir, 'newspaper.db')
+            conn = sqlite3.connect(path)
+            db_schema._v1_summary_table(conn.cursor(), 'sqlite')
+            conn.executemany("INSERT INTO newspaper_summary (newspaper, date, title, summary) VALUES (?, ?, ?, ?)",
+                             [('人民日报', '2026-01-31', '旧标题', '摘要'), ('纽约时报', '2026-02-01', 'Old', 'Summary')])
+            conn.commit()
+            conn.close()
+
+            backend = database.SQLiteBackend(path)
+            self.assertTrue(backend.connect())
+            self.assertEqual(backend.bulk_insert([('人民日报', '20260131', '旧标题', '摘要'),
+                                                  ('人民日报', '20260201', '新标题', '摘要')], 10, 0), 1)
+            self.assertEqual(db_schema.migrate(backend.conn, 'sqlite'), [])
+
+            conn = sqlite3.connect(path)
+            kinds = dict(conn.execute("SELECT name, type FROM sqlite_master WHERE name LIKE 'newspaper_summary%'"))
+            self.assertEqual(kinds, {'newspaper_summary': 'view', 'newspaper_summary_v1': 'table'})
+            self.assertEqual(conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()[0],
+                             db_schema.LATEST_VERSION)
+            self.assertEqual(conn.execute("SELECT newspaper, title FROM newspaper_summary ORDER BY id").fetchall(),
+                             [('人民日报', '旧标题'), ('纽约时报', 'Old'), ('人民日报', '新标题')])
+            plan = ' '.join(row[-1] for row in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM newspaper_summary WHERE newspaper = '人民日报' "
+                "AND date BETWEEN '2026-01-01' AND '2026-01-31'"))
+            self.assertIn('INDEX', plan)
+            conn.close()
+            database.close_pools()
+
+    def test_fresh_install_has_no_legacy_table(self):
+        """测试新安装时不保留迁移1建立的空扁平表，也不建立不写入数据的表"""
+        import os
+        import sqlite3
+        import tempfile
+        from unittest import mock
+        import database
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(database, '_pools', {}), \
+                mock.patch.object(database, '_bootstrapped', set()):
+            path = os.path.join(tmp_dir, 'newspaper.db')
+            self.assertTrue(database.SQLiteBackend(path).connect())
+            conn = sqlite3.connect(path)
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            views = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'view'")}
+            conn.close()
+            database.close_pools()
+
+        self.assertEqual(views, {'newspaper_summary'})
+        self.assertEqual(tables - {'sqlite_sequence'}, {'schema_migrations', 'newspapers', 'articles', 'daily_stats'})
+
+    def test_keyset_pages_export_and_daily_stats(self):
+        """测试键集分页不重不漏、按条件导出CSV、每日统计随写入增量更新且跳过重复记录"""
+        import os
+        import csv
+        import tempfile
+        from unittest import mock
+        import database
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(database, '_pools', {}), \
+                mock.patch.object(database, '_bootstrapped', set()), \
+                mock.patch.object(database, 'SEARCH_INDEX_ENABLED', False):
+            manager = database.DatabaseManager(database.SQLiteBackend(os.path.join(tmp_dir, 'newspaper.db')))
+            self.assertTrue(manager.connect())
+            rows = [(newspaper, date, f'{newspaper}{date}标题{i}', '摘要' * (i + 1))
+                    for newspaper in ('人民日报', '纽约时报')
+                    for date in ('20260131', '20260201', '20260202') for i in range(3)]
+            manager.bulk_insert_summaries(rows[:10])
+            self.assertEqual(manager.bulk_insert_summaries(rows), (8, 10))  # 已存在的不重复统计
+
+            seen, cursor = [], None
+            while True:
+                items, cursor = manager.list_summaries(newspaper='人民日报', cursor=cursor, limit=4)
+                seen.extend(items)
+                if cursor is None:
+                    break
+            self.assertEqual(len(seen), 9)
+            self.assertEqual(len({item['id'] for item in seen}), 9)
+            self.assertEqual([item['date'] for item in seen[:3]], ['2026-02-02'] * 3)
+            self.assertEqual(seen, sorted(seen, key=lambda item: (item['date'], item['id']), reverse=True))
+
+            items, _ = manager.list_summaries(date_range=('20260201', '2026-02-01'), limit=50)
+            self.assertEqual({item['newspaper'] for item in items}, {'人民日报', '纽约时报'})
+            self.assertEqual(len(items), 6)
+
+            path = os.path.join(tmp_dir, 'export.csv')
+            self.assertEqual(manager.export_summaries(path, newspaper='纽约时报', page_size=2), 9)
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                exported = list(csv.reader(f))
+            self.assertEqual(exported[0], ['newspaper', 'date', 'title', 'summary'])
+            self.assertEqual(exported[1][1], '2026-01-31')
+
+            stats = manager.daily_stats(newspaper='人民日报')
+            self.assertEqual([(row['date'], row['articles'], row['summary_chars']) for row in stats],
+                             [('2026-01-31', 3, 12), ('2026-02-01', 3, 12), ('2026-02-02', 3, 12)])
+            self.assertEqual([(row['month'], row['articles']) for row in manager.monthly_stats('纽约时报')],
+                             [('2026-01', 3), ('2026-02', 6)])
+            database.close_pools()
+
+
+class TestSummaryWriter(unittest.TestCase):
+    """测试摘要的异步批量写入和缓冲文件补写"""
+
+    class FakeManager:
+        def __init__(self):
+            self.connected = False
+            self.up = True
+            self.batches = []
+            self.rows = set()
+
+        def connect(self):
+            self.connected = self.up
+            return self.connected
+
+        def bulk_insert_summaries(self, rows):
+            if not self.up:
+                raise ConnectionError("数据库不可用")
+            new = set(rows) - self.rows
+            self.rows |= new
+            self.batches.append(len(rows))
+            return len(new), len(rows) - len(new)
+
+        def close(self):
+            self.connected = False
+
+    def test_rows_are_coalesced_into_batches(self):
+        """测试记录按批次条数合并写入，flush 等待写完"""
+        import os
+        import tempfile
+        from write_behind import SummaryWriter
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manager = self.FakeManager()
+            writer = SummaryWriter(manager, batch_size=3, flush_interval=60,
+                                   spool_path=os.path.join(tmp_dir, 'spool.jsonl'))
+            writer.put_many(('人民日报', '20260219', f'标题{i}', '摘要') for i in range(7))
+            writer.flush()
+            self.assertEqual(manager.batches, [3, 3, 1])
+            stats = writer.stats()
+            self.assertEqual((stats['written'], stats['depth'], stats['pending'], stats['lag']), (7, 0, 0, 0.0))
+            writer.close()
+
+    def test_spools_when_database_is_down_and_replays(self):
+        """测试数据库不可用时记录写入缓冲文件，恢复后按顺序补写且不重复"""
+        import os
+        import tempfile
+        from write_behind import SummaryWriter
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            spool_path = os.path.join(tmp_dir, 'spool.jsonl')
+            manager = self.FakeManager()
+            manager.up = False
+            writer = SummaryWriter(manager, batch_size=10, flush_interval=60, spool_path=spool_path,
+                                   retry_interval=0)
+            rows = [('纽约时报', '20260219', f'Title {i}', 'Summary') for i in range(4)]
+            writer.put_many(rows)
+            writer.flush()
+            stats = writer.stats()
+            self.assertEqual((stats['spooled'], stats['db_up'], stats['written']), (4, False, 0))
+            self.assertTrue(os.path.exists(spool_path))
+
+            manager.up = True
+            writer.put(rows[0])
+            writer.flush()
+            self.assertEqual(manager.rows, set(rows))
+            self.assertEqual(manager.batches, [4, 1])
+            stats = writer.stats()
+            self.assertEqual((stats['spooled'], stats['db_up'], stats['written'], stats['skipped']),
+                             (0, True, 4, 1))
+            self.assertFalse(os.path.exists(spool_path))
+            writer.close()
+
+    def test_spool_failure_does_not_stop_writer(self):
+        """测试缓冲文件也无法写入时记录失败，flush 照常返回，后台线程继续写入之后的记录"""
+        import os
+        import tempfile
+        from write_behind import SummaryWriter
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            blocker = os.path.join(tmp_dir, 'blocker')
+            open(blocker, 'w').close()
+            manager = self.FakeManager()
+            manager.up = False
+            # 缓冲文件的上级"目录"是普通文件，追加缓冲文件时抛出 OSError
+            writer = SummaryWriter(manager, batch_size=10, flush_interval=60,
+                                   spool_path=os.path.join(blocker, 'spool.jsonl'), retry_interval=0)
+            writer.put_many(('人民日报', '20260219', f'标题{i}', '摘要') for i in range(2))
+            writer.flush()
+            stats = writer.stats()
+            self.assertEqual((stats['lost'], stats['spooled'], stats['pending']), (2, 0, 0))
+            self.assertEqual(stats['failures'], 2)  # 数据库写入失败一次，缓冲文件写入失败一次
+
+            manager.up = True
+            writer.put(('人民日报', '20260219', '标题9', '摘要'))
+            writer.flush()
+            self.assertEqual(manager.batches, [1])
+            self.assertTrue(writer._thread.is_alive())
+            writer.close()
+
+    def test_bad_records_do_not_block_writer(self):
+        """测试格式不对的记录在 put 时拒绝；数据写不进去的记录逐条转入死信文件，不暂存、不标记数据库不可用"""
+        import os
+        import json
+        import tempfile
+        from unittest import mock
+        from search_index import SearchIndex
+        import database
+        from write_behind import SummaryWriter
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(database, '_pools', {}), \
+                mock.patch.object(database, '_bootstrapped', set()), \
+                mock.patch.object(database, 'search_index', SearchIndex(directory=None)):
+            manager = database.DatabaseManager(database.SQLiteBackend(os.path.join(tmp_dir, 'newspaper.db')))
+            dead_letter_path = os.path.join(tmp_dir, 'dead.jsonl')
+            writer = SummaryWriter(manager, batch_size=10, flush_interval=60,
+                                   spool_path=os.path.join(tmp_dir, 'spool.jsonl'), dead_letter_path=dead_letter_path)
+            with self.assertRaises(ValueError):
+                writer.put(('人民日报', '20260219', '标题'))
+            with self.assertRaises(ValueError):
+                writer.put(('人民日报', '2026-13-45', '标题', '摘要'))
+
+            # 摘要的类型SQLite无法写入：整批失败后逐条写入，只有这一条进入死信文件
+            writer.put_many([('人民日报', '20260219', '标题1', '摘要'), ('人民日报', '20260219', '标题2', {'摘要': 1}),
+                             ('人民日报', '20260219', '标题3', '摘要')])
+            writer.flush()
+            stats = writer.stats()
+            self.assertEqual((stats['written'], stats['dead'], stats['spooled'], stats['db_up']), (2, 1, 0, True))
+            with open(dead_letter_path, encoding='utf-8') as f:
+                self.assertEqual([json.loads(line)['record'][2] for line in f], ['标题2'])
+
+            writer.put(('人民日报', '20260220', '标题4', '摘要'))
+            writer.flush()
+            self.assertEqual(writer.stats()['written'], 3)
+            writer.close()
+            database.close_pools()
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网络传输模块 - 进程内共享的HTTP连接池
+
+下载模块和AI客户端都从这里获取连接，避免每次调用都重新建立TCP+TLS连接：
+- 代理配置只解析一次
+- 下载使用aiohttp连接池（连接复用、keep-alive、DNS缓存）；同步调用统一运行在
+  一个常驻的后台事件循环上，多次调用之间也能复用已建立的连接
+- AI调用使用同一个带连接池的httpx客户端，与下载使用相同的代理配置
+"""
+
+import os
+import atexit
+import asyncio
+import threading
+import functools
+import aiohttp
+from config import USER_AGENT, HTTP_POOL_SIZE, HTTP_KEEPALIVE_TIMEOUT, DNS_CACHE_TTL
+from logger import logger
+
+_lock = threading.Lock()
+_background_loop = None
+_sessions = {}  # 事件循环 -> (会话, 关闭会话的异步生成器)
+_http_client = None
+
+
+@functools.lru_cache(maxsize=None)
+def get_proxies():
+    """检测代理配置（环境变量优先，其次为Windows系统代理），进程内只检测一次"""
+    proxies = {}
+
+    # 1. 首先检查环境变量
+    http_proxy = os.getenv('HTTP_PROXY', '') or os.getenv('http_proxy', '')
+    https_proxy = os.getenv('HTTPS_PROXY', '') or os.getenv('https_proxy', '')
+
+    if http_proxy:
+        proxies['http'] = http_proxy
+    if https_proxy:
+        proxies['https'] = https_proxy
+
+    # 2. 如果没有配置代理，尝试从系统获取（Windows）
+    if not proxies and os.name == 'nt':
+        try:
+            import winreg
+            # 读取Windows系统代理设置
+            key = winreg.OpenKey(winreg.HKEY_CURRENT_USER,
+                                 r'Software\Microsoft\Windows\CurrentVersion\Internet Settings')
+            proxy_enable, _ = winreg.QueryValueEx(key, 'ProxyEnable')
+            if proxy_enable:
+                proxy_server, _ = winreg.QueryValueEx(key, 'ProxyServer')
+                if proxy_server:
+                    # 如果代理服务器不包含协议，添加http://前缀
+                    if '://' not in proxy_server:
+                        proxy_server = f"http://{proxy_server}"
+                    proxies['http'] = proxy_server
+                    proxies['https'] = proxy_server
+                    print(f"🔧 检测到系统代理: {proxy_server}")
+        except Exception as e:
+            logger.debug(f"读取系统代理设置失败: {e}")
+
+    # 清理空代理
+    return {k: v for k, v in proxies.items() if v}
+
+
+def create_http_session():
+    """创建带连接池的aiohttp会话（需在事件循环中调用）"""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_SIZE,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    headers = {'User-Agent': USER_AGENT, 'Accept': '*/*'}
+    return aiohttp.ClientSession(connector=connector, headers=headers)
+
+
+async def _close_on_shutdown(session):
+    """
+    挂起直到事件循环结束，然后关闭会话
+
+    asyncio.run 关闭事件循环前会调用 shutdown_asyncgens 结束所有挂起的异步生成器，
+    借此在事件循环仍在运行时关闭会话，不会遗留未关闭的连接。
+    """
+    try:
+        yield
+    finally:
+        if not session.closed:
+            await session.close()
+
+
+async def get_shared_session():
+    """获取当前事件循环共享的aiohttp会话（首次调用时创建，事件循环结束时自动关闭）"""
+    loop = asyncio.get_running_loop()
+    session, _ = _sessions.get(loop, (None, None))
+    if session is None or session.closed:
+        # 清理已结束的事件循环的记录（会话已在事件循环结束时关闭）
+        for stale_loop in [l for l in _sessions if l.is_closed()]:
+            stale_session, _ = _sessions.pop(stale_loop)
+            if not stale_session.closed:
+                logger.debug("事件循环未经 shutdown_asyncgens 直接关闭，遗留的HTTP会话无法关闭")
+        session = create_http_session()
+        guard = _close_on_shutdown(session)
+        await guard.asend(None)
+        # 保留生成器的引用，否则被回收时会提前关闭会话
+        _sessions[loop] = (session, guard)
+    return session
+
+
+def _get_background_loop():
+    """获取常驻后台线程中运行的事件循环"""
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="http-transport", daemon=True)
+            thread.start()
+            _background_loop = loop
+        return _background_loop
+
+
+def run_sync(coro):
+    """在后台事件循环中运行协程并等待结果（供同步代码调用异步接口）"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()
+
+
+def proxy_mounts(proxies):
+    """把 get_proxies 的结果转换为httpx的挂载点：{'http://': 代理地址, 'https://': 代理地址}"""
+    return {f"{scheme}://": url for scheme, url in proxies.items() if scheme in ('http', 'https')}
+
+
+def get_http_client():
+    """
+    获取进程内共享的httpx客户端（AI调用使用，带连接池）
+
+    代理与下载相同（get_proxies，包括Windows系统代理）。未安装httpx时抛出ImportError。
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+
+            limits = httpx.Limits(
+                max_connections=HTTP_POOL_SIZE,
+                max_keepalive_connections=HTTP_POOL_SIZE,
+                keepalive_expiry=HTTP_KEEPALIVE_TIMEOUT,
+            )
+            # 挂载点的传输层各自带连接池，需要分别设置连接数限制
+            mounts = {prefix: httpx.HTTPTransport(proxy=url, limits=limits)
+                      for prefix, url in proxy_mounts(get_proxies()).items()}
+            _http_client = httpx.Client(limits=limits, mounts=mounts or None)
+        return _http_client
+
+
+@atexit.register
+def close_all():
+    """程序退出时关闭后台事件循环中的会话和AI客户端"""
+    loop = _background_loop
+    if loop is not None and loop.is_running():
+        session, _ = _sessions.get(loop, (None, None))
+        if session is not None and not session.closed:
+            try:
+                asyncio.run_coroutine_threadsafe(session.close(), loop).result(timeout=5)
+            except Exception as e:
+                logger.debug(f"关闭HTTP会话失败：{e}")
+        loop.call_soon_threadsafe(loop.stop)
+    if _http_client is not None:
+        _http_client.close()
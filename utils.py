@@ -7,6 +7,7 @@
 import os
 import sys
 import datetime
+import contextlib
 from config import NEWSPAPER_CONFIG, IMAGE_FOLDER, COPY_FOLDER
 
 
@@ -33,6 +34,49 @@ def init_folders():
     print()
 
 
+def _lock(f, blocking):
+    if os.name == 'nt':
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+
+
+def _unlock(f):
+    if os.name == 'nt':
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def file_lock(path, blocking=True):
+    """
+    跨进程互斥锁（锁文件 path 首次使用时创建，进程退出时由系统自动释放）
+
+    with file_lock(path) as acquired: ...
+    blocking 为False时锁已被占用（其他进程或同一进程的其他打开者）则不等待，acquired 为False。
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a+b') as f:
+        try:
+            _lock(f, blocking)
+        except OSError:
+            if blocking:
+                raise
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            _unlock(f)
+
+
 def format_date(date_obj):
     """格式化日期为不同格式"""
     return {
@@ -123,6 +167,8 @@ def check_dependencies():
     """检查必要依赖"""
     required = {
         'requests': 'requests',
+        'aiohttp': 'aiohttp',
+        'httpx': 'httpx',
         'PIL': 'pillow',
         'pdf2image': 'pdf2image',
         'dotenv': 'python-dotenv'  # 新增检查dotenv
@@ -150,7 +196,7 @@ def check_dependencies():
         import psycopg2
         print("✅ 数据库依赖检查通过")
     except ImportError:
-        print("ℹ️ 数据库功能可选，如需使用请安装：pip install psycopg2-binary")
+        print("ℹ️ 未安装psycopg2，将使用本地SQLite数据库；如需PostgreSQL请安装：pip install psycopg2-binary")
     print()
     
     return True
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步写入模块 - 摘要先进入内存队列，由后台线程合并成大批量写入数据库
+
+    writer = SummaryWriter()
+    analyze_with_free_ai(file_path, newspaper, date, on_record=writer.put)
+    ...
+    writer.close()   # 写完队列中剩余的记录
+
+- put() 只把记录放入队列就返回，下载和AI解析不再等待数据库提交
+- 后台线程攒够 DB_WRITE_BATCH_SIZE 条或距第一条记录超过 DB_WRITE_FLUSH_SECONDS 秒时批量写入
+- put() 时检查记录是否为 (报纸, 日期, 标题, 摘要) 且日期有效，格式不对的记录直接抛出 ValueError
+- 数据库不可用（连接/操作错误）时，整批追加到本地缓冲文件（DB_WRITE_SPOOL，JSON Lines），
+  每隔 DB_WRITE_RETRY_SECONDS 秒重试连接，恢复后先按顺序补写缓冲文件再写新记录；
+  数据表以 (报纸, 日期, 标题) 唯一，补写中断后重新补写不会产生重复
+- 其他写入错误说明批次中有数据本身写不进去的记录：改为逐条写入，写不进去的记录连同错误信息
+  追加到死信文件（DB_WRITE_DEAD_LETTER），不进入缓冲文件，也不会阻塞之后的写入
+- stats() 返回队列长度、待写入的最早记录已等待的秒数、缓冲文件中的条数等指标
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import datetime
+import threading
+from config import (DB_WRITE_BATCH_SIZE, DB_WRITE_FLUSH_SECONDS, DB_WRITE_QUEUE_MAX, DB_WRITE_SPOOL,
+                    DB_WRITE_RETRY_SECONDS, DB_WRITE_DEAD_LETTER)
+from logger import logger
+
+# 说明数据库暂时不可用的错误：整批转入缓冲文件，稍后重试；其他错误按数据错误逐条处理
+CONNECTION_ERRORS = (ConnectionError, sqlite3.OperationalError)
+try:
+    import psycopg2
+    CONNECTION_ERRORS += (psycopg2.OperationalError, psycopg2.InterfaceError)
+except ImportError:
+    pass
+
+# 队列中的控制标记
+_FLUSH = object()
+_STOP = object()
+
+
+def validate_record(record):
+    """检查并返回 (报纸, 日期, 标题, 摘要) 元组，项数不对、有空值或日期无效时抛出 ValueError"""
+    record = tuple(record)
+    if len(record) != 4:
+        raise ValueError(f"记录应为 (报纸, 日期, 标题, 摘要) 4项，实际为 {len(record)} 项：{record!r}")
+    newspaper, date, title, summary = record
+    if not newspaper or not title or summary is None:
+        raise ValueError(f"记录缺少报纸、标题或摘要：{record!r}")
+    if not isinstance(date, (datetime.date, datetime.datetime)):
+        from database import normalize_date
+        try:
+            datetime.date.fromisoformat(normalize_date(date))
+        except ValueError:
+            raise ValueError(f"记录的日期无效：{date!r}") from None
+    return record
+
+
+class SummaryWriter:
+    """摘要的异步批量写入器（线程安全，后台线程在首次 put 时启动）"""
+
+    def __init__(self, manager=None, batch_size=DB_WRITE_BATCH_SIZE, flush_interval=DB_WRITE_FLUSH_SECONDS,
+                 max_queue=DB_WRITE_QUEUE_MAX, spool_path=DB_WRITE_SPOOL, retry_interval=DB_WRITE_RETRY_SECONDS,
+                 dead_letter_path=DB_WRITE_DEAD_LETTER):
+        """
+        manager 为 DatabaseManager（默认新建一个，在后台线程中连接）；max_queue 为队列上限，
+        队列满时 put 等待（数据库不可用时记录转入缓冲文件，队列仍会被清空）；
+        dead_letter_path 为保存写不进数据库的记录的死信文件
+        """
+        if manager is None:
+            from database import DatabaseManager
+            manager = DatabaseManager()
+        self.manager = manager
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.dead_letter_path = dead_letter_path
+        self.retry_interval = retry_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._batch_since = None        # 当前批次第一条记录入队的时间
+        self._pending = 0               # 当前批次的记录数
+        self._next_retry = 0.0          # 数据库不可用时下次重试的时间
+        self._spooled = self._count_spool()
+        self._spooled_since = time.time() if self._spooled else None
+        self._counters = {'written': 0, 'skipped': 0, 'batches': 0, 'failures': 0, 'lost': 0, 'dead': 0}
+
+    def _start(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("写入器已关闭")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="summary-writer", daemon=True)
+                self._thread.start()
+
+    def put(self, record):
+        """放入一条 (报纸, 日期, 标题, 摘要)，可直接作为 analyze_with_free_ai 的 on_record 回调；格式不对时抛出 ValueError"""
+        record = validate_record(record)
+        self._start()
+        self._queue.put((record, time.monotonic()))
+
+    def put_many(self, records):
+        """放入多条记录"""
+        for record in records:
+            self.put(record)
+
+    def flush(self):
+        """立即写入已放入的全部记录（数据库不可用时转入缓冲文件），写完后返回"""
+        if self._thread is None:
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self):
+        """写完剩余记录并停止后台线程"""
+        with self._lock:
+            thread, self._closed = self._thread, True
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+        self.manager.close()
+
+    def stats(self):
+        """
+        队列指标：
+            depth          队列中等待处理的记录数
+            pending        已取出、等待本批写入的记录数
+            lag            待写入的最早记录已等待的秒数（没有待写入记录时为0）
+            spooled        缓冲文件中等待补写的记录数
+            spool_age      缓冲文件中最早记录已等待的秒数
+            written / skipped / batches / failures  累计写入、已存在跳过、写入批次、写入失败次数
+            lost           缓冲文件也无法写入而丢失的记录数
+            dead           数据本身写不进数据库、转入死信文件的记录数
+            db_up          最近一次写入数据库是否成功
+        """
+        with self._lock:
+            batch_since = self._batch_since
+            stats = dict(self._counters, pending=self._pending, spooled=self._spooled,
+                         spool_age=time.time() - self._spooled_since if self._spooled_since else 0.0,
+                         db_up=self._next_retry == 0.0)
+        oldest = batch_since
+        if oldest is None:
+            try:
+                item = self._queue.queue[0]  # 只读取队首的入队时间
+                oldest = item[1] if isinstance(item, tuple) else None
+            except IndexError:
+                pass
+        stats['depth'] = self._queue.qsize()
+        stats['lag'] = time.monotonic() - oldest if oldest is not None else 0.0
+        return stats
+
+    def _run(self):
+        """后台线程：按条数或时间凑批写入，批次写完后才把其中的记录标记为完成（供 flush 等待）"""
+        batch = []
+        while True:
+            timeout = None
+            if batch:
+                timeout = max(0.0, self._batch_since + self.flush_interval - time.monotonic())
+            elif self._spooled:
+                timeout = self.retry_interval  # 空闲时也定期尝试补写缓冲文件
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                with self._lock:
+                    if not batch:
+                        self._batch_since = item[1]
+                    batch.append(item[0])
+                    self._pending = len(batch)
+                if len(batch) < self.batch_size:
+                    continue
+            # 凑满一批、到达时间、收到 flush/close，或空闲时补写缓冲文件
+            try:
+                if batch or self._spooled:
+                    self._write(batch)
+            except Exception as e:
+                # 缓冲文件也写不进去（磁盘满、无权限等）时本批记录丢失，但线程继续运行，flush/close 不会卡住
+                logger.error(f"异步写入失败，{len(batch)} 条记录未能保存：{e}")
+                print(f"❌ 异步写入失败，{len(batch)} 条记录未能保存：{e}")
+                with self._lock:
+                    self._counters['failures'] += 1
+                    self._counters['lost'] += len(batch)
+            for _ in batch:
+                self._queue.task_done()
+            batch = []
+            with self._lock:
+                self._batch_since = None
+                self._pending = 0
+            if item is _FLUSH or item is _STOP:
+                self._queue.task_done()
+            if item is _STOP:
+                return
+
+    def _database_ready(self):
+        """数据库是否可以写入（不可用时每隔 retry_interval 秒重试连接）"""
+        if self._next_retry and time.monotonic() < self._next_retry:
+            return False
+        if not self.manager.connected and not self.manager.connect():
+            self._mark_down()
+            return False
+        return True
+
+    def _mark_down(self):
+        with self._lock:
+            self._counters['failures'] += 1
+            self._next_retry = time.monotonic() + self.retry_interval
+
+    def _insert(self, rows):
+        inserted, skipped = self.manager.bulk_insert_summaries(rows)
+        with self._lock:
+            self._counters['written'] += inserted
+            self._counters['skipped'] += skipped
+            self._counters['batches'] += 1
+            self._next_retry = 0.0
+
+    def _insert_or_dead_letter(self, rows):
+        """
+        写入一批记录；数据库不可用时抛出异常，其他错误时逐条重试，写不进去的记录转入死信文件
+
+        逐条重试时遇到数据库不可用同样抛出异常，已写入的记录重新补写时按唯一约束跳过。
+        """
+        try:
+            self._insert(rows)
+            return
+        except CONNECTION_ERRORS:
+            raise
+        except Exception as e:
+            if len(rows) == 1:
+                self._append_dead_letter(rows, e)
+                return
+            logger.warning(f"批量写入失败，改为逐条写入 {len(rows)} 条记录：{e}")
+        for row in rows:
+            try:
+                self._insert([row])
+            except CONNECTION_ERRORS:
+                raise
+            except Exception as e:
+                self._append_dead_letter([row], e)
+
+    def _write(self, rows):
+        """写入一批记录：先补写缓冲文件，数据库不可用时把本批追加到缓冲文件"""
+        if self._database_ready():
+            try:
+                if self._spooled:
+                    self._replay_spool()
+                if rows:
+                    self._insert_or_dead_letter(rows)
+                    logger.debug(f"异步写入 {len(rows)} 条摘要")
+                return
+            except Exception as e:
+                logger.error(f"异步写入数据库失败，记录转入缓冲文件：{e}")
+                print(f"⚠️  写入数据库失败，{len(rows)} 条记录暂存到 {self.spool_path}")
+                if isinstance(e, CONNECTION_ERRORS):
+                    self._mark_down()
+                else:
+                    with self._lock:
+                        self._counters['failures'] += 1
+        if rows:
+            self._append_spool(rows)
+
+    def _count_spool(self):
+        if not os.path.exists(self.spool_path):
+            return 0
+        with open(self.spool_path, 'r', encoding='utf-8') as f:
+            return sum(1 for line in f if line.strip())
+
+    def _append_spool(self, rows):
+        os.makedirs(os.path.dirname(self.spool_path) or '.', exist_ok=True)
+        with open(self.spool_path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps([str(value) for value in row], ensure_ascii=False) + '\n' for row in rows)
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self._spooled += len(rows)
+            if self._spooled_since is None:
+                self._spooled_since = time.time()
+
+    def _append_dead_letter(self, rows, error):
+        """把写不进数据库的记录连同错误信息追加到死信文件"""
+        logger.error(f"{len(rows)} 条记录无法写入数据库，转入死信文件 {self.dead_letter_path}：{error}")
+        print(f"❌ {len(rows)} 条记录无法写入数据库，已保存到 {self.dead_letter_path}：{error}")
+        os.makedirs(os.path.dirname(self.dead_letter_path) or '.', exist_ok=True)
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps({'record': [str(value) for value in row], 'error': str(error)},
+                                    ensure_ascii=False) + '\n' for row in rows)
+        with self._lock:
+            self._counters['failures'] += 1
+            self._counters['dead'] += len(rows)
+
+    def _replay_spool(self):
+        """按顺序补写缓冲文件中的记录，全部写入后删除缓冲文件（失败时抛出异常，文件保留）"""
+        rows = []
+        with open(self.spool_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rows.append(tuple(json.loads(line)))
+                except ValueError:
+                    continue  # 跳过写入中断的残缺行
+        for start in range(0, len(rows), self.batch_size):
+            self._insert_or_dead_letter(rows[start:start + self.batch_size])
+        os.remove(self.spool_path)
+        with self._lock:
+            self._spooled = 0
+            self._spooled_since = None
+        logger.info(f"缓冲文件中的 {len(rows)} 条记录已补写到数据库")
+        print(f"✅ 缓冲文件中的 {len(rows)} 条记录已补写到数据库")